@@ -0,0 +1,177 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from typing import ContextManager, Iterator, List, Sequence
+from .ingredients import IngredientIndex
+from .store import MappedRecipeStore
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on a file, so only one process on the host runs the block.
+
+    :param path: Lock file, created if missing.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DatasetArtifact:
+    """A versioned, columnar snapshot of the processed recipe dataset stored on disk."""
+
+    DATA_FILE = "recipes.parquet"
+    FEATURES_FILE = "features.npy"
+    MEAL_TYPES_FILE = "meal_types.npy"
+    TOTAL_MINUTES_FILE = "total_minutes.npy"
+    CATEGORIES_FILE = "categories.npy"
+    PAYLOADS_FILE = "payloads.bin"
+    PAYLOAD_OFFSETS_FILE = "payload_offsets.npy"
+    MANIFEST_FILE = "manifest.json"
+
+    # Small row groups keep fetching the full records of a few recipes cheap
+    ROW_GROUP_SIZE = 4096
+
+    def __init__(self, cache_dir: str, key: str) -> None:
+        """
+        Initialize the artifact handle. Nothing is read or written until requested.
+
+        :param cache_dir: Directory holding one sub-directory per artifact key.
+        :param key: Content hash identifying this artifact.
+        """
+        self.cache_dir = cache_dir
+        self.key = key
+        self.path = os.path.join(cache_dir, key)
+
+    @staticmethod
+    def compute_key(input_files: Sequence[str], code_version: str) -> str:
+        """
+        Hash the contents of the input files together with the processing code version.
+
+        :param input_files: Paths of the raw input files.
+        :param code_version: Version of the processing code that produced the artifact.
+        :return: Hex digest identifying the processed dataset.
+        """
+        digest = hashlib.sha256(f"processing-version:{code_version}".encode())
+        for input_file in input_files:
+            digest.update(os.path.basename(input_file).encode())
+            with open(input_file, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()[:16]
+
+    def lock(self) -> ContextManager[None]:
+        """Lock held while building this cache directory's artifacts, so concurrent workers build once."""
+        return file_lock(os.path.join(self.cache_dir, ".lock"))
+
+    def exists(self) -> bool:
+        """Check whether a complete artifact is present for this key."""
+        return os.path.isfile(os.path.join(self.path, self.MANIFEST_FILE))
+
+    def save(self, data: pd.DataFrame, feature_columns: List[str]) -> None:
+        """
+        Write the processed dataset and its feature matrix atomically.
+
+        The serialized payloads are stored apart from the parquet records, as one blob with an
+        offset index, so a single payload can be read without decoding anything else. Ingredient
+        tokens are only stored as the ingredient index.
+
+        :param data: Processed recipe data, including 'mealType', 'payload' and 'ingredientTokens'.
+        :param feature_columns: Columns stored as a float64 ``.npy`` feature matrix.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=f".{self.key}-", dir=self.cache_dir)
+        os.chmod(staging_dir, 0o755)
+        try:
+            data = data.reset_index(drop=True)
+            data.drop(columns=['payload', 'ingredientTokens']).to_parquet(
+                os.path.join(staging_dir, self.DATA_FILE), index=False, row_group_size=self.ROW_GROUP_SIZE
+            )
+            features = np.ascontiguousarray(data[feature_columns].to_numpy(dtype=np.float64))
+            np.save(os.path.join(staging_dir, self.FEATURES_FILE), features)
+            meal_types = pd.Categorical(data['mealType'])
+            np.save(os.path.join(staging_dir, self.MEAL_TYPES_FILE), meal_types.codes.astype(np.int8))
+            np.save(os.path.join(staging_dir, self.TOTAL_MINUTES_FILE), data['totalTimeMinutes'].to_numpy(dtype=np.int32))
+            categories = pd.Categorical(data['recipeCategory'])
+            np.save(os.path.join(staging_dir, self.CATEGORIES_FILE), categories.codes.astype(np.int16))
+
+            encoded = [payload.encode() for payload in data['payload']]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(payload) for payload in encoded], out=offsets[1:])
+            with open(os.path.join(staging_dir, self.PAYLOADS_FILE), "wb") as f:
+                f.writelines(encoded)
+            np.save(os.path.join(staging_dir, self.PAYLOAD_OFFSETS_FILE), offsets)
+            IngredientIndex.from_tokens(data['ingredientTokens']).save(staging_dir)
+
+            manifest = {
+                "key": self.key,
+                "rows": len(data),
+                "feature_columns": feature_columns,
+                "meal_types": [str(name) for name in meal_types.categories],
+                "categories": [str(name) for name in categories.categories],
+                "created_at": time.time(),
+            }
+            # The manifest is written last; its presence marks the artifact as complete
+            with open(os.path.join(staging_dir, self.MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f, indent=2)
+
+            # Move any previous build aside first so the swap itself is a single rename
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{staging_dir}-old")
+            os.replace(staging_dir, self.path)
+            shutil.rmtree(f"{staging_dir}-old", ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        logging.info(f"Wrote dataset artifact {self.key} ({len(data)} rows) to {self.path}")
+
+    def load(self) -> MappedRecipeStore:
+        """
+        Open the artifact as a recipe store. Only the meal type codes and the ingredient
+        vocabulary are read into memory; features, payloads and ingredient posting lists are
+        memory-mapped and records are read on demand.
+
+        :return: Read-only recipe store.
+        """
+        with open(os.path.join(self.path, self.MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        payload_offsets = np.load(os.path.join(self.path, self.PAYLOAD_OFFSETS_FILE), mmap_mode="r")
+        payload_blob = (
+            np.memmap(os.path.join(self.path, self.PAYLOADS_FILE), dtype=np.uint8, mode="r")
+            if payload_offsets[-1] > 0 else np.empty(0, dtype=np.uint8)
+        )
+        store = MappedRecipeStore(
+            features=np.load(os.path.join(self.path, self.FEATURES_FILE), mmap_mode="r"),
+            meal_type_codes=np.load(os.path.join(self.path, self.MEAL_TYPES_FILE)),
+            meal_type_names=manifest["meal_types"],
+            total_minutes=np.load(os.path.join(self.path, self.TOTAL_MINUTES_FILE), mmap_mode="r"),
+            category_codes=np.load(os.path.join(self.path, self.CATEGORIES_FILE), mmap_mode="r"),
+            category_names=manifest["categories"],
+            payload_blob=payload_blob,
+            payload_offsets=payload_offsets,
+            data_file=os.path.join(self.path, self.DATA_FILE),
+            ingredient_index=IngredientIndex.load(self.path),
+        )
+        logging.info(f"Loaded dataset artifact {self.key} ({len(store)} rows) from {self.path}")
+        return store
+
+    def prune(self) -> None:
+        """Remove every other artifact in the cache directory."""
+        for entry in os.listdir(self.cache_dir):
+            entry_path = os.path.join(self.cache_dir, entry)
+            if entry != self.key and not entry.startswith(".") and os.path.isdir(entry_path):
+                shutil.rmtree(entry_path, ignore_errors=True)
+                logging.info(f"Removed stale dataset artifact {entry}")
@@ -0,0 +1,36 @@
+import argparse
+import logging
+import os
+from .artifact import DatasetArtifact
+from .recommender import RecipeDataProcessor
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+def main() -> None:
+    """Build the processed-dataset artifact ahead of deploy so replicas start from the cache."""
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+    parser = argparse.ArgumentParser(description="Build the processed recipe dataset artifact.")
+    parser.add_argument("--recipe-file", default=os.path.join(base_dir, "data", "recipes.parquet"))
+    parser.add_argument("--ingredient-file", default=os.path.join(base_dir, "data", "recipes_ingredients.csv"))
+    parser.add_argument("--cache-dir", default=os.getenv("DATASET_CACHE_DIR", os.path.join(base_dir, "data", "cache")))
+    parser.add_argument("--memory-limit-mb", type=int, default=int(os.getenv("INGEST_MEMORY_LIMIT_MB", "256")),
+                        help="Approximate memory used for each chunk of the ingredient file.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if an artifact for the inputs exists.")
+    parser.add_argument("--prune", action="store_true", help="Remove artifacts built from other inputs.")
+    args = parser.parse_args()
+
+    processor = RecipeDataProcessor(args.recipe_file, args.ingredient_file, cache_dir=args.cache_dir,
+                                    memory_limit=args.memory_limit_mb * 1024 * 1024)
+    artifact = DatasetArtifact(args.cache_dir, processor.dataset_version)
+    if args.force or not artifact.exists():
+        artifact = processor.build_artifact()
+    else:
+        logging.info(f"Dataset artifact {artifact.key} is up to date")
+    if args.prune:
+        artifact.prune()
+    print(artifact.path)
+
+
+if __name__ == "__main__":
+    main()
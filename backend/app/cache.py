@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with an optional time-to-live and hit, miss and eviction counters."""
+
+    def __init__(self, max_entries: Optional[int] = 1024, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None) -> None:
+        """
+        Initialize an empty cache.
+
+        :param max_entries: Maximum number of entries kept before the least recently used is evicted.
+        :param ttl: Seconds an entry stays valid, or None to keep entries until evicted.
+        :param max_bytes: Optional limit on the total size of the cached values.
+        :param sizeof: Size of a value in bytes, required with max_bytes.
+        """
+        if max_bytes is not None and sizeof is None:
+            raise ValueError("sizeof is required when max_bytes is set")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a value, counting the hit or miss.
+
+        :param key: Cache key.
+        :return: The cached value, or None if absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entries beyond the size limits.
+
+        :param key: Cache key.
+        :param value: Value to cache.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self.size_bytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.size_bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        self.size_bytes -= self._entries.pop(key)[2]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Current size and hit, miss and eviction counters."""
+        return {
+            "entries": len(self._entries), "bytes": self.size_bytes, "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisBackend:
+    """Shared cache backend on Redis, so replicas reuse each other's results."""
+
+    def __init__(self, url: str, ttl: Optional[int] = None) -> None:
+        """
+        Connect to Redis. Requires the optional 'redis' package.
+
+        :param url: Redis URL, e.g. redis://cache:6379/0.
+        :param ttl: Seconds entries live in Redis, or None to rely on Redis eviction.
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("The shared result cache requires the 'redis' package: pip install redis") from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(key, value, ex=self.ttl)
+
+
+class ResultCache:
+    """
+    Cache of serialized recommendation results: a bounded in-process LRU in front of an
+    optional shared backend.
+
+    Any object with ``get(key) -> Optional[bytes]`` and ``set(key, value)`` can serve as the
+    shared backend, e.g. an LRUCache standing in for Redis locally.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, resolution: float = 0.01,
+                 shared: Optional[Any] = None) -> None:
+        """
+        Initialize the cache.
+
+        :param max_bytes: Size limit of the in-process cache.
+        :param resolution: Grid step, in standard deviations, that user vectors are snapped to.
+        :param shared: Optional shared backend.
+        """
+        self.local = LRUCache(max_entries=None, max_bytes=max_bytes, sizeof=lambda payloads: sum(map(len, payloads)))
+        self.resolution = resolution
+        self.shared = shared
+        self.shared_errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultCache"]:
+        """
+        Build the cache from RESULT_CACHE_MAX_BYTES, RESULT_CACHE_RESOLUTION, RESULT_CACHE_URL and
+        RESULT_CACHE_TTL. Returns None when RESULT_CACHE_MAX_BYTES is 0.
+        """
+        max_bytes = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        if max_bytes <= 0:
+            return None
+        url = os.getenv("RESULT_CACHE_URL")
+        shared = RedisBackend(url, ttl=int(os.getenv("RESULT_CACHE_TTL", "86400"))) if url else None
+        return cls(max_bytes=max_bytes, resolution=float(os.getenv("RESULT_CACHE_RESOLUTION", "0.01")), shared=shared)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """
+        Look up cached meal payloads, filling the in-process cache on a shared hit.
+
+        :param key: Cache key, including the dataset version.
+        :return: List of JSON-encoded meal payloads, or None.
+        """
+        payloads = self.local.get(key)
+        if payloads is not None or self.shared is None:
+            return payloads
+        try:
+            value = self.shared.get(key)
+        except Exception as e:
+            # The shared cache is an optimization; never fail a request because it is down
+            self.shared_errors += 1
+            logging.warning(f"Shared result cache lookup failed: {e}")
+            return None
+        if value is None:
+            return None
+        payloads = json.loads(value)
+        self.local.set(key, payloads)
+        return payloads
+
+    def set(self, key: str, payloads: List[str]) -> None:
+        """
+        Store meal payloads in the in-process and shared caches.
+
+        :param key: Cache key, including the dataset version.
+        :param payloads: List of JSON-encoded meal payloads.
+        """
+        self.local.set(key, payloads)
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(key, json.dumps(payloads).encode())
+        except Exception as e:
+            self.shared_errors += 1
+            logging.warning(f"Shared result cache store failed: {e}")
+
+    def clear(self) -> None:
+        """Drop the in-process entries; shared entries of old dataset versions are never read again."""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """In-process cache size and hit/miss counters, plus shared backend errors."""
+        return {**self.local.stats(), "shared_errors": self.shared_errors}
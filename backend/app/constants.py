@@ -0,0 +1,10 @@
+# Kept free of heavy imports: the API models need these before the dataset modules are loaded
+
+NUTRITIONAL_COLUMNS = [
+    'calories', 'proteinContent', 'fatContent', 'saturatedFatContent',
+    'carbohydrateContent', 'fiberContent', 'sugarContent',
+    'cholesterolContent', 'sodiumContent'
+]
+
+# Meal slots in the order they are filled for a given number of meals per day
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snacks"]
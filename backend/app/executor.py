@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when the recommendation pool has no free worker or queue slot."""
+
+
+def _worker_pid(hold: float) -> int:
+    """Report which worker ran the task, holding it briefly so idle workers pick up the other tasks."""
+    time.sleep(hold)
+    return os.getpid()
+
+
+class RecommendationPool:
+    """Bounded thread or process pool that keeps CPU-bound recommendation work off the event loop."""
+
+    def __init__(self, kind: str = "thread", max_workers: Optional[int] = None, max_queue: int = 32,
+                 initializer: Optional[Callable[[], None]] = None) -> None:
+        """
+        Create the underlying executor.
+
+        :param kind: 'thread' or 'process'.
+        :param max_workers: Number of workers, defaults to the CPU count.
+        :param max_queue: Number of tasks allowed to wait for a worker before new ones are rejected.
+        :param initializer: Called once in each worker process to load the recommender; unused for threads.
+        """
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.in_flight = 0
+
+        if kind == "thread":
+            self.executor: Executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="recommender")
+        elif kind == "process":
+            # Spawn rather than fork so workers never inherit the event loop or held locks
+            self.executor = ProcessPoolExecutor(
+                self.max_workers, mp_context=multiprocessing.get_context("spawn"), initializer=initializer
+            )
+        else:
+            raise ValueError(f"Unknown recommendation pool kind '{kind}', expected 'thread' or 'process'")
+        logging.info(f"Recommendation pool: {kind} x{self.max_workers}, queue depth {max_queue}")
+
+    @classmethod
+    def from_env(cls, initializer: Optional[Callable[[], None]] = None) -> "RecommendationPool":
+        """Build the pool from the RECOMMENDER_POOL, RECOMMENDER_WORKERS and RECOMMENDER_MAX_QUEUE settings."""
+        workers = os.getenv("RECOMMENDER_WORKERS")
+        return cls(
+            kind=os.getenv("RECOMMENDER_POOL", "thread"),
+            max_workers=int(workers) if workers else None,
+            max_queue=int(os.getenv("RECOMMENDER_MAX_QUEUE", "32")),
+            initializer=initializer,
+        )
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of running plus queued tasks."""
+        return self.max_workers + self.max_queue
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a function on the pool without blocking the event loop.
+
+        :param fn: Function to call; must be picklable for process pools.
+        :param args: Positional arguments for the function.
+        :return: The function's result.
+        :raises PoolSaturatedError: If all workers are busy and the queue is full.
+        """
+        return await self.submit(fn, *args)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> "asyncio.Future[Any]":
+        """
+        Start a function on the pool; must be called from the event loop.
+
+        Saturation is reported right away rather than when the result is awaited, so a caller
+        submitting several tasks knows whether all of them were accepted before using any result.
+
+        :param fn: Function to call; must be picklable for process pools.
+        :param args: Positional arguments for the function.
+        :return: Future of the function's result; cancelling it drops the task if it hasn't started,
+            while a running task keeps its slot until it finishes.
+        :raises PoolSaturatedError: If all workers are busy and the queue is full.
+        """
+        # Only touched from the event loop thread, so no lock is needed
+        if self.in_flight >= self.capacity:
+            raise PoolSaturatedError(f"Recommendation pool saturated ({self.in_flight} tasks in flight)")
+        loop = asyncio.get_running_loop()
+        task = self.executor.submit(functools.partial(fn, *args))
+        self.in_flight += 1
+        # The executor's own future is only done once the task has finished or was dropped before
+        # starting, whereas the asyncio future is done as soon as the caller cancels it
+        task.add_done_callback(lambda _: self._task_done(loop))
+        return asyncio.wrap_future(task, loop=loop)
+
+    async def warm_up(self) -> None:
+        """
+        Start every worker and wait until each has run its initializer, so no request pays for it.
+
+        Process workers are spawned on demand and a fast one may take several tasks, so rounds of one
+        task per worker are submitted until every worker has answered. Threads need no warmup.
+
+        :raises BrokenProcessPool: If a worker's initializer failed.
+        """
+        if self.kind != "process":
+            return
+        pids = set()
+        while len(pids) < self.max_workers:
+            pids.update(await asyncio.gather(*(self.submit(_worker_pid, 0.05) for _ in range(self.max_workers))))
+        logging.info(f"Recommendation pool: {len(pids)} worker processes ready")
+
+    def _task_done(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Called on a worker or executor thread, so the count is released on the event loop thread
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The event loop has closed, so nothing reads the count anymore
+            pass
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    def shutdown(self, cancel_pending: bool = True) -> None:
+        """
+        Stop accepting work and release the workers.
+
+        :param cancel_pending: Cancel queued tasks; when False they still run before the workers exit,
+            as when a reload retires the pool while requests are in flight.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=cancel_pending)
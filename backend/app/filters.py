@@ -0,0 +1,185 @@
+import json
+import numpy as np
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from .cache import LRUCache
+from .ingredients import tokenize
+from .store import RecipeStore
+
+# Filterable column holding each recipe's total time, besides the nutritional features
+TOTAL_TIME_COLUMN = 'totalTimeMinutes'
+
+
+class RecipeConstraints:
+    """Hard limits every recommended recipe must satisfy."""
+
+    def __init__(self, max_total_minutes: Optional[int] = None, exclude_categories: Iterable[str] = (),
+                 max_nutrients: Optional[Mapping[str, float]] = None, include_ingredients: Iterable[str] = (),
+                 exclude_ingredients: Iterable[str] = ()) -> None:
+        """
+        Describe the constraints; unset ones don't filter anything.
+
+        :param max_total_minutes: Longest allowed total (prep plus cook) time.
+        :param exclude_categories: Recipe categories to leave out, e.g. 'Dessert'.
+        :param max_nutrients: Ceiling per recipe of nutritional columns, e.g. {'sodiumContent': 600}.
+        :param include_ingredients: Ingredients every recipe must contain, e.g. 'chicken'.
+        :param exclude_ingredients: Ingredients no recipe may contain, e.g. 'peanut'.
+        """
+        self.max_total_minutes = max_total_minutes
+        self.exclude_categories = tuple(sorted(set(exclude_categories)))
+        self.max_nutrients = dict(sorted((max_nutrients or {}).items()))
+        # Terms are matched on their tokens, so spelling variants share a cache key
+        self.include_ingredients = self._canonical_terms(include_ingredients)
+        self.exclude_ingredients = self._canonical_terms(exclude_ingredients)
+
+    @staticmethod
+    def _canonical_terms(terms: Iterable[str]) -> Tuple[str, ...]:
+        canonical = (' '.join(sorted(tokenize(term))) for term in terms)
+        # A term without an ingredient word, e.g. '2 cups', constrains nothing
+        return tuple(sorted({term for term in canonical if term}))
+
+    def __bool__(self) -> bool:
+        return (self.max_total_minutes is not None or bool(self.exclude_categories) or bool(self.max_nutrients)
+                or bool(self.include_ingredients) or bool(self.exclude_ingredients))
+
+    @property
+    def ceilings(self) -> List[Tuple[str, float]]:
+        """Upper bounds as (column, limit) pairs."""
+        ceilings = list(self.max_nutrients.items())
+        if self.max_total_minutes is not None:
+            ceilings.append((TOTAL_TIME_COLUMN, self.max_total_minutes))
+        return ceilings
+
+    @property
+    def key(self) -> str:
+        """Canonical form, identical for equivalent constraints; part of result cache keys."""
+        return json.dumps([
+            self.max_total_minutes, self.exclude_categories, self.max_nutrients, self.include_ingredients,
+            self.exclude_ingredients,
+        ], separators=(',', ':'))
+
+
+class ConstraintIndex:
+    """
+    Sorted columns and category codes of one meal type's recipes, to select the rows that satisfy
+    constraints without scanning the recipe data.
+
+    A ceiling is a prefix of its column's sort order, found by binary search. The most selective
+    ceiling gives the candidates and only those are checked against the other constraints, so the
+    cost follows the number of matching rows rather than the meal type's size. Columns are sorted
+    on first use, since most deployments only ever filter on a few of them. Ingredient terms are
+    looked up in the store's inverted ingredient index and mapped onto index positions.
+
+    The same constraints recur across users, so recent results are kept per meal type.
+    """
+
+    # Bytes of eligible position arrays kept per meal type
+    ELIGIBLE_CACHE_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, store: RecipeStore, row_ids: np.ndarray, feature_columns: List[str]) -> None:
+        """
+        Prepare the index; nothing is read from the store yet.
+
+        :param store: Store holding the recipes.
+        :param row_ids: Positions of the meal type's recipes in the store, in index order.
+        :param feature_columns: Nutritional columns that ceilings may apply to.
+        """
+        self.store = store
+        self.row_ids = row_ids
+        self.feature_columns = list(feature_columns)
+        self._values: Dict[str, np.ndarray] = {}
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._category_codes: Optional[np.ndarray] = None
+        self._eligible = LRUCache(max_entries=None, max_bytes=self.ELIGIBLE_CACHE_BYTES, sizeof=lambda a: a.nbytes)
+
+    def values(self, column: str) -> np.ndarray:
+        """Values of a filterable column, in index order."""
+        values = self._values.get(column)
+        if values is None:
+            if column == TOTAL_TIME_COLUMN:
+                values = np.asarray(self.store.total_minutes[self.row_ids])
+            elif column in self.feature_columns:
+                values = self.store.feature_rows(self.row_ids)[:, self.feature_columns.index(column)].copy()
+            else:
+                raise ValueError(f"Cannot filter on '{column}'")
+            self._values[column] = values
+        return values
+
+    def sorted_column(self, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Tuple of (index positions in ascending order of the column, sorted values)."""
+        sorted_column = self._sorted.get(column)
+        if sorted_column is None:
+            values = self.values(column)
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            sorted_column = self._sorted[column] = (order, values[order])
+        return sorted_column
+
+    def category_codes(self) -> np.ndarray:
+        if self._category_codes is None:
+            # Widened once so every lookup table gather skips the conversion
+            self._category_codes = np.asarray(self.store.category_codes[self.row_ids], dtype=np.intp)
+        return self._category_codes
+
+    def eligible(self, constraints: RecipeConstraints) -> np.ndarray:
+        """
+        Positions in the meal type's index of the recipes satisfying the constraints.
+
+        :param constraints: Non-empty constraints.
+        :return: Sorted read-only array of index positions, possibly empty.
+        """
+        eligible = self._eligible.get(constraints.key)
+        if eligible is None:
+            eligible = self._select(constraints)
+            eligible.setflags(write=False)
+            self._eligible.set(constraints.key, eligible)
+        return eligible
+
+    def _select(self, constraints: RecipeConstraints) -> np.ndarray:
+        candidates: Optional[np.ndarray] = None
+        ceilings = constraints.ceilings
+        if ceilings:
+            prefixes = []
+            for column, limit in ceilings:
+                order, values = self.sorted_column(column)
+                prefixes.append((np.searchsorted(values, limit, side='right'), column, order))
+            cut, column, order = min(prefixes, key=lambda prefix: prefix[0])
+            candidates = order[:cut]
+            for other_column, limit in ceilings:
+                if other_column != column and len(candidates):
+                    candidates = candidates[self.values(other_column)[candidates] <= limit]
+
+        if constraints.exclude_categories:
+            names = self.store.category_names
+            allowed = np.ones(len(names), dtype=bool)
+            allowed[[names.index(c) for c in constraints.exclude_categories if c in names]] = False
+            codes = self.category_codes()
+            if candidates is None:
+                candidates = np.flatnonzero(allowed[codes])
+            else:
+                candidates = candidates[allowed[codes[candidates]]]
+
+        for term in constraints.include_ingredients:
+            positions = self.ingredient_positions(term)
+            candidates = positions if candidates is None else np.intersect1d(candidates, positions)
+        if constraints.exclude_ingredients:
+            excluded = np.unique(np.concatenate([self.ingredient_positions(t) for t in constraints.exclude_ingredients]))
+            if candidates is None:
+                candidates = np.arange(len(self.row_ids))
+            candidates = candidates[~np.isin(candidates, excluded)]
+
+        if candidates is None:
+            return np.arange(len(self.row_ids))
+        return np.sort(candidates).astype(np.int64)
+
+    def ingredient_positions(self, term: str) -> np.ndarray:
+        """
+        Positions in the meal type's index of the recipes containing an ingredient.
+
+        :param term: Canonical ingredient term.
+        :return: Sorted array of index positions.
+        """
+        if not len(self.row_ids):
+            return np.empty(0, dtype=np.int64)
+        rows = self.store.rows_with_ingredient(term)
+        # Row ids are ascending, so each matching row maps to its position by binary search
+        positions = np.minimum(np.searchsorted(self.row_ids, rows), len(self.row_ids) - 1)
+        return positions[self.row_ids[positions] == rows].astype(np.int64)
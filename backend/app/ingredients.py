@@ -0,0 +1,192 @@
+import itertools
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+# Words that describe amounts rather than ingredients; they are never indexed
+UNIT_WORDS = {
+    "cup", "tablespoon", "tbsp", "teaspoon", "tsp", "lb", "pound", "ounce", "oz", "g", "gram", "kg", "ml", "l",
+    "liter", "litre", "quart", "pint", "gallon", "pinch", "dash", "can", "package", "pkg", "stick", "slice",
+    "clove", "head", "bunch", "sprig", "piece", "inch", "large", "medium", "small", "whole", "half", "and",
+    "or", "of", "to", "for", "the", "a", "an", "as", "in", "into", "with", "taste", "needed", "optional",
+    "about", "plus", "more", "each",
+}
+
+TOKEN_PATTERN = r"[a-z]+"
+
+
+def normalize_word(word: str) -> str:
+    """
+    Reduce a lowercase word to the form stored in the vocabulary; plurals map to their singular
+    so 'eggs' matches 'egg' and 'tomatoes' matches 'tomato'.
+    """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Normalized ingredient tokens of a text, in order of appearance and without duplicates.
+
+    :param text: Ingredient list or query term, e.g. 'Chopped Peanuts'.
+    :return: Tokens, e.g. ['chopped', 'peanut'].
+    """
+    tokens = (normalize_word(word) for word in re.findall(TOKEN_PATTERN, str(text).lower()))
+    return list(dict.fromkeys(token for token in tokens if token not in UNIT_WORDS))
+
+
+def tokenize_column(ingredients: pd.Series) -> pd.Series:
+    """
+    Tokenize every recipe's raw ingredient list at once.
+
+    :param ingredients: Raw ingredient list strings, one per recipe.
+    :return: Space-separated unique tokens of each recipe, in the same index.
+    """
+    # Ingredient lines repeat heavily across recipes, so tokenize each distinct comma-separated piece once
+    pieces = ingredients.astype(str).str.lower().str.split(",")
+    piece_rows = np.repeat(np.arange(len(pieces)), pieces.str.len().to_numpy())
+    piece_codes, unique_pieces = pd.factorize(pd.Series(list(itertools.chain.from_iterable(pieces)), dtype=object))
+    piece_tokens = [tokenize(piece) for piece in unique_pieces]
+    token_codes, vocabulary = pd.factorize(pd.Series(list(itertools.chain.from_iterable(piece_tokens)), dtype=object))
+
+    # Expand every piece occurrence into its tokens: token j of an occurrence of piece p is
+    # token_codes[starts[p] + j]
+    lengths = np.array([len(tokens) for tokens in piece_tokens], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    occurrence_lengths = lengths[piece_codes]
+    rows = np.repeat(piece_rows, occurrence_lengths)
+    first_of_occurrence = np.cumsum(occurrence_lengths) - occurrence_lengths
+    positions = np.repeat(starts[piece_codes] - first_of_occurrence, occurrence_lengths) + np.arange(len(rows))
+    tokens = token_codes[positions]
+
+    # Drop repeated tokens of a recipe, keeping the first appearance
+    first = np.sort(np.unique(rows * max(len(vocabulary), 1) + tokens, return_index=True)[1])
+    rows, tokens = rows[first], np.asarray(vocabulary, dtype=object)[tokens[first]]
+    bounds = np.searchsorted(rows, np.arange(len(pieces) + 1))
+    joined = [" ".join(tokens[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+    return pd.Series(joined, index=ingredients.index, dtype=object)
+
+
+class IngredientIndex:
+    """
+    Inverted index from ingredient token to the sorted rows of the recipes that use it.
+
+    Posting lists are delta encoded and each is stored with the narrowest unsigned integer type
+    that holds its largest gap, so frequent tokens take about one byte per recipe. Decoding a list
+    is a single cumulative sum.
+    """
+
+    VOCABULARY_FILE = "ingredient_vocabulary.json"
+    POSTINGS_FILE = "ingredient_postings.bin"
+    DIRECTORY_FILE = "ingredient_directory.npy"
+
+    # Columns of the directory: byte offset in the blob, row count, first row, bytes per gap
+    OFFSET, COUNT, FIRST, WIDTH = range(4)
+
+    def __init__(self, vocabulary: List[str], directory: np.ndarray, blob: np.ndarray) -> None:
+        """
+        Wrap an encoded index.
+
+        :param vocabulary: Tokens, in directory order.
+        :param directory: Array of shape (n_tokens, 4), see OFFSET, COUNT, FIRST and WIDTH.
+        :param blob: Concatenated encoded gaps of every posting list.
+        """
+        self.vocabulary = {token: position for position, token in enumerate(vocabulary)}
+        self.directory = directory
+        self.blob = blob
+
+    @classmethod
+    def from_tokens(cls, tokens: pd.Series) -> "IngredientIndex":
+        """
+        Build the index from the output of tokenize_column.
+
+        :param tokens: Space-separated tokens of each recipe; rows are positions in this series.
+        :return: The index.
+        """
+        tokens = tokens.fillna("").astype(str)
+        counts = np.where(tokens.str.len().to_numpy() > 0, tokens.str.count(" ").to_numpy() + 1, 0)
+        rows = np.repeat(np.arange(len(tokens), dtype=np.int64), counts)
+        codes, vocabulary = pd.factorize(pd.Series(" ".join(tokens).split(), dtype=object))
+        # Rows are already ascending, so a stable sort by token keeps each posting list sorted
+        order = np.argsort(codes, kind="stable")
+        codes, rows = codes[order], rows[order]
+        bounds = np.searchsorted(codes, np.arange(len(vocabulary) + 1))
+
+        directory = np.zeros((len(vocabulary), 4), dtype=np.int64)
+        chunks = []
+        offset = 0
+        for token, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            gaps = np.diff(rows[start:end])
+            width = 1 if len(gaps) == 0 or gaps.max() < 1 << 8 else 2 if gaps.max() < 1 << 16 else 4
+            encoded = gaps.astype(f"<u{width}").tobytes()
+            directory[token] = (offset, end - start, rows[start], width)
+            chunks.append(encoded)
+            offset += len(encoded)
+        blob = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+        return cls([str(token) for token in vocabulary], directory, blob)
+
+    @classmethod
+    def empty(cls) -> "IngredientIndex":
+        return cls([], np.zeros((0, 4), dtype=np.int64), np.empty(0, dtype=np.uint8))
+
+    def save(self, path: str) -> None:
+        """Write the index files into a directory."""
+        with open(os.path.join(path, self.VOCABULARY_FILE), "w") as f:
+            json.dump(list(self.vocabulary), f)
+        np.save(os.path.join(path, self.DIRECTORY_FILE), self.directory)
+        with open(os.path.join(path, self.POSTINGS_FILE), "wb") as f:
+            f.write(self.blob.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "IngredientIndex":
+        """Open index files written by save, memory-mapping the posting lists."""
+        with open(os.path.join(path, cls.VOCABULARY_FILE)) as f:
+            vocabulary = json.load(f)
+        postings_file = os.path.join(path, cls.POSTINGS_FILE)
+        blob = (np.memmap(postings_file, dtype=np.uint8, mode="r") if os.path.getsize(postings_file)
+                else np.empty(0, dtype=np.uint8))
+        return cls(vocabulary, np.load(os.path.join(path, cls.DIRECTORY_FILE)), blob)
+
+    @property
+    def nbytes(self) -> int:
+        return self.directory.nbytes + self.blob.nbytes
+
+    def rows(self, token: str) -> np.ndarray:
+        """
+        Decode the posting list of a token.
+
+        :param token: Normalized token.
+        :return: Sorted rows of the recipes using it, empty for unknown tokens.
+        """
+        position = self.vocabulary.get(token)
+        if position is None:
+            return np.empty(0, dtype=np.int64)
+        offset, count, first, width = self.directory[position]
+        rows = np.empty(count, dtype=np.int64)
+        rows[0] = first
+        gaps = np.frombuffer(self.blob, dtype=f"<u{width}", count=count - 1, offset=offset)
+        np.cumsum(gaps, out=rows[1:])
+        rows[1:] += first
+        return rows
+
+    def matching(self, term: str) -> np.ndarray:
+        """
+        Rows of the recipes whose ingredients contain every token of a term, e.g. 'peanut butter'.
+
+        :param term: Ingredient as a user would type it.
+        :return: Sorted rows; empty if the term has no indexed token.
+        """
+        matches: Optional[np.ndarray] = None
+        # Intersect the shortest lists first so later intersections are cheap
+        for rows in sorted((self.rows(token) for token in tokenize(term)), key=len):
+            matches = rows if matches is None else np.intersect1d(matches, rows, assume_unique=True)
+        return matches if matches is not None else np.empty(0, dtype=np.int64)
+
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterator, Callable, Dict, Hashable, List, Optional, Tuple
+from .cache import LRUCache
+from .metrics import LLM_STREAM_SECONDS, LLM_TIME_TO_FIRST_TOKEN_SECONDS
+
+if TYPE_CHECKING:
+    from langchain_ollama import ChatOllama
+
+
+class StreamInterruptedError(RuntimeError):
+    """Raised when an LLM stream fails after some output has already been produced."""
+
+
+class SummaryLLM:
+    """
+    Long-lived async Ollama chat clients used to stream summaries, with an optional fallback.
+
+    langchain takes longer to import than the rest of the service, so the clients are only
+    created on first use, which the service does during warmup, off the event loop.
+    """
+
+    def __init__(self, model: str, base_url: Optional[str] = None, fallback_model: Optional[str] = None,
+                 fallback_base_url: Optional[str] = None, temperature: float = 0.2, num_predict: int = 256) -> None:
+        """
+        Configure the chat clients; once created, each keeps its own pooled HTTP connection to Ollama.
+
+        :param model: Primary Ollama model name.
+        :param base_url: Primary Ollama server URL, or None for the Ollama default.
+        :param fallback_model: Model used when the primary fails before producing output.
+        :param fallback_base_url: Ollama server URL for the fallback model.
+        :param temperature: Sampling temperature.
+        :param num_predict: Maximum number of tokens to generate.
+        """
+        self.models = [(model, base_url)]
+        if fallback_model:
+            self.models.append((fallback_model, fallback_base_url))
+        self.temperature = temperature
+        self.num_predict = num_predict
+        self._clients: Optional[List["ChatOllama"]] = None
+
+    def clients(self) -> List["ChatOllama"]:
+        """The primary client followed by the fallback one, if any, created on first use."""
+        if self._clients is None:
+            from langchain_ollama import ChatOllama
+            self._clients = [
+                ChatOllama(model=model, base_url=base_url, temperature=self.temperature, num_predict=self.num_predict)
+                for model, base_url in self.models
+            ]
+        return self._clients
+
+    @property
+    def primary(self) -> "ChatOllama":
+        return self.clients()[0]
+
+    @property
+    def fallback(self) -> Optional["ChatOllama"]:
+        clients = self.clients()
+        return clients[1] if len(clients) > 1 else None
+
+    @classmethod
+    def from_env(cls) -> "SummaryLLM":
+        """Build the clients from OLLAMA_MODEL, OLLAMA_BASE_URL, OLLAMA_FALLBACK_MODEL and OLLAMA_FALLBACK_BASE_URL."""
+        return cls(
+            model=os.getenv("OLLAMA_MODEL", "llama3.2:1b"),
+            base_url=os.getenv("OLLAMA_BASE_URL", "http://ollama:11434"),
+            fallback_model=os.getenv("OLLAMA_FALLBACK_MODEL", "llama3.2:latest") or None,
+            fallback_base_url=os.getenv("OLLAMA_FALLBACK_BASE_URL") or None,
+        )
+
+    async def astream(self, messages: List[Tuple[str, str]]) -> AsyncGenerator[str, None]:
+        """
+        Stream the response tokens, falling back to the second model only if nothing was emitted yet.
+
+        :param messages: Chat messages as (role, content) tuples.
+        :return: Async generator of response text chunks.
+        """
+        emitted = False
+        try:
+            async for token in self._timed_stream(self.primary, messages):
+                emitted = True
+                yield token
+        except Exception as e:
+            if emitted:
+                # Restarting now would repeat text the client already received
+                logging.error(f"LLM stream from {self.primary.model} failed mid-response: {e}")
+                raise StreamInterruptedError(str(e)) from e
+            if self.fallback is None:
+                raise
+            logging.warning(f"LLM {self.primary.model} unavailable ({e}), falling back to {self.fallback.model}")
+            async for token in self._timed_stream(self.fallback, messages):
+                yield token
+
+    @staticmethod
+    async def _timed_stream(llm: "ChatOllama", messages: List[Tuple[str, str]]) -> AsyncGenerator[str, None]:
+        """Stream from one client, logging time to first token and generation throughput."""
+        start = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        async for chunk in llm.astream(messages):
+            content = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not content:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_at - start, model=llm.model)
+            tokens += 1
+            yield content
+
+        total = time.perf_counter() - start
+        LLM_STREAM_SECONDS.observe(total, model=llm.model)
+        if first_token_at is None:
+            logging.info(f"LLM {llm.model} returned no tokens in {total:.2f}s")
+            return
+        generation_time = total - (first_token_at - start)
+        tokens_per_second = (tokens - 1) / generation_time if tokens > 1 and generation_time > 0 else 0.0
+        logging.info(
+            f"LLM {llm.model}: time to first token {first_token_at - start:.3f}s, {tokens} tokens in "
+            f"{total:.2f}s ({tokens_per_second:.1f} tokens/s)"
+        )
+
+
+class _Generation:
+    """Tokens of one in-progress LLM generation, shared by every request waiting on it."""
+
+    def __init__(self) -> None:
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, token: str) -> None:
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        # Wake current subscribers and arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """Replay the tokens produced so far, then follow the generation until it finishes."""
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.tokens):
+                yield self.tokens[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SummaryCache:
+    """LRU+TTL cache of streamed LLM summaries with single-flight generation per key."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600) -> None:
+        """
+        Initialize the cache.
+
+        :param max_entries: Maximum number of cached summaries.
+        :param ttl: Seconds a cached summary stays valid.
+        """
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.shared = 0
+        self._in_flight: Dict[Hashable, _Generation] = {}
+
+    async def stream(self, key: Hashable,
+                     generate: Callable[[], AsyncIterator[str]]) -> AsyncGenerator[str, None]:
+        """
+        Stream a summary, replaying it from the cache or joining an identical in-flight generation.
+
+        :param key: Normalized prompt inputs.
+        :param generate: Starts a new generation when neither the cache nor an in-flight one can serve the key.
+        :return: Async generator of summary chunks.
+        """
+        tokens = self.cache.get(key)
+        if tokens is not None:
+            for token in tokens:
+                yield token
+            return
+
+        generation = self._in_flight.get(key)
+        if generation is None:
+            generation = _Generation()
+            self._in_flight[key] = generation
+            # Generation runs as its own task so a disconnecting client doesn't stop it for the others
+            generation.task = asyncio.create_task(self._generate(key, generation, generate))
+        else:
+            self.shared += 1
+
+        async for token in generation.subscribe():
+            yield token
+
+    async def _generate(self, key: Hashable, generation: _Generation,
+                        generate: Callable[[], AsyncIterator[str]]) -> None:
+        error = None
+        try:
+            async for token in generate():
+                generation.publish(token)
+            if generation.tokens:
+                self.cache.set(key, tuple(generation.tokens))
+        except StreamInterruptedError as e:
+            # Partial output has already been sent; end the stream without caching it
+            logging.warning(f"Summary generation interrupted, not caching: {e}")
+        except Exception as e:
+            error = e
+        finally:
+            del self._in_flight[key]
+            generation.finish(error)
+
+    def stats(self) -> Dict[str, int]:
+        """Cache size, hit/miss counters and the number of requests that joined an in-flight generation."""
+        return {**self.cache.stats(), "shared": self.shared, "in_flight": len(self._in_flight)}
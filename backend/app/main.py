@@ -1,25 +1,41 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from pydantic import BaseModel
-from typing import Literal, Dict, Any, AsyncGenerator
-from .recommender import RecipeDataProcessor, MealRecommender
-import pandas as pd
+from typing import TYPE_CHECKING, Literal, Dict, Any, AsyncGenerator, AsyncIterator, Callable, List, Optional
+from .constants import NUTRITIONAL_COLUMNS, MEAL_TYPES
+from .executor import RecommendationPool, PoolSaturatedError
+from .llm import SummaryLLM, SummaryCache
+from .cache import ResultCache
+from .metrics import (
+    REGISTRY, RECOMMEND_PHASE_SECONDS, REQUEST_SECONDS, REQUESTS_IN_FLIGHT, POOL_IN_FLIGHT, WARMUP_SECONDS,
+    SUMMARY_CACHE_LOOKUPS, SUMMARY_CACHE_SHARED, SUMMARY_CACHE_ENTRIES, SUMMARY_GENERATIONS_IN_FLIGHT,
+    RESULT_CACHE_LOOKUPS, RESULT_CACHE_EVICTIONS, RESULT_CACHE_SHARED_ERRORS, RESULT_CACHE_ENTRIES, RESULT_CACHE_BYTES
+)
+from . import metrics
+from .profiler import SlowRequestProfiler
+import asyncio
+import hmac
 import os
-import re
 import json
 import logging
-from langchain_ollama import ChatOllama
-from langchain.callbacks.base import BaseCallbackHandler
-from fastapi.responses import StreamingResponse
-import asyncio
+import threading
+import time
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+# The dataset modules pull in pandas, pyarrow and the search libraries; they are imported by the
+# warmup task, after the server already answers /health
+if TYPE_CHECKING:
+    import pandas as pd
+    from .filters import RecipeConstraints
+    from .recommender import MealRecommender
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 app = FastAPI()
 
 
-# Health check endpoint
+# Health check endpoint: the process is up, though it may still be warming up (see /ready)
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
@@ -33,21 +49,47 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Initialize global variables
-processed_data = None
-recommender = None
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Record per-route latency and in-flight counts, profiling slow requests when enabled."""
+    # Label by registered route only, so unknown paths can't create unbounded series
+    path = request.url.path
+    route = path if any(getattr(r, "path", None) == path for r in app.routes) else "other"
+    sampler = slow_request_profiler.start() if slow_request_profiler is not None else None
+    REQUESTS_IN_FLIGHT.inc(route=route)
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        duration = time.perf_counter() - start
+        REQUESTS_IN_FLIGHT.dec(route=route)
+        REQUEST_SECONDS.observe(duration, route=route)
+        if sampler is not None:
+            slow_request_profiler.finish(sampler, f"{request.method} {path}", duration)
 
-class StreamingCallbackHandler(BaseCallbackHandler):
-    """Handler for streaming tokens from LLM to FastAPI response."""
-    
-    def __init__(self):
-        self.queue = asyncio.Queue()
+@app.get("/metrics")
+def metrics_endpoint():
+    """Expose the service metrics in the Prometheus text format."""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        await self.queue.put(token)
+# Initialize global variables
+recipe_store = None
+recommender = None
+recommendation_pool = None
+summary_llm = None
+summary_cache = None
+slow_request_profiler = None
+reload_lock = threading.Lock()
+changes_lock = threading.Lock()
+last_generation_check = 0.0
+reload_task = None
+reload_status: Dict[str, Any] = {"state": "idle", "dataset_version": None, "started_at": None, "finished_at": None, "error": None}
+warmup_task = None
+# Phases: starting, importing, loading_dataset, building_indexes, starting_workers, then ready or failed
+warmup_status: Dict[str, Any] = {"phase": "starting", "started_at": None, "ready_at": None, "error": None}
 
-    async def get_token(self) -> str:
-        return await self.queue.get()
+# Seconds between checks for a newer shared index generation
+GENERATION_CHECK_INTERVAL = 1.0
 
 class UserPreferences(BaseModel):
     """Model to represent user dietary preferences and goals."""
@@ -64,63 +106,304 @@ class UserPreferences(BaseModel):
         "light muscle gain", "moderate muscle gain", "extreme muscle gain", "maintain weight"
     ]
     meals_per_day: int
+    # Optional hard limits on the recommended recipes
+    max_total_minutes: Optional[int] = None
+    exclude_categories: List[str] = []
+    max_nutrients: Dict[Literal[tuple(NUTRITIONAL_COLUMNS)], float] = {}
+    include_ingredients: List[str] = []
+    exclude_ingredients: List[str] = []
+
+    def constraints(self) -> Optional["RecipeConstraints"]:
+        """The recipe constraints of these preferences, or None when there are none."""
+        from .filters import RecipeConstraints
+        constraints = RecipeConstraints(
+            self.max_total_minutes, self.exclude_categories, self.max_nutrients, self.include_ingredients,
+            self.exclude_ingredients,
+        )
+        return constraints or None
+
+    def check_limits(self) -> None:
+        """
+        Reject preferences no meal type can be recommended for.
+
+        Raises:
+            ValueError: When there are no meals or the time limit is negative.
+        """
+        if self.meals_per_day < 1:
+            raise ValueError("meals_per_day must be at least 1")
+        if self.max_total_minutes is not None and self.max_total_minutes < 0:
+            raise ValueError("max_total_minutes must not be negative")
+
+class MealPlanPreferences(UserPreferences):
+    """Model to represent user preferences for a plan of one recipe per meal over several days."""
+
+    days: int = 1
+
+class RecipeChanges(BaseModel):
+    """Model to represent recipes to add, replace or remove without a reload."""
+
+    # Raw records with the columns of recipes.parquet and recipes_ingredients.csv
+    upsert: List[Dict[str, Any]] = []
+    delete: List[int] = []
+
+def load_recommender(on_phase: Optional[Callable[[str], None]] = None) -> "MealRecommender":
+    """
+    Load the dataset, processing it first if the input files changed, and build a recommender over it.
+
+    Args:
+        on_phase (callable): Called with the name of each step as it starts, for warmup reporting.
+
+    Returns:
+        MealRecommender: Recommender serving the current input files.
+    """
+    on_phase = on_phase or (lambda phase: None)
+    on_phase("importing")
+    from .recommender import RecipeDataProcessor, MealRecommender
+    from .shared_index import SharedIndex
+    from .search import search_backend_from_env
 
-def initialize_data():
-    """Initialize and cache processed data and recommender."""
-    global processed_data, recommender
-    logging.info("Initializing data and recommender...")
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
-    print(base_dir)
-    recipe_file = os.path.join(base_dir, "data", "recipes.parquet")
-    ingredient_file = os.path.join(base_dir, "data", "recipes_ingredients.csv")
-
-    processor = RecipeDataProcessor(recipe_file, ingredient_file)
-    processed_data = processor.process_data()
-    recommender = MealRecommender(
-        processed_data,
-        ['calories', 'proteinContent', 'fatContent', 'saturatedFatContent', 
-         'carbohydrateContent', 'fiberContent', 'sugarContent', 
-         'cholesterolContent', 'sodiumContent']
+    data_dir = os.getenv("DATA_DIR", os.path.join(base_dir, "data"))
+    recipe_file = os.path.join(data_dir, "recipes.parquet")
+    ingredient_file = os.path.join(data_dir, "recipes_ingredients.csv")
+    cache_dir = os.getenv("DATASET_CACHE_DIR", os.path.join(data_dir, "cache"))
+
+    memory_limit = int(os.getenv("INGEST_MEMORY_LIMIT_MB", "256")) * 1024 * 1024
+    processor = RecipeDataProcessor(recipe_file, ingredient_file, cache_dir=cache_dir, memory_limit=memory_limit)
+    on_phase("loading_dataset")
+    store = processor.load_or_process()
+    on_phase("building_indexes")
+    return MealRecommender(
+        store,
+        NUTRITIONAL_COLUMNS,
+        dataset_version=processor.dataset_version,
+        result_cache=ResultCache.from_env(),
+        shared_index=SharedIndex.from_env(),
+        search_backend=search_backend_from_env()
     )
+
+def initialize_data(on_phase: Optional[Callable[[str], None]] = None):
+    """Initialize and cache processed data and recommender."""
+    global recipe_store, recommender
+    logging.info("Initializing data and recommender...")
+    recommender = load_recommender(on_phase)
+    recipe_store = recommender.store
     logging.info("Data and recommender initialized successfully.")
 
-def clean_and_validate_json_string(json_string: str) -> str:
+def ensure_current_data():
     """
-    Clean and validate JSON string by ensuring correct format.
-    
+    Re-attach to the data and index when another worker has published a new shared index generation.
+
+    One request at a time runs the check, at most once per GENERATION_CHECK_INTERVAL; the others
+    carry on with the recommender they have instead of waiting for the re-attach.
+    """
+    global last_generation_check, recipe_store, recommender
+    if recommender.shared_index is None or not reload_lock.acquire(blocking=False):
+        return
+    try:
+        if time.monotonic() - last_generation_check < GENERATION_CHECK_INTERVAL:
+            return
+        last_generation_check = time.monotonic()
+        if recommender.index_is_current():
+            return
+        logging.info("A newer shared index generation was published, re-attaching.")
+        reattached = load_recommender()
+        with changes_lock:
+            recommender = reattached
+            recipe_store = reattached.store
+    finally:
+        reload_lock.release()
+
+def serialize_meal_plan(meal_plan: Dict[str, List[str]]) -> str:
+    """
+    Assemble a meal plan response from precomputed JSON meal payloads.
+
     Args:
-        json_string (str): Raw JSON string to clean and validate.
+        meal_plan (dict): Mapping of meal type to JSON-encoded meal payloads.
 
     Returns:
-        str: Cleaned JSON string or '[]' if invalid.
+        str: JSON object mapping each meal type to its list of meals.
     """
-    if not json_string or not isinstance(json_string, str):
-        logging.warning("Received an empty or non-string JSON input.")
-        return '[]'
-    
-    json_string = json_string.strip()
-    if json_string.startswith("[") and json_string.endswith("]"):
-        json_string = re.sub(r',\s*]', ']', json_string)
-        json_string = re.sub(r',\s*}', '}', json_string)
-        return json_string
-    else:
-        logging.warning(f"Invalid JSON format: {json_string}")
-        return '[]'
+    return "{" + ",".join(f"{json.dumps(meal)}:[{','.join(payloads)}]" for meal, payloads in meal_plan.items()) + "}"
+
+def serialize_day_plan(store, meal_types: List[str], rows) -> str:
+    """
+    Assemble one day of a meal plan from precomputed JSON meal payloads.
+
+    Args:
+        store (RecipeStore): Store holding the planned recipes.
+        meal_types (list): Meal type of each slot.
+        rows (array): Row position of the recipe planned for each slot, -1 for an empty slot.
+
+    Returns:
+        str: JSON object with the meal of each filled slot and the day's nutrient totals.
+    """
+    planned = [(meal, row) for meal, row in zip(meal_types, rows) if row >= 0]
+    planned_rows = [row for _, row in planned]
+    payloads = store.payloads(planned_rows) if planned else []
+    totals = store.feature_rows(planned_rows).sum(axis=0) if planned else [0.0] * len(NUTRITIONAL_COLUMNS)
+    meals = ",".join(f"{json.dumps(meal)}:{payload}" for (meal, _), payload in zip(planned, payloads))
+    return f'{{"meals":{{{meals}}},"totals":{json.dumps(dict(zip(NUTRITIONAL_COLUMNS, map(float, totals))))}}}'
+
+def serialize_meal_line(meal: str, payloads: List[str], index: Optional[int] = None) -> str:
+    """
+    Assemble one NDJSON line of a streamed meal recommendation from precomputed JSON meal payloads.
+
+    Args:
+        meal (str): Meal type.
+        payloads (list): JSON-encoded meal payloads.
+        index (int): Position of the user in a batch request, omitted for single requests.
+
+    Returns:
+        str: JSON object with the meal type and its meals, terminated by a newline.
+    """
+    prefix = "" if index is None else f'"index":{index},'
+    return f'{{{prefix}"mealType":{json.dumps(meal)},"meals":[{",".join(payloads)}]}}\n'
 
 @app.on_event("startup")
-def startup_event():
-    """Initialize data when the application starts."""
-    initialize_data()
+async def startup_event():
+    """
+    Set up the recommendation pool and the LLM clients, and start loading the data in the
+    background so the server answers /health right away; /ready reports when it can recommend.
+    """
+    global recommendation_pool, summary_llm, summary_cache, slow_request_profiler, warmup_task
+    slow_request_profiler = SlowRequestProfiler.from_env()
+    # Process workers load their own recommender from the dataset artifact
+    recommendation_pool = RecommendationPool.from_env(initializer=initialize_data)
+    POOL_IN_FLIGHT.set_function(lambda: recommendation_pool.in_flight)
+    summary_llm = SummaryLLM.from_env()
+    summary_cache = SummaryCache(
+        max_entries=int(os.getenv("SUMMARY_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("SUMMARY_CACHE_TTL", "3600"))
+    )
+    SUMMARY_CACHE_LOOKUPS.set_function(lambda: summary_cache.stats()["hits"], result="hit")
+    SUMMARY_CACHE_LOOKUPS.set_function(lambda: summary_cache.stats()["misses"], result="miss")
+    SUMMARY_CACHE_SHARED.set_function(lambda: summary_cache.stats()["shared"])
+    SUMMARY_CACHE_ENTRIES.set_function(lambda: summary_cache.stats()["entries"])
+    SUMMARY_GENERATIONS_IN_FLIGHT.set_function(lambda: summary_cache.stats()["in_flight"])
+    RESULT_CACHE_LOOKUPS.set_function(lambda: result_cache_stats().get("hits", 0), result="hit")
+    RESULT_CACHE_LOOKUPS.set_function(lambda: result_cache_stats().get("misses", 0), result="miss")
+    RESULT_CACHE_EVICTIONS.set_function(lambda: result_cache_stats().get("evictions", 0))
+    RESULT_CACHE_SHARED_ERRORS.set_function(lambda: result_cache_stats().get("shared_errors", 0))
+    RESULT_CACHE_ENTRIES.set_function(lambda: result_cache_stats().get("entries", 0))
+    RESULT_CACHE_BYTES.set_function(lambda: result_cache_stats().get("bytes", 0))
+    warmup_status.update(phase="starting", started_at=time.time(), ready_at=None, error=None)
+    WARMUP_SECONDS.set_function(warmup_seconds)
+    warmup_task = asyncio.create_task(run_warmup())
+
+def result_cache_stats() -> Dict[str, int]:
+    """
+    Counters of the serving recommender's result cache, read by /metrics.
 
-async def async_generator_wrapper(generator):
-    """Convert a generator to an asynchronous iterator."""
-    for item in generator:
-        yield item
-        await asyncio.sleep(0.05)
+    A reload builds a new cache, so its counters restart from zero. With RECOMMENDER_POOL=process
+    the workers' caches serve the requests and these only cover the serving process.
+
+    Returns:
+        dict: ResultCache.stats(), or nothing while loading or when the cache is disabled.
+    """
+    cache = None if recommender is None else recommender.result_cache
+    return {} if cache is None else cache.stats()
+
+def set_warmup_phase(phase: str) -> None:
+    """Record the warmup step now running; called from the warmup thread."""
+    logging.info(f"Warmup: {phase}")
+    warmup_status["phase"] = phase
+
+async def run_warmup():
+    """
+    Load the data, build the indexes and the LLM clients off the event loop and start the pool's
+    workers, recording progress in the warmup status.
+    """
+    try:
+        await asyncio.to_thread(initialize_data, set_warmup_phase)
+        set_warmup_phase("starting_workers")
+        await asyncio.to_thread(summary_llm.clients)
+        await recommendation_pool.warm_up()
+        warmup_status.update(phase="ready", ready_at=time.time())
+        logging.info(f"Ready to serve recommendations after {warmup_seconds():.2f}s")
+    except Exception as e:
+        logging.error(f"Warmup failed, recommendations are unavailable: {e}")
+        warmup_status.update(phase="failed", error=str(e))
+
+def warmup_seconds() -> float:
+    """Seconds from startup until the service became ready, or so far while it is warming up."""
+    if warmup_status["started_at"] is None:
+        return 0.0
+    return (warmup_status["ready_at"] or time.time()) - warmup_status["started_at"]
+
+def require_ready() -> None:
+    """
+    Reject requests that need the recommender while it is still loading.
+
+    Raises:
+        HTTPException: 503 with Retry-After until warmup has finished.
+    """
+    if warmup_status["phase"] != "ready":
+        raise HTTPException(
+            status_code=503, detail="Service is warming up, please retry shortly", headers={"Retry-After": "5"}
+        )
+
+@app.get("/ready")
+def readiness_check():
+    """
+    Report whether the service can serve recommendations, for load balancer readiness probes.
+
+    Returns:
+        JSONResponse: 200 once the data and indexes are loaded, 503 before that or if warmup failed,
+        with the warmup phase, its timings, the dataset version and each meal type's index.
+    """
+    current = recommender
+    ready = warmup_status["phase"] == "ready" and current is not None
+    indexes = {} if current is None else {
+        meal: {"recipes": len(index), "search_backend": index.searcher.key} for meal, index in current.indexes.items()
+    }
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "status": "ready" if ready else "unavailable",
+        **warmup_status,
+        "warmup_seconds": warmup_seconds(),
+        "dataset_version": None if current is None else current.dataset_version,
+        "shared_index": current is not None and current.shared_index is not None,
+        "indexes": indexes,
+    })
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Release the recommendation pool's workers."""
+    if recommendation_pool is not None:
+        recommendation_pool.shutdown()
+
+def summary_prompt_inputs(preferences, nutrients) -> Dict[str, Any]:
+    """
+    Normalize and quantize the inputs of the summary prompt.
+
+    Users whose inputs only differ below this precision get functionally identical summaries,
+    so the result doubles as the summary cache key.
+
+    Args:
+        preferences (UserPreferences): User's dietary preferences.
+        nutrients (dict): Nutritional profile based on preferences.
+
+    Returns:
+        dict: Quantized prompt inputs.
+    """
+    return {
+        "age": preferences.age,
+        "sex": preferences.sex,
+        "weight": int(round(preferences.weight)),
+        "height": preferences.height,
+        "activity_level": preferences.activity_level,
+        "goal": preferences.goal,
+        "calories": int(round(nutrients['calories'], -1)),
+        "protein": int(round(nutrients['proteinContent'])),
+        "carbs": int(round(nutrients['carbohydrateContent'])),
+        "fat": int(round(nutrients['fatContent'])),
+    }
 
 async def generate_summary_stream(preferences, nutrients) -> AsyncGenerator[str, None]:
     """
     Generate and stream summary based on user preferences and nutrient profile using LLM.
+
+    Identical (quantized) requests are replayed from the summary cache or share one generation.
     
     Args:
         preferences (UserPreferences): User's dietary preferences.
@@ -129,13 +412,13 @@ async def generate_summary_stream(preferences, nutrients) -> AsyncGenerator[str,
     Yields:
         str: Streaming chunks of generated summary.
     """
-    logging.info("Generating summary stream with LLM.")
+    inputs = summary_prompt_inputs(preferences, nutrients)
     prompt = (
-        f"User details: {preferences.age} years old, {preferences.sex}, weighing {preferences.weight} kg, "
-        f"height {preferences.height} cm, activity level: {preferences.activity_level}, "
-        f"goal: {preferences.goal}. Nutritional needs: approximately {int(nutrients['calories'])} calories, "
-        f"{int(nutrients['proteinContent'])}g protein, {int(nutrients['carbohydrateContent'])}g carbs, "
-        f"and {int(nutrients['fatContent'])}g fat daily."
+        f"User details: {inputs['age']} years old, {inputs['sex']}, weighing {inputs['weight']} kg, "
+        f"height {inputs['height']} cm, activity level: {inputs['activity_level']}, "
+        f"goal: {inputs['goal']}. Nutritional needs: approximately {inputs['calories']} calories, "
+        f"{inputs['protein']}g protein, {inputs['carbs']}g carbs, "
+        f"and {inputs['fat']}g fat daily."
     )
         
     messages = [
@@ -157,29 +440,37 @@ async def generate_summary_stream(preferences, nutrients) -> AsyncGenerator[str,
         ),
         ("user", prompt)
     ]
-    print(messages)
-    
-    try:
-        llm = ChatOllama(
-            model="llama3.2:1b",
-            temperature=0.2,
-            num_predict=256,
-            base_url="http://ollama:11434",
-            callbacks=[StreamingCallbackHandler()]
-            )
-        token_generator = llm.stream(messages)
-        async for chunk in async_generator_wrapper(token_generator):
-            yield chunk.content if hasattr(chunk, "content") else str(chunk)
-    except:
-        llm = ChatOllama(
-            model="llama3.2:latest",
-            temperature=0.2,
-            num_predict=256,
-            callbacks=[StreamingCallbackHandler()]
-            )
-        token_generator = llm.stream(messages)
-        async for chunk in async_generator_wrapper(token_generator):
-            yield chunk.content if hasattr(chunk, "content") else str(chunk)
+
+    def generate() -> AsyncIterator[str]:
+        logging.info("Generating summary stream with LLM.")
+        return summary_llm.astream(messages)
+
+    async for token in summary_cache.stream(tuple(inputs.items()), generate):
+        yield token
+
+def summary_nutrients(preferences: UserPreferences) -> Dict[str, float]:
+    """
+    Estimate a user's daily needs for their summary; runs off the event loop.
+
+    Only needs the formulas, not the data, so summaries work while warming up. Until warmup gets
+    there, the first summary imports the recommender module and creates the LLM clients.
+
+    Args:
+        preferences (UserPreferences): User preferences for summary generation.
+
+    Returns:
+        dict: Daily nutritional needs.
+    """
+    from .recommender import MealRecommender
+    summary_llm.clients()
+    return MealRecommender.estimate_daily_nutritional_needs(
+        age=preferences.age,
+        sex=preferences.sex,
+        weight=preferences.weight,
+        height=preferences.height,
+        activity_level=preferences.activity_level,
+        goal=preferences.goal
+    )
 
 @app.post("/recommend-summary/")
 async def recommend_summary(preferences: UserPreferences):
@@ -194,81 +485,254 @@ async def recommend_summary(preferences: UserPreferences):
     """
     logging.info(f"Received user preferences: {preferences}")
     try:
-        nutrients = recommender.estimate_daily_nutritional_needs(
-            age=preferences.age, 
-            sex=preferences.sex, 
-            weight=preferences.weight, 
-            height=preferences.height,
-            activity_level=preferences.activity_level, 
-            goal=preferences.goal
-        )
+        nutrients = await asyncio.to_thread(summary_nutrients, preferences)
         logging.info("Nutritional needs calculated successfully.")
         return StreamingResponse(generate_summary_stream(preferences, nutrients), media_type="text/plain")
     except Exception as e:
         logging.error(f"Error generating summary: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while generating the summary.")
 
+def compute_meal_recommendations(preferences: UserPreferences) -> str:
+    """
+    Compute a user's meal recommendations; CPU-bound, so it runs on the recommendation pool.
+
+    Args:
+        preferences (UserPreferences): User preferences for meal recommendations.
+
+    Returns:
+        str: JSON-encoded meal recommendations.
+    """
+    ensure_current_data()
+    # A reload or upsert swaps the global; finish this request on the recommender it started with
+    current = recommender
+    user_per_meal_needs_df = per_meal_needs(current, preferences)
+    
+    meal_types = MEAL_TYPES[:preferences.meals_per_day]
+    
+    constraints = preferences.constraints()
+    meal_recommendations = {
+        meal: current.recommend_payloads(user_per_meal_needs_df, meal, constraints=constraints) for meal in meal_types
+    }
+    with RECOMMEND_PHASE_SECONDS.time(phase="assemble"):
+        return serialize_meal_plan(meal_recommendations)
+
+def per_meal_needs(current: "MealRecommender", preferences: UserPreferences) -> "pd.DataFrame":
+    """
+    Split a user's daily nutritional needs evenly over their meals.
+
+    Args:
+        current (MealRecommender): Recommender serving the request.
+        preferences (UserPreferences): User preferences.
+
+    Returns:
+        pd.DataFrame: Single-row frame of per-meal needs.
+    """
+    import pandas as pd
+    nutrients = current.estimate_daily_nutritional_needs(
+        age=preferences.age, 
+        sex=preferences.sex, 
+        weight=preferences.weight, 
+        height=preferences.height,
+        activity_level=preferences.activity_level, 
+        goal=preferences.goal
+    )
+    logging.info(f"User nutritional needs calculated for meal recommendations: {nutrients}")
+    return pd.DataFrame([{k: v / preferences.meals_per_day for k, v in nutrients.items()}])
+
+def compute_meal_type_line(preferences: UserPreferences, meal: str) -> str:
+    """
+    Compute a user's recommendations of one meal type, as a line of a streamed response; runs on the pool.
+
+    Args:
+        preferences (UserPreferences): User preferences for meal recommendations.
+        meal (str): Meal type.
+
+    Returns:
+        str: NDJSON line with the meal type's recommendations.
+    """
+    ensure_current_data()
+    current = recommender
+    payloads = current.recommend_payloads(per_meal_needs(current, preferences), meal, constraints=preferences.constraints())
+    with RECOMMEND_PHASE_SECONDS.time(phase="assemble"):
+        return serialize_meal_line(meal, payloads)
+
+def compute_batch_meal_type_lines(preferences: List[UserPreferences], position: int) -> str:
+    """
+    Compute the recommendations of one meal slot for every user of a batch that has it; runs on the pool.
+
+    Args:
+        preferences (List[UserPreferences]): User preferences, one entry per user.
+        position (int): Slot in MEAL_TYPES.
+
+    Returns:
+        str: One NDJSON line per user having the slot, tagged with the user's index in the batch.
+    """
+    import pandas as pd
+    ensure_current_data()
+    current = recommender
+    profiles = pd.DataFrame([p.model_dump() for p in preferences])
+    constraints = [p.constraints() for p in preferences]
+    users = [user for user, p in enumerate(preferences) if p.meals_per_day > position]
+    meal = MEAL_TYPES[position]
+    recommendations = current.recommend_meal_type_batch(
+        current.per_meal_needs_batch(profiles), users, meal, constraints=constraints
+    )
+    with RECOMMEND_PHASE_SECONDS.time(phase="assemble"):
+        return "".join(serialize_meal_line(meal, payloads, user) for user, payloads in recommendations)
+
+def compute_batch_meal_recommendations(preferences: List[UserPreferences]) -> str:
+    """
+    Compute meal recommendations for many users; runs on the recommendation pool.
+
+    Args:
+        preferences (List[UserPreferences]): User preferences, one entry per user.
+
+    Returns:
+        str: JSON array of meal recommendations, in request order.
+    """
+    import pandas as pd
+    ensure_current_data()
+    current = recommender
+    profiles = pd.DataFrame([p.model_dump() for p in preferences])
+    constraints = [p.constraints() for p in preferences]
+    meal_plans = current.recommend_meals_batch(profiles, constraints=constraints) if len(profiles) else []
+    with RECOMMEND_PHASE_SECONDS.time(phase="assemble"):
+        return "[" + ",".join(serialize_meal_plan(plan) for plan in meal_plans) + "]"
+
+def compute_meal_plan(preferences: MealPlanPreferences) -> str:
+    """
+    Plan one recipe per meal for each day so that every day meets the daily needs; runs on the pool.
+
+    Args:
+        preferences (MealPlanPreferences): User preferences and number of days to plan.
+
+    Returns:
+        str: JSON object with the daily targets and, per day, the chosen meals and their totals.
+    """
+    from .planner import MealPlanner
+    ensure_current_data()
+    current = recommender
+    nutrients = current.estimate_daily_nutritional_needs(
+        age=preferences.age,
+        sex=preferences.sex,
+        weight=preferences.weight,
+        height=preferences.height,
+        activity_level=preferences.activity_level,
+        goal=preferences.goal
+    )
+    meal_types = MEAL_TYPES[:preferences.meals_per_day]
+    daily_needs = [nutrients[column] for column in NUTRITIONAL_COLUMNS]
+    plan = MealPlanner.from_env(current).plan(daily_needs, meal_types, preferences.days, preferences.constraints())
+
+    with RECOMMEND_PHASE_SECONDS.time(phase="assemble"):
+        days = ",".join(serialize_day_plan(current.store, meal_types, day_rows) for day_rows in plan)
+        return f'{{"targets":{json.dumps(dict(zip(NUTRITIONAL_COLUMNS, map(float, daily_needs))))},"days":[{days}]}}'
+
+async def run_on_pool(fn, *args):
+    """
+    Run a function on the recommendation pool, recording the metrics it observed.
+
+    Args:
+        fn (callable): Module-level function, so process workers can unpickle it.
+        *args: Positional arguments for the function.
+
+    Returns:
+        The function's result.
+    """
+    result, observations = await recommendation_pool.run(metrics.capture, fn, *args)
+    metrics.replay(observations)
+    return result
+
+def submit_all_to_pool(calls: List[tuple]) -> List[asyncio.Future]:
+    """
+    Start several functions on the recommendation pool at once, or none of them.
+
+    Args:
+        calls (list): Tuples of a module-level function and its positional arguments.
+
+    Returns:
+        list: Futures of each call's (result, metric observations), in call order.
+
+    Raises:
+        PoolSaturatedError: When the pool can't take every call; the accepted ones are cancelled.
+    """
+    futures = []
+    try:
+        for fn, *args in calls:
+            futures.append(recommendation_pool.submit(metrics.capture, fn, *args))
+    except PoolSaturatedError:
+        for future in futures:
+            future.cancel()
+        raise
+    return futures
+
+async def stream_lines(meal_types: List[str], futures: List[asyncio.Future]) -> AsyncGenerator[str, None]:
+    """
+    Stream the NDJSON lines computed for each meal type, in order, as soon as each is ready.
+
+    A meal type that fails becomes an error line, since the response has already started.
+
+    Args:
+        meal_types (list): Meal type each future computes.
+        futures (list): Futures from submit_all_to_pool.
+
+    Yields:
+        str: NDJSON lines.
+    """
+    try:
+        for meal, future in zip(meal_types, futures):
+            try:
+                lines, observations = await future
+                metrics.replay(observations)
+            except ValueError as e:
+                logging.error(f"Invalid input for {meal}: {str(e)}")
+                lines = serialize_error_line(meal, "Invalid data or input")
+            except Exception as e:
+                logging.error(f"An error occurred for {meal}: {str(e)}")
+                lines = serialize_error_line(meal, "An error occurred")
+            yield lines
+    finally:
+        # The client may disconnect early; drop the meal types not started yet
+        for future in futures:
+            future.cancel()
+
+def serialize_error_line(meal: str, detail: str) -> str:
+    """NDJSON line reporting that a meal type could not be recommended."""
+    return f'{{"mealType":{json.dumps(meal)},"error":{json.dumps(detail)}}}\n'
+
+def pool_saturated_exception(e: PoolSaturatedError) -> HTTPException:
+    """Map a saturated recommendation pool to a retryable 503."""
+    logging.warning(str(e))
+    return HTTPException(
+        status_code=503, detail="Server busy, please retry shortly", headers={"Retry-After": "1"}
+    )
+
 @app.post("/recommend-meals/")
-async def recommend_meals(preferences: UserPreferences):
+async def recommend_meals(preferences: UserPreferences, stream: bool = False):
     """
     Generate meal recommendations based on user preferences.
 
     Args:
         preferences (UserPreferences): User preferences for meal recommendations.
+        stream (bool): Stream one NDJSON line per meal type as soon as it is ready.
 
     Returns:
         dict: Meal recommendations based on user preferences.
     """
     logging.info(f"Received preferences for meal recommendation: {preferences}")
+    require_ready()
     try:
-        nutrients = recommender.estimate_daily_nutritional_needs(
-            age=preferences.age, 
-            sex=preferences.sex, 
-            weight=preferences.weight, 
-            height=preferences.height,
-            activity_level=preferences.activity_level, 
-            goal=preferences.goal
-        )
-        logging.info(f"User nutritional needs calculated for meal recommendations: {nutrients}")
-        
-        user_per_meal_needs = {k: v / preferences.meals_per_day for k, v in nutrients.items()}
-        user_per_meal_needs_df = pd.DataFrame([user_per_meal_needs])
-        
-        possible_meal_types = ["Breakfast", "Lunch", "Dinner", "Snacks"]
-        meal_types = possible_meal_types[:preferences.meals_per_day]
-        
-        meal_recommendations = {}
-        for meal in meal_types:
-            meals = recommender.recommend_meals(user_per_meal_needs_df, meal).to_dict(orient='records')
-            for m in meals:
-                try:
-                    ingredients_raw = clean_and_validate_json_string(m.get("ingredientsRaw", "[]"))
-                    steps_raw = clean_and_validate_json_string(m.get("steps", "[]"))
-                    m["ingredients"] = json.loads(ingredients_raw) if ingredients_raw != '[]' else ["Data unavailable due to formatting issues"]
-                    m["steps"] = json.loads(steps_raw) if steps_raw != '[]' else ["Data unavailable due to formatting issues"]
-                except json.JSONDecodeError as e:
-                    logging.error(f"JSON decoding error for meal '{m['name']}': {e}")
-                    m["ingredients"], m["steps"] = ["Data unavailable"], ["Data unavailable"]
-
-                m["nutrition"] = {
-                    "Protein": f"{m.get('proteinContent', 'N/A')}g",
-                    "Fat": f"{m.get('fatContent', 'N/A')}g",
-                    "Saturated Fat": f"{m.get('saturatedFatContent', 'N/A')}g",
-                    "Carbohydrates": f"{m.get('carbohydrateContent', 'N/A')}g",
-                    "Fiber": f"{m.get('fiberContent', 'N/A')}g",
-                    "Sugar": f"{m.get('sugarContent', 'N/A')}g",
-                    "Cholesterol": f"{m.get('cholesterolContent', 'N/A')}mg",
-                    "Sodium": f"{m.get('sodiumContent', 'N/A')}mg"
-                }
-
-                m["servings"] = m.get("servings", "N/A")
-                m["serving_size"] = m.get("servingSize", "N/A")
-                m["prep_time"] = m.get("prepTime", "N/A")
-                m["cook_time"] = m.get("cookTime", "N/A")
-            meal_recommendations[meal] = meals
+        preferences.check_limits()
+        if stream:
+            meal_types = MEAL_TYPES[:preferences.meals_per_day]
+            futures = submit_all_to_pool([(compute_meal_type_line, preferences, meal) for meal in meal_types])
+            return StreamingResponse(stream_lines(meal_types, futures), media_type="application/x-ndjson")
+        content = await run_on_pool(compute_meal_recommendations, preferences)
         logging.info("Meal recommendations generated successfully.")
-        return meal_recommendations
+        return Response(content=content, media_type="application/json")
 
+    except PoolSaturatedError as e:
+        raise pool_saturated_exception(e)
     except FileNotFoundError as e:
         logging.error(f"File not found: {str(e)}")
         raise HTTPException(status_code=500, detail="Data file not found")
@@ -277,4 +741,221 @@ async def recommend_meals(preferences: UserPreferences):
         raise HTTPException(status_code=400, detail="Invalid data or input")
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
-        raise HTTPException(status_code=500, detail="An error occurred")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An error occurred")
+
+@app.post("/recommend-meals/batch")
+async def recommend_meals_batch(preferences: List[UserPreferences], stream: bool = False):
+    """
+    Generate meal recommendations for many users in one request.
+
+    Args:
+        preferences (List[UserPreferences]): User preferences, one entry per user.
+        stream (bool): Stream NDJSON lines, one per user and meal type tagged with the user's
+            index, as soon as each meal type is ready for the whole batch.
+
+    Returns:
+        list: Meal recommendations for each user, in request order.
+    """
+    logging.info(f"Received batch meal recommendation request for {len(preferences)} users")
+    require_ready()
+    try:
+        for p in preferences:
+            p.check_limits()
+        if stream:
+            meal_types = MEAL_TYPES[:max((p.meals_per_day for p in preferences), default=0)]
+            futures = submit_all_to_pool(
+                [(compute_batch_meal_type_lines, preferences, position) for position in range(len(meal_types))]
+            )
+            return StreamingResponse(stream_lines(meal_types, futures), media_type="application/x-ndjson")
+        content = await run_on_pool(compute_batch_meal_recommendations, preferences)
+        logging.info("Batch meal recommendations generated successfully.")
+        return Response(content=content, media_type="application/json")
+    except PoolSaturatedError as e:
+        raise pool_saturated_exception(e)
+    except ValueError as e:
+        logging.error(f"Invalid input: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid data or input")
+    except Exception as e:
+        logging.error(f"An error occurred: {str(e)}")
+        raise HTTPException(status_code=500, detail="An error occurred")
+
+@app.post("/recommend-meal-plan/")
+async def recommend_meal_plan(preferences: MealPlanPreferences):
+    """
+    Plan one recipe per meal for one or more days, matching the daily needs as a whole.
+
+    Args:
+        preferences (MealPlanPreferences): User preferences and number of days to plan.
+
+    Returns:
+        dict: Daily targets and, for each day, the chosen meals and their nutrient totals.
+    """
+    logging.info(f"Received preferences for a {preferences.days}-day meal plan: {preferences}")
+    require_ready()
+    try:
+        preferences.check_limits()
+        content = await run_on_pool(compute_meal_plan, preferences)
+        logging.info("Meal plan generated successfully.")
+        return Response(content=content, media_type="application/json")
+    except PoolSaturatedError as e:
+        raise pool_saturated_exception(e)
+    except ValueError as e:
+        logging.error(f"Invalid input: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid data or input")
+    except Exception as e:
+        logging.error(f"An error occurred: {str(e)}")
+        raise HTTPException(status_code=500, detail="An error occurred")
+
+def require_admin(token: Optional[str]) -> None:
+    """
+    Check the admin token sent with a request.
+
+    Args:
+        token (str): Value of the X-Admin-Token header.
+
+    Raises:
+        HTTPException: 403 when ADMIN_TOKEN is unset, 401 when the token does not match.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if token is None or not hmac.compare_digest(token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def reload_recommender() -> str:
+    """
+    Rebuild the recommender from the input files and swap it in; runs off the event loop.
+
+    Returns:
+        str: Dataset version now being served.
+    """
+    global recipe_store, recommender
+    logging.info("Reloading data and recommender...")
+    reloaded = load_recommender()
+    with changes_lock:
+        # Requests already running keep the recommender they started with
+        recommender = reloaded
+        recipe_store = reloaded.store
+    logging.info(f"Reloaded dataset version {reloaded.dataset_version}")
+    return reloaded.dataset_version
+
+async def run_reload():
+    """Run a reload in the background, recording its outcome in the reload status."""
+    global recommendation_pool
+    try:
+        reload_status["dataset_version"] = await asyncio.to_thread(reload_recommender)
+        if recommendation_pool.kind == "process":
+            # Process workers hold their own copy of the data; retire them once their queued work is done
+            previous_pool = recommendation_pool
+            pool = RecommendationPool.from_env(initializer=initialize_data)
+            try:
+                await pool.warm_up()
+            except Exception:
+                pool.shutdown()
+                raise
+            recommendation_pool = pool
+            previous_pool.shutdown(cancel_pending=False)
+        reload_status["state"] = "succeeded"
+        if warmup_status["phase"] == "failed":
+            await asyncio.to_thread(summary_llm.clients)
+            warmup_status.update(phase="ready", ready_at=time.time(), error=None)
+    except Exception as e:
+        logging.error(f"Reload failed, still serving the previous dataset: {e}")
+        reload_status["state"] = "failed"
+        reload_status["error"] = str(e)
+    finally:
+        reload_status["finished_at"] = time.time()
+
+@app.post("/admin/reload", status_code=202)
+async def start_reload(x_admin_token: Optional[str] = Header(None)):
+    """
+    Reload the dataset from the input files in the background, without dropping requests.
+
+    Args:
+        x_admin_token (str): Admin token, see ADMIN_TOKEN.
+
+    Returns:
+        dict: Reload status; poll GET /admin/reload for the outcome.
+    """
+    global reload_task
+    require_admin(x_admin_token)
+    if reload_status["state"] == "running":
+        raise HTTPException(status_code=409, detail="A reload is already running")
+    # A failed warmup can be retried with a reload, but one still running would race it
+    if warmup_status["phase"] not in ("ready", "failed"):
+        raise HTTPException(status_code=409, detail="The service is still warming up")
+    reload_status.update(state="running", started_at=time.time(), finished_at=None, error=None)
+    reload_task = asyncio.create_task(run_reload())
+    return reload_status
+
+@app.get("/admin/reload")
+async def get_reload_status(x_admin_token: Optional[str] = Header(None)):
+    """
+    Report the state of the last reload.
+
+    Args:
+        x_admin_token (str): Admin token, see ADMIN_TOKEN.
+
+    Returns:
+        dict: State ('idle', 'running', 'succeeded' or 'failed'), served dataset version and timings.
+    """
+    require_admin(x_admin_token)
+    return {**reload_status, "dataset_version": None if recommender is None else recommender.dataset_version}
+
+def apply_recipe_changes(changes: RecipeChanges) -> Dict[str, Any]:
+    """
+    Process upserted recipes and swap in a recommender with the changes applied.
+
+    Args:
+        changes (RecipeChanges): Recipes to upsert and ids to delete.
+
+    Returns:
+        dict: New dataset version, the number of recipes upserted and deleted, and the number of
+        upserted records dropped as incomplete.
+
+    Raises:
+        ValueError: When no upserted record is complete and no id to delete exists.
+    """
+    global recipe_store, recommender
+    import pandas as pd
+    from .recommender import RecipeDataProcessor
+    upserts = RecipeDataProcessor.process_records(pd.DataFrame(changes.upsert)) if changes.upsert else None
+    with changes_lock:
+        updated = recommender.with_changes(upserts, changes.delete)
+        recommender = updated
+        recipe_store = updated.store
+    return {
+        "dataset_version": updated.dataset_version,
+        **updated.applied_changes,
+        "rejected": len(changes.upsert) - (0 if upserts is None else len(upserts)),
+    }
+
+@app.post("/admin/recipes")
+async def change_recipes(changes: RecipeChanges, x_admin_token: Optional[str] = Header(None)):
+    """
+    Add, replace or remove recipes in memory, without a reload.
+
+    Changes apply to this process only and are lost on the next reload or restart; update the
+    input files for durable changes.
+
+    Args:
+        changes (RecipeChanges): Recipes to upsert and ids to delete.
+        x_admin_token (str): Admin token, see ADMIN_TOKEN.
+
+    Returns:
+        dict: New dataset version, the number of recipes upserted and deleted, and the number of
+        upserted records rejected as incomplete.
+    """
+    require_admin(x_admin_token)
+    require_ready()
+    if recommendation_pool.kind == "process" or recommender.shared_index is not None:
+        raise HTTPException(
+            status_code=409, detail="Upserts need a thread pool without a shared index; update the files and reload"
+        )
+    try:
+        result = await asyncio.to_thread(apply_recipe_changes, changes)
+        logging.info(f"Applied recipe changes, now serving dataset version {result['dataset_version']}")
+        return result
+    except (KeyError, ValueError) as e:
+        logging.error(f"Invalid recipe changes: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid recipe records")
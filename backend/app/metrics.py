@@ -0,0 +1,261 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; the request-path phases take microseconds to milliseconds, startup stages up to minutes
+PHASE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_capture = threading.local()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render a Prometheus label set, escaping the values."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """Cumulative latency histogram, optionally split by labels, in the Prometheus data model."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = REQUEST_BUCKETS) -> None:
+        """
+        Create a histogram.
+
+        :param name: Metric name, e.g. 'mealplan_recommend_phase_seconds'.
+        :param documentation: Help text shown by /metrics.
+        :param labelnames: Names of the labels every observation must provide.
+        :param buckets: Sorted upper bounds of the buckets; +Inf is added automatically.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record one observation.
+
+        Inside ``capture`` the observation is buffered instead, so work done in another
+        process can be replayed into the serving process's registry.
+
+        :param value: Observed value, in seconds for latencies.
+        :param labels: Value of every label in labelnames.
+        """
+        buffer = getattr(_capture, "observations", None)
+        if buffer is not None:
+            buffer.append((self.name, labels, value))
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        # Layout: one counter per bucket plus +Inf, then the sum
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[position] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock duration of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        """Render the histogram in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {int(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {int(cumulative)}")
+        return lines
+
+
+class Gauge:
+    """Gauge, optionally split by labels, either set directly or read from a callback at scrape time."""
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        """
+        Create a gauge.
+
+        :param name: Metric name.
+        :param documentation: Help text shown by /metrics.
+        :param labelnames: Names of the labels every update must provide.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        """Report the callback's return value whenever the gauge is collected."""
+        self._functions[tuple(labels[name] for name in self.labelnames)] = function
+
+    def collect(self) -> List[str]:
+        """Render the gauge in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        with self._lock:
+            values = dict(self._values)
+        values.update({key: function() for key, function in self._functions.items()})
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Gauge):
+    """
+    Monotonic count, optionally split by labels. Usually read at scrape time from counters the
+    instrumented object keeps anyway; a restart or a replaced object resets it, as Prometheus expects.
+    """
+
+    TYPE = "counter"
+
+
+class Registry:
+    """Collection of metrics exposed together on /metrics."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric: Any) -> Any:
+        """Add a metric; returns it so registration can wrap construction."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Any]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(line for metric in self._metrics.values() for line in metric.collect()) + "\n"
+
+
+REGISTRY = Registry()
+
+PROCESSING_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "mealplan_processing_stage_seconds", "Duration of each dataset processing stage at startup.",
+    ("stage",), STAGE_BUCKETS
+))
+JSON_CLEANUP_SECONDS = REGISTRY.register(Histogram(
+    "mealplan_json_cleanup_seconds", "Duration of cleaning and validating the ingredient and step JSON.",
+    buckets=STAGE_BUCKETS
+))
+RECOMMEND_PHASE_SECONDS = REGISTRY.register(Histogram(
+    "mealplan_recommend_phase_seconds",
+    "Duration of each recommendation phase: filter, scale, search, serialize, cache and assemble.",
+    ("phase",), PHASE_BUCKETS
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "mealplan_http_request_seconds", "Time until the response headers are sent, per route.", ("route",)
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mealplan_http_requests_in_flight", "Requests currently being handled, per route.", ("route",)
+))
+POOL_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mealplan_recommendation_pool_in_flight", "Recommendation tasks running or queued on the pool."
+))
+WARMUP_SECONDS = REGISTRY.register(Gauge(
+    "mealplan_warmup_seconds", "Time from startup until the recommender was ready, or so far while warming up."
+))
+SUMMARY_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "mealplan_summary_cache_lookups_total", "Summary cache lookups, by result: hit or miss.", ("result",)
+))
+SUMMARY_CACHE_SHARED = REGISTRY.register(Counter(
+    "mealplan_summary_cache_shared_total", "Summary requests that joined an identical generation in flight."
+))
+SUMMARY_CACHE_ENTRIES = REGISTRY.register(Gauge(
+    "mealplan_summary_cache_entries", "Summaries currently cached."
+))
+SUMMARY_GENERATIONS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mealplan_summary_generations_in_flight", "Summary generations currently streaming from the LLM."
+))
+RESULT_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "mealplan_result_cache_lookups_total", "In-process meal result cache lookups, by result: hit or miss.",
+    ("result",)
+))
+RESULT_CACHE_EVICTIONS = REGISTRY.register(Counter(
+    "mealplan_result_cache_evictions_total", "Meal results evicted from the in-process cache to stay within its size."
+))
+RESULT_CACHE_SHARED_ERRORS = REGISTRY.register(Counter(
+    "mealplan_result_cache_shared_errors_total", "Failed lookups and stores on the shared result cache."
+))
+RESULT_CACHE_ENTRIES = REGISTRY.register(Gauge(
+    "mealplan_result_cache_entries", "Meal results currently in the in-process cache."
+))
+RESULT_CACHE_BYTES = REGISTRY.register(Gauge(
+    "mealplan_result_cache_bytes", "Size of the meal results currently in the in-process cache."
+))
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = REGISTRY.register(Histogram(
+    "mealplan_llm_time_to_first_token_seconds", "Time from sending the prompt to the first streamed token.",
+    ("model",)
+))
+LLM_STREAM_SECONDS = REGISTRY.register(Histogram(
+    "mealplan_llm_stream_seconds", "Total duration of an LLM summary stream.", ("model",)
+))
+
+
+def capture(fn: Callable[..., Any], *args: Any) -> Tuple[Any, List[tuple]]:
+    """
+    Call a function while buffering its histogram observations instead of recording them.
+
+    Used around work submitted to the recommendation pool: in a process worker the
+    observations would otherwise land in that worker's own registry, never scraped.
+
+    :param fn: Function to call.
+    :param args: Positional arguments for the function.
+    :return: Tuple of (result, observations); pass the observations to ``replay``.
+    """
+    previous = getattr(_capture, "observations", None)
+    _capture.observations = []
+    try:
+        result = fn(*args)
+        return result, _capture.observations
+    finally:
+        _capture.observations = previous
+
+
+def replay(observations: List[tuple]) -> None:
+    """Record observations buffered by ``capture``."""
+    for name, labels, value in observations:
+        REGISTRY.get(name).observe(value, **labels)
@@ -0,0 +1,174 @@
+import os
+import time
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+from .filters import RecipeConstraints
+
+
+class MealPlanner:
+    """
+    Choose one recipe per meal slot so that each day as a whole meets the daily nutritional needs.
+
+    Each slot's candidates are the recipes nearest to an even share of the daily needs, as
+    recommended by the MealRecommender. Combinations are searched with a beam search over partial
+    daily totals: after each slot only the most promising partial days are kept, scored by the
+    deviation of their total plus the average candidate of every slot still to fill. The best day
+    is then improved by swapping single slots while that lowers the deviation.
+
+    Multi-day plans are built one day at a time and never reuse a recipe. Once the time budget is
+    spent, remaining days fall back to a beam of one, i.e. a greedy choice per slot.
+    """
+
+    # Nutrients whose daily value is a limit rather than a target: only exceeding it counts
+    UPPER_LIMIT_COLUMNS = ('saturatedFatContent', 'sugarContent', 'cholesterolContent', 'sodiumContent')
+    # Longest plan accepted, in days
+    MAX_DAYS = 28
+    # Rounds of single-slot swaps tried on each planned day
+    MAX_SWAP_ROUNDS = 8
+
+    def __init__(self, recommender, candidates_per_slot: int = 40, beam_width: int = 64,
+                 time_budget: float = 0.2) -> None:
+        """
+        Configure the planner.
+
+        :param recommender: MealRecommender providing the candidates and their features.
+        :param candidates_per_slot: Nearest recipes considered for each slot of a day.
+        :param beam_width: Partial days kept after each slot.
+        :param time_budget: Seconds after which remaining days are planned greedily.
+        """
+        self.recommender = recommender
+        self.candidates_per_slot = candidates_per_slot
+        self.beam_width = beam_width
+        self.time_budget = time_budget
+        columns = list(recommender.nutritional_columns)
+        self.upper_limits = np.isin(columns, self.UPPER_LIMIT_COLUMNS)
+
+    @classmethod
+    def from_env(cls, recommender) -> "MealPlanner":
+        """Build a planner configured by MEAL_PLAN_CANDIDATES, MEAL_PLAN_BEAM_WIDTH and MEAL_PLAN_TIME_BUDGET_MS."""
+        return cls(
+            recommender,
+            candidates_per_slot=int(os.getenv("MEAL_PLAN_CANDIDATES", "40")),
+            beam_width=int(os.getenv("MEAL_PLAN_BEAM_WIDTH", "64")),
+            time_budget=float(os.getenv("MEAL_PLAN_TIME_BUDGET_MS", "200")) / 1000,
+        )
+
+    def deviation(self, totals: np.ndarray, daily_needs: np.ndarray) -> np.ndarray:
+        """
+        Score nutrient totals against the daily needs; lower is better.
+
+        :param totals: Array of nutrient totals, nutrients on the last axis.
+        :param daily_needs: Daily needs, one value per nutrient.
+        :return: Sum of squared relative deviations, one score per total.
+        """
+        relative = (totals - daily_needs) / np.maximum(daily_needs, 1e-9)
+        relative[..., self.upper_limits] = np.maximum(relative[..., self.upper_limits], 0.0)
+        return np.einsum('...i,...i->...', relative, relative)
+
+    def candidate_pools(self, daily_needs: np.ndarray, meal_types: Sequence[str], size: int,
+                        constraints: Optional[RecipeConstraints] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Find the candidate recipes of every slot.
+
+        :param daily_needs: Daily needs, one value per nutrient.
+        :param meal_types: Meal type of each slot of a day.
+        :param size: Number of candidates per slot.
+        :param constraints: Optional limits every recipe must satisfy.
+        :return: One (row positions, raw features) pair per slot, nearest first.
+        """
+        per_meal_needs = daily_needs[None, :] / len(meal_types)
+        pools = []
+        for meal_type in meal_types:
+            rows = self.recommender.find_nearest_rows_batch(per_meal_needs, meal_type, size, constraints)[0]
+            pools.append((rows, self.recommender.store.feature_rows(rows)))
+        return pools
+
+    def plan(self, daily_needs: np.ndarray, meal_types: Sequence[str], days: int = 1,
+             constraints: Optional[RecipeConstraints] = None) -> np.ndarray:
+        """
+        Plan one recipe per slot for a number of days, without repeating a recipe.
+
+        :param daily_needs: Daily needs, one value per nutrient.
+        :param meal_types: Meal type of each slot of a day.
+        :param days: Number of days to plan.
+        :param constraints: Optional limits every recipe must satisfy.
+        :return: Array of row positions of shape (days, slots); -1 where no recipe is left for a slot.
+        """
+        if not 1 <= days <= self.MAX_DAYS:
+            raise ValueError(f"days must be between 1 and {self.MAX_DAYS}")
+        deadline = time.perf_counter() + self.time_budget
+        daily_needs = np.asarray(daily_needs, dtype=np.float64)
+        pools = self.candidate_pools(daily_needs, meal_types, self.candidates_per_slot + days - 1, constraints)
+        available = [np.ones(len(rows), dtype=bool) for rows, _ in pools]
+
+        plan = np.full((days, len(meal_types)), -1, dtype=np.int64)
+        for day in range(days):
+            beam_width = self.beam_width if time.perf_counter() < deadline else 1
+            choices = self.plan_day(pools, available, daily_needs, beam_width)
+            for slot, choice in enumerate(choices):
+                if choice >= 0:
+                    plan[day, slot] = pools[slot][0][choice]
+                    available[slot][choice] = False
+        return plan
+
+    def plan_day(self, pools: List[Tuple[np.ndarray, np.ndarray]], available: List[np.ndarray],
+                 daily_needs: np.ndarray, beam_width: int) -> np.ndarray:
+        """
+        Choose one candidate per slot for a single day.
+
+        :param pools: Candidates of every slot, see candidate_pools.
+        :param available: Mask per slot of the candidates not used yet.
+        :param daily_needs: Daily needs, one value per nutrient.
+        :param beam_width: Partial days kept after each slot.
+        :return: Position of the chosen candidate in each slot's pool, -1 for an empty slot.
+        """
+        positions = [np.flatnonzero(mask) for mask in available]
+        # A slot with nothing left contributes nothing to the day
+        features = [
+            pool[1][slot_positions] if len(slot_positions) else np.zeros((1, len(daily_needs)))
+            for pool, slot_positions in zip(pools, positions)
+        ]
+        positions = [p if len(p) else np.array([-1]) for p in positions]
+
+        # Estimate of what the slots after each one will add: the mean of their candidates
+        means = np.array([f.mean(axis=0) for f in features])
+        rest = np.cumsum(means[::-1], axis=0)[::-1] - means
+
+        sums = np.zeros((1, len(daily_needs)))
+        choices = np.zeros((1, 0), dtype=np.int64)
+        for slot, slot_features in enumerate(features):
+            totals = sums[:, None, :] + slot_features[None, :, :]
+            scores = self.deviation(totals + rest[slot], daily_needs).ravel()
+            keep = min(beam_width, len(scores))
+            best = np.argpartition(scores, keep - 1)[:keep] if keep < len(scores) else np.arange(len(scores))
+            beams, candidates = np.unravel_index(best, totals.shape[:2])
+            sums = totals[beams, candidates]
+            choices = np.column_stack([choices[beams], candidates])
+
+        choice = choices[np.argmin(self.deviation(sums, daily_needs))]
+        choice = self.improve(choice, features, daily_needs)
+        return np.array([slot_positions[c] for slot_positions, c in zip(positions, choice)], dtype=np.int64)
+
+    def improve(self, choice: np.ndarray, features: List[np.ndarray], daily_needs: np.ndarray) -> np.ndarray:
+        """
+        Replace single slots of a day with another candidate while that lowers its deviation.
+
+        :param choice: Index of the chosen candidate within each slot's features.
+        :param features: Features of the available candidates of every slot.
+        :param daily_needs: Daily needs, one value per nutrient.
+        :return: Improved choice.
+        """
+        choice = choice.copy()
+        total = sum(f[c] for f, c in zip(features, choice))
+        score = self.deviation(total, daily_needs)
+        for _ in range(self.MAX_SWAP_ROUNDS):
+            improved = False
+            for slot, slot_features in enumerate(features):
+                scores = self.deviation(total - slot_features[choice[slot]] + slot_features, daily_needs)
+                best = int(np.argmin(scores))
+                if scores[best] < score - 1e-12:
+                    total = total - slot_features[choice[slot]] + slot_features[best]
+                    choice[slot], score, improved = best, scores[best], True
+            if not improved:
+                break
+        return choice
@@ -0,0 +1,126 @@
+import itertools
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Leaf frames of threads that are parked waiting for work; sampling them would drown out the hot path
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker"),
+    ("process.py", "_queue_management_worker"), ("connection.py", "wait"),
+}
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler that periodically records the stack of every busy thread."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """
+        Initialize the profiler; sampling starts with ``start``.
+
+        :param interval: Seconds between samples.
+        """
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """Stop sampling and return the sample count of each collapsed stack."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                self.samples[self.collapse(frame)] += 1
+
+    @staticmethod
+    def collapse(frame) -> str:
+        """Render a stack root first, one 'function (file:line)' per frame, separated by semicolons."""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    """
+    Samples every request and keeps the flame data of those slower than a threshold.
+
+    Profiles are written in the collapsed-stack format read by flamegraph.pl and speedscope.
+    Recommendation work runs on pool threads, so all threads are sampled; with concurrent
+    requests a profile also contains the other requests' stacks.
+    """
+
+    def __init__(self, threshold: float, output_dir: str, interval: float = 0.005) -> None:
+        """
+        Initialize the profiler.
+
+        :param threshold: Requests taking at least this many seconds are dumped.
+        :param output_dir: Directory the profiles are written to.
+        :param interval: Seconds between samples.
+        """
+        self.threshold = threshold
+        self.output_dir = output_dir
+        self.interval = interval
+        self._sequence = itertools.count(1)
+
+    @classmethod
+    def from_env(cls) -> Optional["SlowRequestProfiler"]:
+        """
+        Build the profiler from PROFILE_SLOW_REQUESTS_MS, PROFILE_DIR and PROFILE_INTERVAL_MS.
+        Returns None, disabling profiling, unless PROFILE_SLOW_REQUESTS_MS is set.
+        """
+        threshold_ms = os.getenv("PROFILE_SLOW_REQUESTS_MS")
+        if not threshold_ms:
+            return None
+        output_dir = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "mealplan-profiles"))
+        interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+        logging.info(f"Profiling requests slower than {threshold_ms}ms into {output_dir}")
+        return cls(float(threshold_ms) / 1000.0, output_dir, interval_ms / 1000.0)
+
+    def start(self) -> SamplingProfiler:
+        """Start sampling for one request."""
+        sampler = SamplingProfiler(self.interval)
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler: SamplingProfiler, name: str, duration: float) -> Optional[str]:
+        """
+        Stop sampling and dump the profile if the request was slow.
+
+        :param sampler: Sampler returned by ``start``.
+        :param name: Request description, used in the file name.
+        :param duration: Request duration in seconds.
+        :return: Path of the written profile, or None if the request was fast enough.
+        """
+        samples = sampler.stop()
+        if duration < self.threshold or not samples:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-")
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._sequence)}-{slug}-{int(duration * 1000)}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logging.warning(f"Slow request {name} took {duration * 1000:.0f}ms, profile written to {path}")
+        return path
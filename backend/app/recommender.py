@@ -1,28 +1,117 @@
-import re
+import copy
+import hashlib
+import json
+import logging
+import os
+import numpy as np
 import pandas as pd
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import StandardScaler
-from typing import Dict, List, Optional, Union
+import pyarrow.parquet as pq
+from json.encoder import encode_basestring
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from .artifact import DatasetArtifact
+from .constants import MEAL_TYPES, NUTRITIONAL_COLUMNS
+from .cache import ResultCache
+from .filters import ConstraintIndex, RecipeConstraints
+from .ingredients import tokenize_column
+from .shared_index import SharedIndex
+from .store import OverlayRecipeStore, RecipeStore
+from .search import BruteForceSearch, SearchBackend, SearchBackendFactory
+from .metrics import JSON_CLEANUP_SECONDS, PROCESSING_STAGE_SECONDS, RECOMMEND_PHASE_SECONDS
+
+def _reject_json_constant(constant: str) -> None:
+    raise ValueError(f"Invalid JSON constant: {constant}")
+
+# Shared instance; json.loads builds a new decoder per call when given options
+_strict_json_decoder = json.JSONDecoder(parse_constant=_reject_json_constant)
+
 
 class RecipeDataProcessor:
     """A class to process recipe data from given files."""
 
-    def __init__(self, recipe_file: str, ingredient_file: str) -> None:
+    # Bump whenever the processing steps change so cached artifacts are rebuilt
+    PROCESSING_VERSION = "6"
+
+    # Only these columns are read from the input files; everything else is never materialized
+    RECIPE_COLUMNS = [
+        'RecipeId', 'CookTime', 'PrepTime', 'TotalTime', 'RecipeCategory', 'Calories', 'FatContent',
+        'SaturatedFatContent', 'CholesterolContent', 'SodiumContent', 'CarbohydrateContent', 'FiberContent',
+        'SugarContent', 'ProteinContent'
+    ]
+    INGREDIENT_COLUMNS = ['id', 'name', 'ingredients_raw', 'steps', 'servings', 'serving_size']
+    # Rough ratio of pandas memory to raw CSV bytes for the text-heavy ingredient file
+    CSV_MEMORY_FACTOR = 4
+
+    def __init__(self, recipe_file: str, ingredient_file: str, cache_dir: Optional[str] = None,
+                 memory_limit: int = 256 * 1024 * 1024) -> None:
         """
         Initialize the RecipeDataProcessor with file paths.
 
         :param recipe_file: Path to the recipe file.
         :param ingredient_file: Path to the ingredient file.
+        :param cache_dir: Optional directory for processed-dataset artifacts.
+        :param memory_limit: Approximate bytes of ingredient data parsed and joined at a time.
         """
         self.recipe_file = recipe_file
         self.ingredient_file = ingredient_file
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
         self.df_merged: Optional[pd.DataFrame] = None
+        self._dataset_version: Optional[str] = None
+
+    @property
+    def dataset_version(self) -> str:
+        """Content hash of the input files and the processing code version."""
+        if self._dataset_version is None:
+            self._dataset_version = DatasetArtifact.compute_key(
+                [self.recipe_file, self.ingredient_file], self.PROCESSING_VERSION
+            )
+        return self._dataset_version
 
     def load_data(self) -> None:
-        """Load data from recipe and ingredient files and merge them."""
-        df_recipes = pd.read_parquet(self.recipe_file)
-        df_ingredients = pd.read_csv(self.ingredient_file)
-        self.df_merged = df_ingredients.merge(df_recipes, how="inner", left_on="id", right_on="RecipeId")
+        """
+        Load the used columns of the recipe and ingredient files and merge them.
+
+        The recipes, mostly numeric, are loaded whole as the build side of the join; the
+        text-heavy ingredient file is streamed in chunks sized by the memory limit and each
+        chunk is joined on arrival. Only the column arrays of the joined chunks are kept, and
+        they are concatenated one column at a time, releasing each column's chunks as it goes,
+        so peak memory is the result plus one column rather than twice the result.
+        """
+        df_recipes = pq.read_table(self.recipe_file, columns=self.RECIPE_COLUMNS, memory_map=True).to_pandas(
+            split_blocks=True, self_destruct=True
+        )
+
+        file_size = os.path.getsize(self.ingredient_file)
+        chunk_rows = self.csv_chunk_rows()
+        columns: List[str] = []
+        merged_chunks: List[Dict[str, np.ndarray]] = []
+        rows = 0
+        with open(self.ingredient_file, "rb") as f:
+            for chunk in pd.read_csv(f, usecols=self.INGREDIENT_COLUMNS, chunksize=chunk_rows):
+                # An inner merge keeps the order of the left keys, so the chunks concatenate in file order
+                merged = chunk.merge(df_recipes, how="inner", left_on="id", right_on="RecipeId")
+                columns = list(merged.columns)
+                # Copied out of the frame's 2D blocks, so concatenating a column frees its chunks
+                merged_chunks.append({column: merged[column].to_numpy(copy=True) for column in columns})
+                rows += len(chunk)
+                logging.info(f"Loaded {rows} recipes ({min(f.tell() / max(file_size, 1), 1.0):.0%} of "
+                             f"{os.path.basename(self.ingredient_file)})")
+        if not merged_chunks:
+            self.df_merged = pd.DataFrame(columns=self.INGREDIENT_COLUMNS).merge(
+                df_recipes, left_on="id", right_on="RecipeId"
+            )
+            return
+        del df_recipes, merged
+        self.df_merged = pd.DataFrame(
+            {column: np.concatenate([chunk.pop(column) for chunk in merged_chunks]) for column in columns}, copy=False
+        )
+
+    def csv_chunk_rows(self) -> int:
+        """Number of ingredient rows read per chunk, estimated from the start of the file."""
+        with open(self.ingredient_file, "rb") as f:
+            sample = f.read(1 << 20)
+        bytes_per_row = len(sample) / max(sample.count(b"\n"), 1)
+        return max(1000, int(self.memory_limit / (bytes_per_row * self.CSV_MEMORY_FACTOR)))
 
     def select_columns(self) -> None:
         """Select relevant columns from the merged DataFrame."""
@@ -71,81 +160,547 @@ class RecipeDataProcessor:
             if self.df_merged[col].dtype == 'object':
                 self.df_merged[col] = self.df_merged[col].astype(str)
 
+    # Only the hour and minute components are used, as in the source data
+    ISO_DURATION_PATTERN = r'^PT(?:(\d+)H)?(?:(\d+)M)?'
+    TIME_COLUMNS = ['cookTime', 'prepTime', 'totalTime']
+
     @staticmethod
-    def convert_iso_duration_to_readable(duration: Union[str, None]) -> str:
+    def parse_iso_durations(durations: pd.Series) -> pd.Series:
         """
-        Convert ISO 8601 duration format to a more readable format.
+        Convert ISO 8601 duration strings to whole minutes.
 
-        :param duration: The ISO 8601 duration string.
-        :return: A human-readable duration string.
+        :param durations: Series of ISO 8601 duration strings.
+        :return: Series of integer minutes; unparseable values become 0.
         """
-        if not duration:
-            return ''
+        # Durations repeat heavily, so parse each distinct string once and broadcast back
+        codes, uniques = pd.factorize(durations.astype(str))
+        parts = pd.Series(uniques).str.extract(RecipeDataProcessor.ISO_DURATION_PATTERN)
+        parts = parts.astype(float).fillna(0)
+        unique_minutes = (parts[0] * 60 + parts[1]).to_numpy(dtype=np.int32)
+        return pd.Series(unique_minutes[codes], index=durations.index)
 
-        pattern = re.compile(r'PT(\d+H)?(\d+M)?')
-        match = pattern.match(duration)
+    @staticmethod
+    def format_duration(minutes: int) -> str:
+        """
+        Convert a duration in minutes to a human-readable string.
 
-        hours, minutes = match.groups() if match else (None, None)
-        hours_readable = f"{int(hours[:-1])} Hour{'s' if int(hours[:-1]) > 1 else ''}" if hours else ''
-        minutes_readable = f"{int(minutes[:-1])} Minute{'s' if int(minutes[:-1]) > 1 else ''}" if minutes else ''
+        Zero renders as an empty string, like a missing or malformed duration, since all three parse to
+        0 minutes; minutes past the hour are carried over ('PT90M' renders as '1 Hour 30 Minutes').
 
+        :param minutes: Duration in minutes.
+        :return: A human-readable duration string, empty for zero.
+        """
+        hours, minutes = divmod(int(minutes), 60)
+        hours_readable = f"{hours} Hour{'s' if hours > 1 else ''}" if hours else ''
+        minutes_readable = f"{minutes} Minute{'s' if minutes > 1 else ''}" if minutes else ''
         return ' '.join(filter(None, [hours_readable, minutes_readable]))
 
+    @classmethod
+    def add_readable_times(cls, recipes: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add readable time columns to a (small) selection of processed recipes.
+
+        :param recipes: Processed recipes with integer minute columns.
+        :return: Copy of the recipes with 'cookTime', 'prepTime' and 'totalTime' strings.
+        """
+        recipes = recipes.copy()
+        for col in cls.TIME_COLUMNS:
+            codes, uniques = pd.factorize(recipes[f'{col}Minutes'])
+            readable = np.array([cls.format_duration(m) for m in uniques], dtype=object)
+            recipes[col] = readable[codes]
+        return recipes
+
     def convert_time_columns(self) -> None:
-        """Convert time-related columns to a readable format."""
-        time_cols = ['cookTime', 'prepTime', 'totalTime']
-        for col in time_cols:
-            self.df_merged[col] = self.df_merged[col].apply(self.convert_iso_duration_to_readable)
-    
-    @staticmethod
-    def convert_time_to_minutes(time_str: str) -> int:
-        """Convert a time string to minutes."""
-        if pd.isna(time_str):
-            return 0
-        hours_match = re.search(r'(\d+) Hour', time_str)
-        minutes_match = re.search(r'(\d+) Minute', time_str)
-        hours = int(hours_match.group(1)) if hours_match else 0
-        minutes = int(minutes_match.group(1)) if minutes_match else 0
-        return hours * 60 + minutes
+        """Convert ISO 8601 time columns to integer minute columns."""
+        for col in self.TIME_COLUMNS:
+            self.df_merged[f'{col}Minutes'] = self.parse_iso_durations(self.df_merged[col])
+        self.df_merged.drop(columns=self.TIME_COLUMNS, inplace=True)
 
     def categorize_meal_type(self) -> None:
-        """Categorize each recipe as 'Breakfast', 'Snack', or 'Main Dish'."""
-        # First, convert totalTime to minutes
-        self.df_merged['totalTimeMinutes'] = self.df_merged['totalTime'].apply(self.convert_time_to_minutes)
-
+        """Categorize each recipe as 'Breakfast', 'Snacks', 'Lunch' or 'Dinner'."""
         # Define categories for Lunch
         lunch_categories = ['Lunch/Snacks', 'One Dish Meal', 'Vegetable']
 
-        # Categorize mealType
-        self.df_merged['mealType'] = self.df_merged.apply(
-            lambda row: 'Breakfast' if row['recipeCategory'] == 'Breakfast' else 
-                        ('Snacks' if row['totalTimeMinutes'] < 20 else 
-                        ('Lunch' if row['recipeCategory'] in lunch_categories else 'Dinner')), axis=1)
+        category = self.df_merged['recipeCategory']
+        self.df_merged['mealType'] = np.select(
+            [
+                category == 'Breakfast',
+                self.df_merged['totalTimeMinutes'] < 20,
+                category.isin(lunch_categories),
+            ],
+            ['Breakfast', 'Snacks', 'Lunch'],
+            default='Dinner'
+        )
+
+    UNAVAILABLE_JSON = '["Data unavailable"]'
+    MALFORMED_JSON = '["Data unavailable due to formatting issues"]'
+
+    @staticmethod
+    def clean_and_validate_json_strings(json_strings: pd.Series) -> pd.Series:
+        """
+        Clean and validate JSON list strings by ensuring correct format.
+
+        :param json_strings: Series of raw JSON-like list strings.
+        :return: Series of cleaned JSON strings, '[]' where the format is invalid.
+        """
+        json_strings = json_strings.astype(str).str.strip()
+        is_list = json_strings.str.startswith("[") & json_strings.str.endswith("]")
+        json_strings = json_strings.str.replace(r',\s*]', ']', regex=True)
+        json_strings = json_strings.str.replace(r',\s*}', '}', regex=True)
+        return json_strings.where(is_list, '[]')
+
+    @staticmethod
+    def is_valid_json(json_string: str) -> bool:
+        """Check that a string decodes as strict JSON (no NaN or Infinity literals)."""
+        try:
+            _strict_json_decoder.decode(json_string)
+        except ValueError:
+            return False
+        return True
+
+    @staticmethod
+    def to_json_values(values: pd.Series) -> pd.Series:
+        """Encode every value of a column as a JSON fragment."""
+        if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            # Nutrient values repeat a lot; format each distinct number once
+            codes, uniques = pd.factorize(values)
+            return pd.Series(np.asarray(uniques.astype(str), dtype=object)[codes], index=values.index)
+        return pd.Series([encode_basestring(str(v)) for v in values], index=values.index)
+
+    def build_payloads(self) -> None:
+        """
+        Parse the ingredients and steps once and precompute each recipe's serialized API payload.
+
+        The cleaned ingredient and step lists are validated here and embedded verbatim, so the
+        request path only joins precomputed JSON fragments.
+        """
+        recipes = self.add_readable_times(self.df_merged)
+
+        with JSON_CLEANUP_SECONDS.time():
+            ingredients = self.clean_and_validate_json_strings(recipes['ingredientsRaw'])
+            steps = self.clean_and_validate_json_strings(recipes['steps'])
+            decodes = np.array([
+                self.is_valid_json(i) and self.is_valid_json(s) for i, s in zip(ingredients, steps)
+            ], dtype=bool)
+        empty = (ingredients == '[]').to_numpy() | (steps == '[]').to_numpy()
+        ingredients = ingredients.mask(ingredients == '[]', self.MALFORMED_JSON).where(decodes, self.UNAVAILABLE_JSON)
+        steps = steps.mask(steps == '[]', self.MALFORMED_JSON).where(decodes, self.UNAVAILABLE_JSON)
+
+        nutrition_units = [
+            ("Protein", 'proteinContent', "g"), ("Fat", 'fatContent', "g"),
+            ("Saturated Fat", 'saturatedFatContent', "g"), ("Carbohydrates", 'carbohydrateContent', "g"),
+            ("Fiber", 'fiberContent', "g"), ("Sugar", 'sugarContent', "g"),
+            ("Cholesterol", 'cholesterolContent', "mg"), ("Sodium", 'sodiumContent', "mg")
+        ]
+        fields = {col: self.to_json_values(recipes[col]) for col in recipes.columns}
+
+        nutrition = pd.Series("{", index=recipes.index)
+        for i, (label, col, unit) in enumerate(nutrition_units):
+            separator = "," if i else ""
+            nutrition = nutrition + f'{separator}"{label}":"' + fields[col] + f'{unit}"'
+        nutrition = nutrition + "}"
+
+        fields['steps'] = steps
+        fields['ingredients'] = ingredients
+        fields['nutrition'] = nutrition
+        fields['serving_size'] = fields['servingSize']
+        fields['prep_time'] = fields['prepTime']
+        fields['cook_time'] = fields['cookTime']
+
+        members = [f'{json.dumps(name)}:' + values for name, values in fields.items()]
+        payloads = ["{" + ",".join(row) + "}" for row in zip(*members)]
+
+        malformed = empty | ~decodes
+        self.df_merged['malformedText'] = malformed
+        self.df_merged['payload'] = payloads
+        if malformed.any():
+            logging.warning(f"{int(malformed.sum())} recipes have malformed ingredients or steps")
+
+    def tokenize_ingredients(self) -> None:
+        """
+        Reduce each recipe's raw ingredient list to normalized ingredient tokens for the ingredient
+        index. Runs after build_payloads so the tokens never end up in the payloads.
+        """
+        self.df_merged['ingredientTokens'] = tokenize_column(self.df_merged['ingredientsRaw'])
+
+    def stages(self) -> List[Tuple[str, Callable[[], None]]]:
+        """List the processing steps in the order process_data runs them."""
+        return [
+            ("load_data", self.load_data),
+            ("select_columns", self.select_columns),
+            ("rename_columns", self.rename_columns),
+            ("fill_missing_values", self.fill_missing_values),
+            ("convert_columns_to_string", self.convert_columns_to_string),
+            ("convert_time_columns", self.convert_time_columns),
+            ("categorize_meal_type", self.categorize_meal_type),
+            ("build_payloads", self.build_payloads),
+            ("tokenize_ingredients", self.tokenize_ingredients),
+        ]
+
+    @classmethod
+    def process_records(cls, records: pd.DataFrame) -> pd.DataFrame:
+        """
+        Process already merged raw records, e.g. recipes submitted for an upsert.
+
+        :param records: Records with the columns of both input files, as load_data merges them.
+        :return: Processed records; incomplete ones are dropped as in process_data.
+        """
+        processor = cls(recipe_file="", ingredient_file="")
+        processor.df_merged = records.reset_index(drop=True)
+        for name, stage in processor.stages():
+            if name != "load_data":
+                stage()
+        return processor.df_merged
 
     def process_data(self) -> pd.DataFrame:
         """Process the recipe data through various cleaning and transforming steps."""
-        self.load_data()
-        self.select_columns()
-        self.rename_columns()
-        self.fill_missing_values()
-        self.convert_columns_to_string()
-        self.convert_time_columns()
-        self.categorize_meal_type()  
+        for name, stage in self.stages():
+            with PROCESSING_STAGE_SECONDS.time(stage=name):
+                stage()
         return self.df_merged
 
+    def build_artifact(self) -> DatasetArtifact:
+        """Process the data and write it to the artifact cache, replacing any partial build."""
+        if self.cache_dir is None:
+            raise ValueError("A cache directory is required to build a dataset artifact")
+        artifact = DatasetArtifact(self.cache_dir, self.dataset_version)
+        artifact.save(self.process_data(), NUTRITIONAL_COLUMNS)
+        return artifact
+
+    def load_or_process(self) -> RecipeStore:
+        """
+        Load the processed data from the artifact cache, processing and caching it on a miss.
+
+        :return: Recipe store; memory-mapped from the artifact when a cache directory is set.
+        """
+        if self.cache_dir is None:
+            return RecipeStore(self.process_data(), NUTRITIONAL_COLUMNS)
+
+        artifact = DatasetArtifact(self.cache_dir, self.dataset_version)
+        # Workers starting together wait for the first one's build instead of repeating it
+        with artifact.lock():
+            if not artifact.exists():
+                artifact = self.build_artifact()
+                # The artifact holds everything from here on; don't keep a second copy alive
+                self.df_merged = None
+        with PROCESSING_STAGE_SECONDS.time(stage="load_artifact"):
+            return artifact.load()
+
+
+class MealTypeIndex:
+    """A frozen, pre-scaled nearest-neighbor index over the recipes of a single meal type."""
+
+    def __init__(self, features: np.ndarray, row_ids: np.ndarray,
+                 backend: SearchBackendFactory = BruteForceSearch) -> None:
+        """
+        Fit the scaler parameters and build the scaled feature matrix once.
+
+        :param features: Raw nutritional features of the recipes, one row per recipe.
+        :param row_ids: Positions of those recipes in the processed data.
+        :param backend: Search backend built over the scaled matrix.
+        """
+        features = np.asarray(features, dtype=np.float64)
+
+        # Same statistics as StandardScaler: population std, constant columns left unscaled.
+        # The sum of squared deviations is kept so the statistics can be updated incrementally.
+        self.mean = features.mean(axis=0)
+        self.m2 = np.square(features - self.mean).sum(axis=0)
+        self.scale = self.scale_from_m2(self.m2, len(features))
+
+        self.matrix = np.ascontiguousarray((features - self.mean) / self.scale, dtype=np.float32)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.freeze()
+        self.use_backend(backend)
+
+    # Arrays that fully describe a built index, e.g. to publish it to a SharedIndex
+    ARRAYS = ("mean", "m2", "scale", "matrix", "sq_norms", "row_ids")
+
+    @staticmethod
+    def scale_from_m2(m2: np.ndarray, count: int) -> np.ndarray:
+        """Population standard deviation from the sum of squared deviations, 1 for constant columns."""
+        scale = np.sqrt(m2 / max(count, 1))
+        scale[scale == 0] = 1.0
+        return scale
+
+    def freeze(self) -> None:
+        for name in self.ARRAYS:
+            getattr(self, name).setflags(write=False)
+
+    def use_backend(self, backend: SearchBackendFactory) -> None:
+        """Build the search backend over the scaled matrix, replacing the current one."""
+        self.backend = backend
+        self.searcher: SearchBackend = backend(self.matrix, self.sq_norms)
+
+    def updated(self, add_features: np.ndarray, add_row_ids: np.ndarray,
+                remove_features: np.ndarray, remove_row_ids: np.ndarray) -> Optional["MealTypeIndex"]:
+        """
+        Build a copy of the index with recipes added and removed, updating the scaler statistics
+        from the changed rows only instead of refitting on every recipe.
+
+        The scaled matrix of the kept recipes is adjusted with a per-column affine transform, so
+        results match a full rebuild up to float32 rounding.
+
+        :param add_features: Raw features of the added recipes.
+        :param add_row_ids: Positions of the added recipes.
+        :param remove_features: Raw features of the removed recipes.
+        :param remove_row_ids: Positions of the removed recipes, all present in the index.
+        :return: The updated index, or None if no recipe is left.
+        """
+        add_features = np.asarray(add_features, dtype=np.float64).reshape(-1, len(self.mean))
+        remove_features = np.asarray(remove_features, dtype=np.float64).reshape(-1, len(self.mean))
+        count, mean, m2 = len(self), self.mean, self.m2
+
+        # Chan et al.'s pairwise update of (count, mean, m2), run backwards for removals
+        if len(remove_features):
+            removed_mean = remove_features.mean(axis=0)
+            removed_m2 = np.square(remove_features - removed_mean).sum(axis=0)
+            remaining = count - len(remove_features)
+            if remaining > 0:
+                new_mean = (count * mean - len(remove_features) * removed_mean) / remaining
+                delta = removed_mean - new_mean
+                m2 = m2 - removed_m2 - np.square(delta) * remaining * len(remove_features) / count
+                count, mean = remaining, new_mean
+            else:
+                count, mean, m2 = 0, np.zeros_like(mean), np.zeros_like(m2)
+        if len(add_features):
+            added_mean = add_features.mean(axis=0)
+            added_m2 = np.square(add_features - added_mean).sum(axis=0)
+            total = count + len(add_features)
+            delta = added_mean - mean
+            mean = mean + delta * len(add_features) / total
+            m2 = m2 + added_m2 + np.square(delta) * count * len(add_features) / total
+            count = total
+        if count == 0:
+            return None
+        m2 = np.maximum(m2, 0.0)
+        scale = self.scale_from_m2(m2, count)
+
+        keep = ~np.isin(self.row_ids, remove_row_ids)
+        # (x - mean') / scale' == matrix * (scale / scale') + (mean - mean') / scale'
+        kept = self.matrix[keep].astype(np.float64) * (self.scale / scale) + (self.mean - mean) / scale
+        added = (add_features - mean) / scale
+
+        index = MealTypeIndex.__new__(MealTypeIndex)
+        index.mean, index.m2, index.scale = mean, m2, scale
+        index.matrix = np.ascontiguousarray(np.vstack([kept, added]), dtype=np.float32)
+        index.sq_norms = np.einsum('ij,ij->i', index.matrix, index.matrix)
+        index.row_ids = np.concatenate([self.row_ids[keep], np.asarray(add_row_ids, dtype=np.int64)])
+        index.freeze()
+        index.use_backend(self.backend)
+        return index
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray],
+                    backend: SearchBackendFactory = BruteForceSearch) -> "MealTypeIndex":
+        """
+        Wrap already built index arrays without copying them, e.g. memory-mapped from a SharedIndex.
+
+        :param arrays: Dictionary with every name in ARRAYS.
+        :param backend: Search backend built over the scaled matrix.
+        :return: The index.
+        """
+        index = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(index, name, arrays[name])
+        index.use_backend(backend)
+        return index
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The arrays that from_arrays rebuilds the index from."""
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def transform(self, user_features: np.ndarray) -> np.ndarray:
+        """
+        Scale user feature vectors with the frozen scaler parameters.
+
+        :param user_features: Array of shape (n_queries, n_features).
+        :return: Scaled float32 array of the same shape.
+        """
+        return ((np.atleast_2d(user_features) - self.mean) / self.scale).astype(np.float32)
+
+    def search(self, user_features: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest recipes (euclidean distance in scaled space) for each query.
+
+        :param user_features: Unscaled array of shape (n_queries, n_features).
+        :param k: Number of neighbors to return per query.
+        :return: Tuple of (distances, row_ids), both of shape (n_queries, k), sorted by distance.
+        """
+        return self.search_scaled(self.transform(user_features), k)
+
+    def search_scaled(self, queries: np.ndarray, k: int,
+                      eligible: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest recipes for queries that are already in scaled space.
+
+        :param queries: Scaled float32 array of shape (n_queries, n_features).
+        :param k: Number of neighbors to return per query.
+        :param eligible: Sorted positions within this index of the only recipes that may be
+            returned, see ConstraintIndex; all recipes when None.
+        :return: Tuple of (distances, row_ids), both of shape (n_queries, k), sorted by distance;
+            fewer than k columns when fewer recipes are eligible.
+        """
+        if eligible is None:
+            distances, nearest = self.searcher.search(queries, min(k, len(self)))
+        elif min(k, len(eligible)) == 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        else:
+            distances, nearest = self.searcher.search_subset(queries, min(k, len(eligible)), eligible)
+        return distances, self.row_ids[nearest]
+
 
 class MealRecommender:
     """Class for recommending meals based on user's nutritional needs and meal type."""
 
-    def __init__(self, processed_data: pd.DataFrame, nutritional_columns: List[str]) -> None:
+    ACTIVITY_FACTORS = {
+        "sedentary": 1.2, "lightly active": 1.375, "moderately active": 1.55,
+        "very active": 1.725, "extra active": 1.9
+    }
+    GOAL_ADJUSTMENTS = {
+        "light weight loss": 0.9, "moderate weight loss": 0.8, "extreme weight loss": 0.75,
+        "light muscle gain": 1.1, "moderate muscle gain": 1.2, "extreme muscle gain": 1.25,
+        "maintain weight": 1.0
+    }
+
+    def __init__(self, processed_data: Union[pd.DataFrame, RecipeStore], nutritional_columns: List[str],
+                 dataset_version: Optional[str] = None, result_cache: Optional[ResultCache] = None,
+                 shared_index: Optional[SharedIndex] = None,
+                 search_backend: SearchBackendFactory = BruteForceSearch) -> None:
         """
         Initialize the MealRecommender with processed data and nutritional columns.
 
-        :param processed_data: Processed recipe data.
+        :param processed_data: Processed recipe data, or a recipe store loaded from a dataset artifact.
         :param nutritional_columns: List of nutritional columns to be considered for recommendations.
+        :param dataset_version: Version of the processed data, part of every result cache key.
+        :param result_cache: Optional cache of serialized results. Queries are then snapped to the
+            cache's grid so that results only depend on the cache key.
+        :param shared_index: Optional index shared with the other worker processes; requires
+            dataset_version.
+        :param search_backend: Nearest-neighbor search used within each meal type, see search.py.
         """
-        self.processed_data = processed_data
+        if shared_index is not None and dataset_version is None:
+            raise ValueError("A dataset version is required to use a shared index")
+        if isinstance(processed_data, pd.DataFrame):
+            processed_data = RecipeStore(processed_data, nutritional_columns)
+        self.store = processed_data
         self.nutritional_columns = nutritional_columns
+        self.dataset_version = dataset_version
+        self.result_cache = result_cache
+        if result_cache is not None:
+            # Entries of another dataset version can never be hit again
+            result_cache.clear()
+        self.shared_index = shared_index
+        self.search_backend = search_backend
+        self.index_generation = 0
+        # Number of recipes upserted and deleted by the with_changes call that built this recommender
+        self.applied_changes = {"upserted": 0, "deleted": 0}
+        if shared_index is None:
+            self.indexes = self.build_indexes(search_backend)
+        else:
+            # Only the arrays are shared; every process builds its own search backend over them
+            self.index_generation, arrays = shared_index.attach_or_build(
+                dataset_version, lambda: {meal: index.arrays() for meal, index in self.build_indexes().items()},
+                MealTypeIndex.ARRAYS
+            )
+            self.indexes = {meal: MealTypeIndex.from_arrays(a, search_backend) for meal, a in arrays.items()}
+        self.constraint_indexes = {
+            meal: ConstraintIndex(self.store, index.row_ids, nutritional_columns) for meal, index in self.indexes.items()
+        }
+
+    def with_changes(self, upserts: Optional[pd.DataFrame] = None,
+                     delete_ids: Iterable[int] = ()) -> "MealRecommender":
+        """
+        Apply recipe upserts and deletions without rebuilding everything.
+
+        Only the indexes of the affected meal types are updated, incrementally, and the dataset
+        store gains an overlay; this recommender is left untouched, so requests already using it
+        finish on the old data and callers swap in the returned one.
+
+        :param upserts: Processed records (see RecipeDataProcessor.process_records); a recipe
+            whose id already exists replaces it.
+        :param delete_ids: Ids of recipes to remove; ids not in the store are ignored.
+        :return: New recommender with its own dataset version, and the number of recipes actually
+            upserted and deleted in its applied_changes.
+        :raises ValueError: When there is nothing to upsert and no id to delete is in the store.
+        """
+        if self.shared_index is not None:
+            raise ValueError("Incremental changes are not supported with a shared index; reload instead")
+        if upserts is None:
+            upserts = pd.DataFrame(columns=[
+                'id', 'mealType', 'totalTimeMinutes', 'recipeCategory', 'payload', 'ingredientTokens'
+            ] + self.nutritional_columns)
+        upserts = upserts.drop_duplicates('id', keep='last').reset_index(drop=True)
+        delete_ids = list(delete_ids)
+
+        removed_before = self.store.removed if isinstance(self.store, OverlayRecipeStore) else np.empty(0, np.int64)
+        deleted = np.isin(self.store.ids(), np.asarray(delete_ids, dtype=np.int64))
+        deleted[removed_before] = False
+        if len(upserts) == 0 and not deleted.any():
+            raise ValueError("No recipe to upsert, and none of the ids to delete is in the store")
+        replaced = deleted | np.isin(self.store.ids(), upserts['id'].to_numpy(dtype=np.int64))
+        replaced[removed_before] = False
+        removed_rows = np.flatnonzero(replaced)
+        added_rows = np.arange(len(self.store), len(self.store) + len(upserts))
+
+        if isinstance(self.store, OverlayRecipeStore):
+            store = self.store.with_changes(upserts, removed_rows)
+        else:
+            store = OverlayRecipeStore(self.store, upserts, removed_rows, self.nutritional_columns)
+
+        indexes = dict(self.indexes)
+        removed_types = np.asarray(store.meal_type_names)[store.meal_type_codes[removed_rows]]
+        added_types = upserts['mealType'].to_numpy()
+        for meal_type in set(removed_types) | set(added_types):
+            remove = removed_rows[removed_types == meal_type]
+            add = added_rows[added_types == meal_type]
+            index = indexes.pop(meal_type, None)
+            if index is None:
+                index = MealTypeIndex(store.feature_rows(add), add, self.search_backend) if len(add) else None
+            else:
+                index = index.updated(store.feature_rows(add), add, store.feature_rows(remove), remove)
+            if index is not None:
+                indexes[meal_type] = index
+
+        digest = hashlib.sha256(f"{self.dataset_version}".encode())
+        for payload in upserts['payload']:
+            digest.update(payload.encode())
+        digest.update(json.dumps(sorted(map(int, delete_ids))).encode())
+
+        recommender = copy.copy(self)
+        recommender.store = store
+        recommender.indexes = indexes
+        recommender.constraint_indexes = {
+            meal: self.constraint_indexes[meal] if self.indexes.get(meal) is index
+            else ConstraintIndex(store, index.row_ids, self.nutritional_columns)
+            for meal, index in indexes.items()
+        }
+        recommender.dataset_version = digest.hexdigest()[:16]
+        recommender.applied_changes = {"upserted": len(upserts), "deleted": int(deleted.sum())}
+        logging.info(f"Upserted {len(upserts)} and removed {len(removed_rows)} recipes, "
+                     f"dataset version {recommender.dataset_version}")
+        return recommender
+
+    def index_is_current(self) -> bool:
+        """Check that no newer shared index generation has been published since this one attached."""
+        return self.shared_index is None or self.shared_index.generation() == self.index_generation
+
+    def build_indexes(self, backend: SearchBackendFactory = BruteForceSearch) -> Dict[str, MealTypeIndex]:
+        """
+        Build one frozen scaler and neighbor index per meal type.
+
+        :param backend: Search backend of the indexes.
+        :return: Dictionary mapping each meal type to its index.
+        """
+        indexes = {}
+        for meal_type in self.store.meal_type_names:
+            row_ids = self.store.rows_of_meal_type(meal_type)
+            if len(row_ids):
+                indexes[meal_type] = MealTypeIndex(self.store.features[row_ids], row_ids, backend)
+        return indexes
 
     @staticmethod
     def estimate_daily_nutritional_needs(age: int, sex: str, weight: float, height: int,
@@ -165,19 +720,10 @@ class MealRecommender:
 
         # Mifflin St Jeor Equation for BMR
         bmr = 10 * weight + 6.25 * height - 5 * age + (5 if sex.lower() == 'male' else -161)
-        activity_factors = {
-            "sedentary": 1.2, "lightly active": 1.375, "moderately active": 1.55, 
-            "very active": 1.725, "extra active": 1.9
-        }
-        maintenance_calories = bmr * activity_factors[activity_level.lower()]
+        maintenance_calories = bmr * MealRecommender.ACTIVITY_FACTORS[activity_level.lower()]
 
         # Goal adjustment
-        goal_adjustments = {
-            "light weight loss": 0.9, "moderate weight loss": 0.8, "extreme weight loss": 0.75,
-            "light muscle gain": 1.1, "moderate muscle gain": 1.2, "extreme muscle gain": 1.25,
-            "maintain weight": 1.0
-        }
-        calories = maintenance_calories * goal_adjustments[goal.lower()]
+        calories = maintenance_calories * MealRecommender.GOAL_ADJUSTMENTS[goal.lower()]
 
         # Macronutrient distribution
         protein_pct = 0.3 if 'muscle gain' in goal else 0.25
@@ -212,29 +758,250 @@ class MealRecommender:
             "sodiumContent": sodium
         }
 
-    def recommend_meals(self, user_nutrients: pd.DataFrame, meal_type: str, k: int = 5) -> pd.DataFrame:
+    @classmethod
+    def estimate_daily_nutritional_needs_batch(cls, profiles: pd.DataFrame) -> pd.DataFrame:
+        """
+        Vectorized estimate_daily_nutritional_needs for many users at once.
+
+        :param profiles: DataFrame with 'age', 'sex', 'weight', 'height', 'activity_level' and 'goal'.
+        :return: DataFrame of estimated nutritional needs, one row per profile.
+        """
+        age = profiles['age'].to_numpy(dtype=np.float64)
+        weight = profiles['weight'].to_numpy(dtype=np.float64)
+        height = profiles['height'].to_numpy(dtype=np.float64)
+        is_male = (profiles['sex'].str.lower() == 'male').to_numpy()
+
+        activity_factor = profiles['activity_level'].str.lower().map(cls.ACTIVITY_FACTORS)
+        goal_adjustment = profiles['goal'].str.lower().map(cls.GOAL_ADJUSTMENTS)
+        if activity_factor.isna().any() or goal_adjustment.isna().any():
+            raise ValueError("Unknown activity level or goal in user profiles")
+
+        # Mifflin St Jeor Equation for BMR
+        bmr = 10 * weight + 6.25 * height - 5 * age + np.where(is_male, 5, -161)
+        calories = bmr * activity_factor.to_numpy() * goal_adjustment.to_numpy()
+
+        # Macronutrient distribution
+        protein_pct = np.where(profiles['goal'].str.contains('muscle gain', regex=False).to_numpy(), 0.3, 0.25)
+        fat_pct = 0.25
+        carbs_pct = 1 - protein_pct - fat_pct
+
+        fiber = np.select([(age <= 50) & is_male, age <= 50, is_male], [38, 25, 30], default=21)
+
+        return pd.DataFrame({
+            "calories": calories,
+            "proteinContent": (calories * protein_pct) / 4,
+            "fatContent": (calories * fat_pct) / 9,
+            "saturatedFatContent": (calories * 0.05) / 9,
+            "carbohydrateContent": (calories * carbs_pct) / 4,
+            "fiberContent": fiber,
+            "sugarContent": calories * 0.10 / 4,
+            "cholesterolContent": 300,
+            "sodiumContent": 2300
+        }, index=profiles.index)
+
+    def recommend_meals(self, user_nutrients: pd.DataFrame, meal_type: str, k: int = 5,
+                        constraints: Optional[RecipeConstraints] = None) -> pd.DataFrame:
         """
         Recommend meals based on the user's nutritional needs and meal type.
         
         :param user_nutrients: DataFrame of user's nutrional profile.
         :param meal_type: Type of meal to recommend (filter).
         :param k: Number of meals to recommend.
-        :return: DataFrame of recommended meals.
+        :param constraints: Optional time, category and nutrient limits the meals must satisfy.
+        :return: DataFrame of recommended meals, fewer than k if not enough meals qualify.
         """
-        meal_data = self.processed_data[self.processed_data['mealType'] == meal_type]
-        meal_features = meal_data[self.nutritional_columns]
+        rows = self.find_nearest_rows(user_nutrients, meal_type, k, constraints)
+        with RECOMMEND_PHASE_SECONDS.time(phase="serialize"):
+            return RecipeDataProcessor.add_readable_times(self.store.records(rows))
 
-        # Fit the scaler on this meal type's features
-        scaler = StandardScaler()
-        scaled_meal_features = scaler.fit_transform(meal_features)
+    def recommend_payloads(self, user_nutrients: pd.DataFrame, meal_type: str, k: int = 5,
+                           constraints: Optional[RecipeConstraints] = None) -> List[str]:
+        """
+        Recommend meals and return their precomputed serialized API payloads.
 
-        # Scale user's nutritional needs using the same scaler
-        user_features_scaled = scaler.transform(user_nutrients)
+        :param user_nutrients: DataFrame of user's nutrional profile.
+        :param meal_type: Type of meal to recommend (filter).
+        :param k: Number of meals to recommend.
+        :param constraints: Optional time, category and nutrient limits the meals must satisfy.
+        :return: List of JSON-encoded meal payloads, nearest first.
+        """
+        if self.result_cache is None:
+            rows = self.find_nearest_rows(user_nutrients, meal_type, k, constraints)
+            with RECOMMEND_PHASE_SECONDS.time(phase="serialize"):
+                return self.store.payloads(rows)
+
+        with RECOMMEND_PHASE_SECONDS.time(phase="filter"):
+            index = self.get_index(meal_type)
+            user_features = user_nutrients[self.nutritional_columns].to_numpy(dtype=np.float64)
+        with RECOMMEND_PHASE_SECONDS.time(phase="scale"):
+            grid = self.snap_to_grid(index, user_features)[0]
+        with RECOMMEND_PHASE_SECONDS.time(phase="cache"):
+            constraint_key = constraints.key if constraints else ""
+            key = f"mealplan:{self.dataset_version}:{index.searcher.key}:{meal_type}:{k}:{constraint_key}:{','.join(map(str, grid))}"
+            cached = self.result_cache.get(key)
+        if cached is not None:
+            return cached
+
+        with RECOMMEND_PHASE_SECONDS.time(phase="filter"):
+            eligible = self.eligible_positions(meal_type, constraints)
+        with RECOMMEND_PHASE_SECONDS.time(phase="search"):
+            distances, row_ids = index.search_scaled(self.grid_to_queries(grid[None, :]), k, eligible)
+        with RECOMMEND_PHASE_SECONDS.time(phase="serialize"):
+            payloads = self.store.payloads(row_ids[0])
+        self.result_cache.set(key, payloads)
+        return payloads
+
+    def snap_to_grid(self, index: MealTypeIndex, user_features: np.ndarray) -> np.ndarray:
+        """
+        Quantize user vectors in the index's scaled space to the result cache's grid.
 
-        # k-NN model
-        knn = NearestNeighbors(n_neighbors=k, algorithm='brute', metric='euclidean')
-        knn.fit(scaled_meal_features)
+        :param index: Index of the meal type being queried.
+        :param user_features: Unscaled array of per-meal needs, one row per user.
+        :return: Integer grid coordinates, one row per user.
+        """
+        return np.round(index.transform(user_features) / self.result_cache.resolution).astype(np.int64)
 
-        # Find nearest neighbors for this meal type
-        distances, indices = knn.kneighbors(user_features_scaled)
-        return meal_data.iloc[indices[0]]
\ No newline at end of file
+    def grid_to_queries(self, grid: np.ndarray) -> np.ndarray:
+        """Convert grid coordinates back to scaled float32 query vectors."""
+        return (grid * self.result_cache.resolution).astype(np.float32)
+
+    def recommend_meals_batch(self, profiles: pd.DataFrame, k: int = 5,
+                              constraints: Optional[Sequence[Optional[RecipeConstraints]]] = None
+                              ) -> List[Dict[str, List[str]]]:
+        """
+        Recommend meals for many users, running one multi-query search per meal type and set of
+        constraints.
+
+        :param profiles: DataFrame of user preferences, including 'meals_per_day'.
+        :param k: Number of meals to recommend per meal type.
+        :param constraints: Optional constraints of each profile, in profile order.
+        :return: One dictionary per profile mapping each of its meal types to JSON-encoded meal payloads.
+        """
+        per_meal_needs = self.per_meal_needs_batch(profiles)
+        meals_per_day = profiles['meals_per_day'].to_numpy()
+
+        plans: List[Dict[str, List[str]]] = [{} for _ in range(len(profiles))]
+        for position, meal_type in enumerate(MEAL_TYPES):
+            users = np.flatnonzero(meals_per_day > position)
+            if len(users) == 0:
+                break
+            for user, payloads in self.recommend_meal_type_batch(per_meal_needs, users, meal_type, k, constraints):
+                plans[user][meal_type] = payloads
+        return plans
+
+    def per_meal_needs_batch(self, profiles: pd.DataFrame) -> np.ndarray:
+        """
+        Split every user's daily needs evenly over their meals.
+
+        :param profiles: DataFrame of user preferences, including 'meals_per_day'.
+        :return: Array of per-meal needs, one row per profile.
+        """
+        meals_per_day = profiles['meals_per_day'].to_numpy()
+        if (meals_per_day < 1).any():
+            raise ValueError("meals_per_day must be at least 1")
+        needs = self.estimate_daily_nutritional_needs_batch(profiles)
+        return needs[self.nutritional_columns].to_numpy(dtype=np.float64) / meals_per_day[:, None]
+
+    def recommend_meal_type_batch(self, per_meal_needs: np.ndarray, users: np.ndarray, meal_type: str, k: int = 5,
+                                  constraints: Optional[Sequence[Optional[RecipeConstraints]]] = None
+                                  ) -> List[Tuple[int, List[str]]]:
+        """
+        Recommend meals of one meal type for some users of a batch.
+
+        :param per_meal_needs: Per-meal needs of every user in the batch, see per_meal_needs_batch.
+        :param users: Positions in the batch of the users having this meal type.
+        :param meal_type: Type of meal to recommend.
+        :param k: Number of meals to recommend.
+        :param constraints: Optional constraints of every user in the batch.
+        :return: List of (user position, JSON-encoded meal payloads) pairs.
+        """
+        recommendations = []
+        users = np.asarray(users, dtype=np.int64)
+        for group, group_constraints in self.group_by_constraints(users, constraints):
+            row_ids = self.find_nearest_rows_batch(per_meal_needs[group], meal_type, k, group_constraints)
+            with RECOMMEND_PHASE_SECONDS.time(phase="serialize"):
+                recommendations.extend((int(user), self.store.payloads(rows)) for user, rows in zip(group, row_ids))
+        return recommendations
+
+    @staticmethod
+    def group_by_constraints(users: np.ndarray, constraints: Optional[Sequence[Optional[RecipeConstraints]]]
+                             ) -> List[Tuple[np.ndarray, Optional[RecipeConstraints]]]:
+        """
+        Split users into groups sharing the same constraints, so each group is searched at once.
+
+        :param users: Positions of the users in the batch.
+        :param constraints: Constraints of every user in the batch, or None.
+        :return: List of (users, constraints) pairs.
+        """
+        if constraints is None:
+            return [(users, None)]
+        groups: Dict[str, Tuple[List[int], Optional[RecipeConstraints]]] = {}
+        for user in users:
+            user_constraints = constraints[user] or None
+            key = user_constraints.key if user_constraints else ""
+            groups.setdefault(key, ([], user_constraints))[0].append(user)
+        return [(np.asarray(group), group_constraints) for group, group_constraints in groups.values()]
+
+    def find_nearest_rows(self, user_nutrients: pd.DataFrame, meal_type: str, k: int,
+                          constraints: Optional[RecipeConstraints] = None) -> np.ndarray:
+        """
+        Find the positions in the processed data of the recipes nearest to the user's needs.
+
+        :param user_nutrients: DataFrame of user's nutrional profile.
+        :param meal_type: Type of meal to recommend (filter).
+        :param k: Number of meals to recommend.
+        :param constraints: Optional limits the recipes must satisfy.
+        :return: Array of row positions, nearest first.
+        """
+        with RECOMMEND_PHASE_SECONDS.time(phase="filter"):
+            user_features = user_nutrients[self.nutritional_columns].to_numpy(dtype=np.float64)
+        return self.find_nearest_rows_batch(user_features, meal_type, k, constraints)[0]
+
+    def find_nearest_rows_batch(self, user_features: np.ndarray, meal_type: str, k: int,
+                                constraints: Optional[RecipeConstraints] = None) -> np.ndarray:
+        """
+        Find the nearest recipes of one meal type for many users in a single search.
+
+        :param user_features: Array of per-meal nutritional needs, one row per user.
+        :param meal_type: Type of meal to recommend (filter).
+        :param k: Number of meals to recommend.
+        :param constraints: Optional limits the recipes must satisfy, shared by all users.
+        :return: Array of row positions of shape (n_users, k), nearest first; fewer than k
+            columns when fewer recipes satisfy the constraints.
+        """
+        with RECOMMEND_PHASE_SECONDS.time(phase="filter"):
+            index = self.get_index(meal_type)
+            eligible = self.eligible_positions(meal_type, constraints)
+        with RECOMMEND_PHASE_SECONDS.time(phase="scale"):
+            if self.result_cache is None:
+                queries = index.transform(user_features)
+            else:
+                # Snap like recommend_payloads so batch and single results agree
+                queries = self.grid_to_queries(self.snap_to_grid(index, user_features))
+        with RECOMMEND_PHASE_SECONDS.time(phase="search"):
+            distances, row_ids = index.search_scaled(queries, k, eligible)
+        return row_ids
+
+    def eligible_positions(self, meal_type: str, constraints: Optional[RecipeConstraints]) -> Optional[np.ndarray]:
+        """
+        Positions within a meal type's index of the recipes satisfying constraints.
+
+        :param meal_type: Type of meal, with an index.
+        :param constraints: Constraints, possibly None or empty.
+        :return: Sorted positions, or None when nothing is filtered out.
+        """
+        if not constraints:
+            return None
+        return self.constraint_indexes[meal_type].eligible(constraints)
+
+    def get_index(self, meal_type: str) -> MealTypeIndex:
+        """
+        Get the neighbor index of a meal type.
+
+        :param meal_type: Type of meal.
+        :return: The meal type's index.
+        """
+        index = self.indexes.get(meal_type)
+        if index is None:
+            raise ValueError(f"No recipes available for meal type '{meal_type}'")
+        return index
@@ -0,0 +1,286 @@
+import functools
+import logging
+import os
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+
+
+def top_k(sq_dist: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k smallest squared distances of each row.
+
+    :param sq_dist: Squared distances of shape (n_queries, n_candidates), with k <= n_candidates.
+    :param k: Number of neighbors.
+    :return: Tuple of (distances, candidate positions), both of shape (n_queries, k), sorted by distance.
+    """
+    if k < sq_dist.shape[1]:
+        candidates = np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(sq_dist.shape[1]), sq_dist.shape)
+    candidate_dist = np.take_along_axis(sq_dist, candidates, axis=1)
+    order = np.argsort(candidate_dist, axis=1, kind='stable')
+    nearest = np.take_along_axis(candidates, order, axis=1)
+
+    distances = np.sqrt(np.maximum(np.take_along_axis(candidate_dist, order, axis=1), 0.0))
+    return distances, nearest
+
+
+class SearchBackend:
+    """
+    Nearest-neighbor search over the scaled feature matrix of one meal type.
+
+    A backend is built once per meal type index and works on positions within the matrix;
+    MealTypeIndex maps them back to rows of the dataset.
+    """
+
+    name = "abstract"
+
+    # Below this share of eligible rows, over-fetching rarely finds k of them; search the subset instead
+    OVERFETCH_MIN_FRACTION = 0.2
+    # Neighbors fetched per needed eligible one, divided by the eligible share, in successive attempts
+    OVERFETCH_FACTORS = (2, 8, 32)
+
+    def __init__(self, matrix: np.ndarray, sq_norms: np.ndarray) -> None:
+        """
+        Build the search structure.
+
+        :param matrix: Scaled float32 feature matrix, one row per recipe.
+        :param sq_norms: Squared norm of every row of the matrix.
+        """
+        self.matrix = matrix
+        self.sq_norms = sq_norms
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the results this backend returns, part of every result cache key. Exact
+        backends share one key since they return the same neighbors.
+        """
+        return "exact"
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest rows of each query.
+
+        :param queries: Scaled float32 array of shape (n_queries, n_features).
+        :param k: Number of neighbors, at most the number of rows.
+        :return: Tuple of (distances, positions), both of shape (n_queries, k), sorted by distance.
+        """
+        raise NotImplementedError
+
+    def search_subset(self, queries: np.ndarray, k: int, eligible: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest eligible rows of each query.
+
+        When most rows are eligible, the backend is asked for more neighbors than needed and the
+        ineligible ones are dropped, asking for more when too few remain, as happens when the
+        constraints rule out the region around the query. Otherwise, or if that keeps failing, the
+        eligible rows are searched exhaustively, which costs time proportional to their number.
+
+        :param queries: Scaled float32 array of shape (n_queries, n_features).
+        :param k: Number of neighbors, at most the number of eligible rows.
+        :param eligible: Sorted positions of the rows that may be returned.
+        :return: Tuple of (distances, positions), both of shape (n_queries, k), sorted by distance.
+        """
+        fraction = len(eligible) / len(self.matrix)
+        if fraction >= self.OVERFETCH_MIN_FRACTION:
+            mask = np.zeros(len(self.matrix), dtype=bool)
+            mask[eligible] = True
+            for factor in self.OVERFETCH_FACTORS:
+                fetch = min(len(self.matrix), int(np.ceil(factor * k / fraction)))
+                distances, nearest = self.search(queries, fetch)
+                keep = mask[nearest]
+                if (keep.sum(axis=1) >= k).all():
+                    # Eligible neighbors first, each group still in distance order
+                    first = np.argsort(~keep, axis=1, kind='stable')[:, :k]
+                    return np.take_along_axis(distances, first, axis=1), np.take_along_axis(nearest, first, axis=1)
+                if fetch == len(self.matrix):
+                    break
+        return self.exhaustive_subset(queries, k, eligible)
+
+    def exhaustive_subset(self, queries: np.ndarray, k: int, eligible: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search of the eligible rows only, copying them out of the matrix."""
+        distances, local = BruteForceSearch(self.matrix[eligible], self.sq_norms[eligible]).search(queries, k)
+        return distances, eligible[local]
+
+
+class BruteForceSearch(SearchBackend):
+    """Exact search computing every distance with one matrix product per block of queries."""
+
+    name = "brute"
+
+    # Largest (queries x recipes) distance matrix computed at once, ~128 MB of float32
+    MAX_BLOCK_ELEMENTS = 32 * 1024 * 1024
+
+    def search_subset(self, queries: np.ndarray, k: int, eligible: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Scanning only the eligible rows never costs more than scanning them all
+        return self.exhaustive_subset(queries, k, eligible)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        nearest = np.empty((len(queries), k), dtype=np.int64)
+
+        # Bound the (queries x recipes) distance block so large batches don't exhaust memory
+        block_size = max(1, self.MAX_BLOCK_ELEMENTS // max(len(self.matrix), 1))
+        for start in range(0, len(queries), block_size):
+            block = slice(start, start + block_size)
+            distances[block], nearest[block] = self._search_block(queries[block], k)
+        return distances, nearest
+
+    def _search_block(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, computed as a single matrix product
+        sq_dist = self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        sq_dist += np.einsum('ij,ij->i', queries, queries)[:, None]
+        return top_k(sq_dist, k)
+
+
+class KDTreeSearch(SearchBackend):
+    """
+    Exact search with a scikit-learn space-partitioning tree, sublinear per query in low dimensions.
+
+    The tree keeps its own float64 copy of the matrix, so it is not shared between processes.
+    """
+
+    name = "kdtree"
+
+    def __init__(self, matrix: np.ndarray, sq_norms: np.ndarray, leaf_size: int = 40) -> None:
+        """
+        Build the tree.
+
+        :param matrix: Scaled float32 feature matrix, one row per recipe.
+        :param sq_norms: Squared norm of every row of the matrix.
+        :param leaf_size: Number of rows below which a node is scanned exhaustively.
+        """
+        super().__init__(matrix, sq_norms)
+        self.tree = self.tree_class()(np.asarray(matrix, dtype=np.float64), leaf_size=leaf_size)
+
+    @staticmethod
+    def tree_class():
+        from sklearn.neighbors import KDTree
+        return KDTree
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, nearest = self.tree.query(np.asarray(queries, dtype=np.float64), k=k, sort_results=True)
+        return distances.astype(np.float32), nearest.astype(np.int64)
+
+
+class BallTreeSearch(KDTreeSearch):
+    """Exact search with a ball tree, which degrades more gracefully than a KD-tree on clustered data."""
+
+    name = "balltree"
+
+    @staticmethod
+    def tree_class():
+        from sklearn.neighbors import BallTree
+        return BallTree
+
+
+class PartitionedSearch(SearchBackend):
+    """
+    Approximate search over an inverted file: rows are clustered with k-means and a query only
+    scans the rows of the clusters whose centroids are nearest to it.
+
+    Recall and latency both grow with the number of probed clusters; a query probing every
+    cluster is exact.
+    """
+
+    name = "ivf"
+
+    # k-means is trained on a sample of about this many rows per cluster
+    TRAIN_ROWS_PER_LIST = 64
+    TRAIN_ITERATIONS = 10
+
+    def __init__(self, matrix: np.ndarray, sq_norms: np.ndarray, n_lists: Optional[int] = None,
+                 n_probes: int = 8, seed: int = 0) -> None:
+        """
+        Cluster the rows and build the inverted lists.
+
+        :param matrix: Scaled float32 feature matrix, one row per recipe.
+        :param sq_norms: Squared norm of every row of the matrix.
+        :param n_lists: Number of clusters, defaults to the square root of the row count.
+        :param n_probes: Number of clusters scanned per query.
+        :param seed: Random seed of the k-means initialization, so builds are reproducible.
+        """
+        super().__init__(matrix, sq_norms)
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(len(matrix))), len(matrix)))
+        self.n_probes = min(n_probes, self.n_lists)
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(matrix), self.n_lists * self.TRAIN_ROWS_PER_LIST)
+        sample = np.asarray(matrix[np.sort(rng.choice(len(matrix), sample_size, replace=False))])
+        self.centroids = self.kmeans(sample, self.n_lists, rng)
+        self.centroid_search = BruteForceSearch(self.centroids, np.einsum('ij,ij->i', self.centroids, self.centroids))
+
+        # Rows grouped by cluster: the rows of cluster c are order[offsets[c]:offsets[c + 1]]
+        assignment = self.centroid_search.search(np.asarray(matrix), 1)[1][:, 0]
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.searchsorted(assignment[self.order], np.arange(self.n_lists + 1))
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}-{self.n_lists}-{self.n_probes}"
+
+    @classmethod
+    def kmeans(cls, sample: np.ndarray, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Lloyd's k-means on a sample, keeping the previous centroid of clusters that empty out.
+
+        :return: Float32 centroids of shape (n_clusters, n_features).
+        """
+        centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].astype(np.float32)
+        for _ in range(cls.TRAIN_ITERATIONS):
+            search = BruteForceSearch(centroids, np.einsum('ij,ij->i', centroids, centroids))
+            labels = search.search(sample, 1)[1][:, 0]
+            counts = np.bincount(labels, minlength=n_clusters)
+            filled = counts > 0
+            for column in range(sample.shape[1]):
+                sums = np.bincount(labels, weights=sample[:, column], minlength=n_clusters)
+                centroids[filled, column] = sums[filled] / counts[filled]
+        return centroids
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        nearest = np.empty((len(queries), k), dtype=np.int64)
+        probes = self.centroid_search.search(queries, self.n_probes)[1]
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes[i]])
+            if len(candidates) < k:
+                # Too few rows in the probed clusters, scan them all
+                candidates = np.arange(len(self.matrix))
+            sq_dist = self.sq_norms[candidates] - 2.0 * (self.matrix[candidates] @ query) + query @ query
+            distances[i], local = top_k(sq_dist[None, :], k)
+            nearest[i] = candidates[local[0]]
+        return distances, nearest
+
+
+SEARCH_BACKENDS: Dict[str, type] = {
+    backend.name: backend for backend in (BruteForceSearch, KDTreeSearch, BallTreeSearch, PartitionedSearch)
+}
+
+# Builds a backend from a scaled matrix and its squared row norms
+SearchBackendFactory = Callable[[np.ndarray, np.ndarray], SearchBackend]
+
+
+def search_backend(name: str, **options) -> SearchBackendFactory:
+    """
+    Look up a search backend by name.
+
+    :param name: One of SEARCH_BACKENDS: 'brute', 'kdtree', 'balltree' or 'ivf'.
+    :param options: Keyword arguments of the backend's constructor, e.g. n_probes for 'ivf'.
+    :return: Factory building the backend for one meal type index.
+    """
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend '{name}', expected one of {', '.join(SEARCH_BACKENDS)}")
+    return functools.partial(SEARCH_BACKENDS[name], **options)
+
+
+def search_backend_from_env() -> SearchBackendFactory:
+    """Build the search backend from RECOMMENDER_SEARCH_BACKEND, and RECOMMENDER_IVF_LISTS and
+    RECOMMENDER_IVF_PROBES for the partitioned index."""
+    name = os.getenv("RECOMMENDER_SEARCH_BACKEND", "brute")
+    options = {}
+    if name == PartitionedSearch.name:
+        lists = os.getenv("RECOMMENDER_IVF_LISTS")
+        options = {"n_lists": int(lists) if lists else None, "n_probes": int(os.getenv("RECOMMENDER_IVF_PROBES", "8"))}
+    logging.info(f"Search backend: {name} {options}")
+    return search_backend(name, **options)
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from .artifact import file_lock
+
+# Arrays of one meal type's index, by name
+IndexArrays = Dict[str, np.ndarray]
+
+
+class SharedIndex:
+    """
+    Neighbor index arrays published once as ``.npy`` files and memory-mapped read-only by every
+    worker process, so the index lives in the page cache once per host instead of once per worker.
+
+    Each publication is a new generation directory; ``generation.json`` names the current one.
+    Workers compare its generation number with the one they attached to and re-attach when it
+    changes. Placed on a tmpfs such as ``/dev/shm`` the files are plain shared memory.
+    """
+
+    MANIFEST_FILE = "generation.json"
+    LOCK_FILE = ".lock"
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initialize the handle. Nothing is read or written until requested.
+
+        :param directory: Directory shared by all workers on the host.
+        """
+        self.directory = directory
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedIndex"]:
+        """Build the shared index from SHARED_INDEX_DIR; returns None when it is unset."""
+        directory = os.getenv("SHARED_INDEX_DIR")
+        return cls(directory) if directory else None
+
+    def current(self) -> Optional[dict]:
+        """
+        Read the manifest of the current generation.
+
+        :return: Manifest with 'generation', 'dataset_version', 'path' and 'meal_types', or None.
+        """
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def generation(self) -> int:
+        """Number of the current generation, 0 before the first publication."""
+        manifest = self.current()
+        return manifest["generation"] if manifest is not None else 0
+
+    def attach(self, manifest: dict) -> Dict[str, IndexArrays]:
+        """
+        Memory-map the arrays of a published generation, read-only and without copying.
+
+        :param manifest: Manifest returned by ``current``.
+        :return: Dictionary mapping each meal type to its index arrays.
+        """
+        path = os.path.join(self.directory, manifest["path"])
+        indexes = {}
+        for position, meal_type in enumerate(manifest["meal_types"]):
+            indexes[meal_type] = {
+                name: np.load(os.path.join(path, f"{position}-{name}.npy"), mmap_mode="r")
+                for name in manifest["arrays"]
+            }
+        return indexes
+
+    def publish(self, dataset_version: str, indexes: Dict[str, IndexArrays]) -> dict:
+        """
+        Write a new generation and make it current. Callers must hold the lock.
+
+        :param dataset_version: Version of the dataset the index was built from.
+        :param indexes: Dictionary mapping each meal type to its index arrays.
+        :return: Manifest of the new generation.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self.current()
+        generation = (previous["generation"] if previous is not None else 0) + 1
+        name = f"gen-{generation:06d}"
+        staging_dir = tempfile.mkdtemp(prefix=f".{name}-", dir=self.directory)
+        array_names = []
+        for position, (meal_type, arrays) in enumerate(indexes.items()):
+            array_names = list(arrays)
+            for array_name, array in arrays.items():
+                np.save(os.path.join(staging_dir, f"{position}-{array_name}.npy"), np.ascontiguousarray(array))
+        # A directory of this name can only be left over from a publication that crashed midway
+        shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        os.replace(staging_dir, os.path.join(self.directory, name))
+
+        manifest = {
+            "generation": generation,
+            "dataset_version": dataset_version,
+            "path": name,
+            "meal_types": list(indexes),
+            "arrays": array_names,
+            "created_at": time.time(),
+        }
+        # Swap the manifest in with a rename so readers never see a partial file
+        manifest_tmp = os.path.join(self.directory, f".{self.MANIFEST_FILE}.tmp")
+        with open(manifest_tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_tmp, os.path.join(self.directory, self.MANIFEST_FILE))
+
+        # Workers still attached to older generations keep their mappings after the files are unlinked
+        for entry in os.listdir(self.directory):
+            if entry.startswith("gen-") and entry != name:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+        logging.info(f"Published shared index generation {generation} for dataset {dataset_version}")
+        return manifest
+
+    def attach_or_build(self, dataset_version: str, build: Callable[[], Dict[str, IndexArrays]],
+                        array_names: Sequence[str]) -> Tuple[int, Dict[str, IndexArrays]]:
+        """
+        Attach to the current generation if it was built from this dataset, otherwise build and
+        publish a new one. The first worker builds while the others wait, then they all attach.
+
+        :param dataset_version: Version of the dataset the caller serves.
+        :param build: Builds the index arrays when no matching generation exists.
+        :param array_names: Arrays every meal type needs; generations written by code with a
+            different index layout are rebuilt.
+        :return: Tuple of (generation, dictionary mapping each meal type to its index arrays).
+        """
+        with file_lock(os.path.join(self.directory, self.LOCK_FILE)):
+            manifest = self.current()
+            if (manifest is None or manifest["dataset_version"] != dataset_version
+                    or manifest["arrays"] != list(array_names)):
+                manifest = self.publish(dataset_version, build())
+            else:
+                logging.info(f"Attaching to shared index generation {manifest['generation']}")
+            return manifest["generation"], self.attach(manifest)
@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from typing import Iterable, List, Optional, Sequence
+from .ingredients import IngredientIndex
+
+
+class RecipeStore:
+    """
+    Processed recipes split into what the search reads for every query and the text only
+    fetched for the returned rows. This implementation keeps everything in a DataFrame.
+    """
+
+    def __init__(self, data: pd.DataFrame, feature_columns: Sequence[str]) -> None:
+        """
+        Build the store from processed recipe data.
+
+        :param data: Processed recipe data, including 'mealType', 'payload' and 'ingredientTokens'.
+        :param feature_columns: Nutritional columns used as search features.
+        """
+        self._data = data.reset_index(drop=True)
+        self.features = self._data[list(feature_columns)].to_numpy(dtype=np.float64)
+        meal_types = pd.Categorical(self._data['mealType'])
+        self.meal_type_codes = meal_types.codes.astype(np.int8)
+        self.meal_type_names = [str(name) for name in meal_types.categories]
+        # Columns recipes can be filtered on besides the features
+        self.total_minutes = self._data['totalTimeMinutes'].to_numpy(dtype=np.int32)
+        categories = pd.Categorical(self._data['recipeCategory'])
+        self.category_codes = categories.codes.astype(np.int16)
+        self.category_names = [str(name) for name in categories.categories]
+        self._ingredient_index: Optional[IngredientIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.meal_type_codes)
+
+    def rows_of_meal_type(self, meal_type: str) -> np.ndarray:
+        """
+        Positions of the recipes of one meal type.
+
+        :param meal_type: Type of meal.
+        :return: Sorted array of row positions, empty for unknown meal types.
+        """
+        if meal_type not in self.meal_type_names:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.meal_type_codes == self.meal_type_names.index(meal_type))
+
+    def feature_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Raw feature vectors of some recipes, one row per position in rows."""
+        return np.asarray(self.features[rows], dtype=np.float64)
+
+    @property
+    def ingredient_index(self) -> IngredientIndex:
+        # Built on first use; most stores never receive an ingredient constraint
+        if self._ingredient_index is None:
+            if 'ingredientTokens' in self._data:
+                self._ingredient_index = IngredientIndex.from_tokens(self._data['ingredientTokens'])
+            else:
+                self._ingredient_index = IngredientIndex.empty()
+        return self._ingredient_index
+
+    def rows_with_ingredient(self, term: str) -> np.ndarray:
+        """
+        Positions of the recipes whose ingredients contain a term.
+
+        :param term: Ingredient as a user would type it, e.g. 'peanut butter'.
+        :return: Sorted array of row positions, including removed ones.
+        """
+        return self.ingredient_index.matching(term)
+
+    def ids(self) -> np.ndarray:
+        """Recipe id of every row."""
+        return self._data['id'].to_numpy()
+
+    def payloads(self, rows: np.ndarray) -> List[str]:
+        """
+        Serialized API payloads of some recipes.
+
+        :param rows: Row positions.
+        :return: JSON-encoded meal payloads, in the order of rows.
+        """
+        return self._data['payload'].to_numpy()[rows].tolist()
+
+    def records(self, rows: np.ndarray) -> pd.DataFrame:
+        """
+        Full processed records of some recipes.
+
+        :param rows: Row positions.
+        :return: DataFrame indexed by row position, in the order of rows.
+        """
+        return self._data.iloc[rows].drop(columns=['payload', 'ingredientTokens'], errors='ignore')
+
+
+class MappedRecipeStore(RecipeStore):
+    """
+    Recipe store backed by a dataset artifact: only the meal type codes live in process memory.
+
+    Features and payloads are memory-mapped, so pages are shared between workers and only the
+    returned payloads are decoded per request. Full records are read from the row groups of the
+    artifact's parquet file that contain the requested rows.
+    """
+
+    def __init__(self, features: np.ndarray, meal_type_codes: np.ndarray, meal_type_names: List[str],
+                 total_minutes: np.ndarray, category_codes: np.ndarray, category_names: List[str],
+                 payload_blob: np.ndarray, payload_offsets: np.ndarray, data_file: str,
+                 ingredient_index: IngredientIndex) -> None:
+        """
+        Wrap the arrays of a loaded dataset artifact.
+
+        :param features: Memory-mapped feature matrix, one row per recipe.
+        :param meal_type_codes: Meal type of each recipe, as an index into meal_type_names.
+        :param meal_type_names: Meal type labels.
+        :param total_minutes: Memory-mapped total time of each recipe, in minutes.
+        :param category_codes: Memory-mapped category of each recipe, as an index into category_names.
+        :param category_names: Recipe category labels.
+        :param payload_blob: Memory-mapped bytes of all payloads, concatenated.
+        :param payload_offsets: Start offset of each payload in the blob, plus the end of the last.
+        :param data_file: Parquet file with the full processed records.
+        :param ingredient_index: Ingredient tokens of the recipes, by row position.
+        """
+        self.features = features
+        self.meal_type_codes = np.asarray(meal_type_codes, dtype=np.int8)
+        self.meal_type_names = list(meal_type_names)
+        self.total_minutes = total_minutes
+        self.category_codes = category_codes
+        self.category_names = list(category_names)
+        self.payload_blob = payload_blob
+        self.payload_offsets = payload_offsets
+        self.data_file = data_file
+        self._ingredient_index = ingredient_index
+        metadata = pq.ParquetFile(data_file).metadata
+        row_group_rows = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        self.row_group_starts = np.concatenate([[0], np.cumsum(row_group_rows)]).astype(np.int64)
+        self._ids: Optional[np.ndarray] = None
+
+    def ids(self) -> np.ndarray:
+        # Only needed to apply changes by recipe id, so read on first use
+        if self._ids is None:
+            self._ids = pq.read_table(self.data_file, columns=['id']).column('id').to_numpy()
+        return self._ids
+
+    def payloads(self, rows: np.ndarray) -> List[str]:
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.payload_offsets[rows]
+        ends = self.payload_offsets[rows + 1]
+        return [self.payload_blob[start:end].tobytes().decode() for start, end in zip(starts, ends)]
+
+    def records(self, rows: np.ndarray) -> pd.DataFrame:
+        rows = np.asarray(rows, dtype=np.int64)
+        groups = np.searchsorted(self.row_group_starts, rows, side='right') - 1
+        needed = np.unique(groups)
+        table = pq.ParquetFile(self.data_file, memory_map=True).read_row_groups(needed.tolist())
+
+        # Position of each requested row within the concatenation of the groups that were read
+        group_offsets = np.concatenate([[0], np.cumsum(np.diff(self.row_group_starts)[needed])])
+        local = group_offsets[np.searchsorted(needed, groups)] + rows - self.row_group_starts[groups]
+        records = table.take(local).to_pandas()
+        records.index = rows
+        return records
+
+
+class OverlayRecipeStore(RecipeStore):
+    """
+    A recipe store with recipes added and removed on top of an unchanged base store.
+
+    Added recipes get positions after the base rows; removed positions stay in the store but
+    are no longer listed by rows_of_meal_type, so indexes built from the overlay skip them.
+    """
+
+    def __init__(self, base: RecipeStore, added: pd.DataFrame, removed: Iterable[int],
+                 feature_columns: Sequence[str]) -> None:
+        """
+        Layer changes over a base store.
+
+        :param base: Store holding the bulk of the recipes, never modified.
+        :param added: Processed records of the added recipes, including 'mealType' and 'payload'.
+        :param removed: Positions of removed recipes, in the base or in added.
+        :param feature_columns: Nutritional columns used as search features.
+        """
+        self.base = base
+        self.added = RecipeStore(added, feature_columns)
+        self.feature_columns = list(feature_columns)
+        self.removed = np.unique(np.asarray(list(removed), dtype=np.int64))
+        self.meal_type_names, self.meal_type_codes = self._merge_categorical(
+            base.meal_type_names, base.meal_type_codes, self.added.meal_type_names, self.added.meal_type_codes
+        )
+        self.category_names, self.category_codes = self._merge_categorical(
+            base.category_names, base.category_codes, self.added.category_names, self.added.category_codes
+        )
+        self.total_minutes = np.concatenate([base.total_minutes, self.added.total_minutes])
+
+    @staticmethod
+    def _merge_categorical(base_names: List[str], base_codes: np.ndarray, added_names: List[str],
+                           added_codes: np.ndarray):
+        """Recode both sides of a categorical column onto the merged list of labels."""
+        names = list(dict.fromkeys(base_names + added_names))
+        base_map = np.asarray([names.index(m) for m in base_names], dtype=base_codes.dtype)
+        added_map = np.asarray([names.index(m) for m in added_names], dtype=base_codes.dtype)
+        return names, np.concatenate([
+            base_map[base_codes] if len(base_map) else base_codes,
+            added_map[added_codes] if len(added_map) else added_codes.astype(base_codes.dtype),
+        ])
+
+    @property
+    def added_data(self) -> pd.DataFrame:
+        return self.added._data
+
+    def with_changes(self, added: pd.DataFrame, removed: Iterable[int]) -> "OverlayRecipeStore":
+        """
+        Layer more changes over the same base store, keeping a single level of overlay.
+
+        :param added: Processed records of the newly added recipes.
+        :param removed: Positions of newly removed recipes.
+        :return: New store; this one is unchanged.
+        """
+        # Empty frames (e.g. a delete-only change) would reset the column dtypes of the concatenation
+        frames = [frame for frame in (self.added_data, added) if len(frame)] or [added]
+        return OverlayRecipeStore(
+            self.base, pd.concat(frames, ignore_index=True),
+            np.concatenate([self.removed, np.asarray(list(removed), dtype=np.int64)]), self.feature_columns
+        )
+
+    def rows_of_meal_type(self, meal_type: str) -> np.ndarray:
+        rows = super().rows_of_meal_type(meal_type)
+        return rows[~np.isin(rows, self.removed)]
+
+    def rows_with_ingredient(self, term: str) -> np.ndarray:
+        added = self.added.rows_with_ingredient(term) + len(self.base)
+        return np.concatenate([self.base.rows_with_ingredient(term), added])
+
+    def _split(self, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64)
+        in_base = rows < len(self.base)
+        return rows, in_base
+
+    def feature_rows(self, rows: np.ndarray) -> np.ndarray:
+        rows, in_base = self._split(rows)
+        features = np.empty((len(rows), len(self.feature_columns)), dtype=np.float64)
+        features[in_base] = self.base.feature_rows(rows[in_base])
+        features[~in_base] = self.added.feature_rows(rows[~in_base] - len(self.base))
+        return features
+
+    def ids(self) -> np.ndarray:
+        return np.concatenate([self.base.ids(), self.added.ids()])
+
+    def payloads(self, rows: np.ndarray) -> List[str]:
+        rows, in_base = self._split(rows)
+        if in_base.all():
+            return self.base.payloads(rows)
+        base_payloads = iter(self.base.payloads(rows[in_base]))
+        added_payloads = iter(self.added.payloads(rows[~in_base] - len(self.base)))
+        return [next(base_payloads) if b else next(added_payloads) for b in in_base]
+
+    def records(self, rows: np.ndarray) -> pd.DataFrame:
+        rows, in_base = self._split(rows)
+        parts = [self.base.records(rows[in_base])]
+        if (~in_base).any():
+            added = self.added.records(rows[~in_base] - len(self.base))
+            added.index = rows[~in_base]
+            parts.append(added)
+        return pd.concat(parts).loc[rows]
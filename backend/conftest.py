@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Tests import the service as 'app', like uvicorn in the Dockerfile; run_recommender.py and the
+# benchmarks import it as 'backend.app' from the repository root
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Recipes in the synthetic test corpus; enough for every meal type and category to have a few hundred
+CORPUS_RECIPES = 2000
+
+
+@pytest.fixture(scope="session")
+def corpus_dir(tmp_path_factory) -> str:
+    """Directory with a small synthetic recipes.parquet / recipes_ingredients.csv pair."""
+    from benchmarks.synthetic import generate_corpus
+    path = str(tmp_path_factory.mktemp("corpus"))
+    generate_corpus(CORPUS_RECIPES, path, seed=0)
+    return path
+
+
+@pytest.fixture(scope="session")
+def processor(corpus_dir, tmp_path_factory):
+    from app.recommender import RecipeDataProcessor
+    return RecipeDataProcessor(
+        os.path.join(corpus_dir, "recipes.parquet"), os.path.join(corpus_dir, "recipes_ingredients.csv"),
+        cache_dir=str(tmp_path_factory.mktemp("cache")),
+    )
+
+
+@pytest.fixture(scope="session")
+def processed(processor) -> pd.DataFrame:
+    """Processed corpus as a DataFrame, before it is written to an artifact."""
+    from app.recommender import RecipeDataProcessor
+    return RecipeDataProcessor(processor.recipe_file, processor.ingredient_file).process_data()
+
+
+@pytest.fixture(scope="session")
+def store(processor):
+    """Memory-mapped store of the processed corpus, as the service loads it."""
+    return processor.load_or_process()
+
+
+@pytest.fixture(scope="session")
+def recommender(store, processor):
+    from app.recommender import MealRecommender, NUTRITIONAL_COLUMNS
+    return MealRecommender(store, NUTRITIONAL_COLUMNS, dataset_version=processor.dataset_version)
+
+
+@pytest.fixture(scope="session")
+def profiles() -> pd.DataFrame:
+    """User profiles in the ranges the frontend allows."""
+    from app.recommender import MealRecommender
+    rng = np.random.default_rng(0)
+    n = 40
+    return pd.DataFrame({
+        "age": rng.integers(18, 80, n),
+        "sex": rng.choice(["male", "female"], n),
+        "weight": rng.uniform(45.0, 130.0, n).round(1),
+        "height": rng.integers(150, 200, n),
+        "activity_level": rng.choice(list(MealRecommender.ACTIVITY_FACTORS), n),
+        "goal": rng.choice(list(MealRecommender.GOAL_ADJUSTMENTS), n),
+        "meals_per_day": rng.integers(1, 5, n),
+    })
+
+
+@pytest.fixture
+def preferences() -> dict:
+    """Body of a /recommend-meals/ request."""
+    return {
+        "age": 30, "sex": "male", "weight": 80.0, "height": 180, "activity_level": "moderately active",
+        "goal": "maintain weight", "meals_per_day": 3,
+    }
+
+
+@pytest.fixture
+def app_env(corpus_dir, processor, monkeypatch):
+    """Point the service at the test corpus, with the settings that change its behavior unset."""
+    monkeypatch.setenv("DATA_DIR", corpus_dir)
+    monkeypatch.setenv("DATASET_CACHE_DIR", processor.cache_dir)
+    for name in ("SHARED_INDEX_DIR", "RESULT_CACHE_URL", "RECOMMENDER_POOL", "ADMIN_TOKEN", "PROFILE_SLOW_REQUESTS_MS"):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+@pytest.fixture
+def client(app_env):
+    """API client of a started service that has finished warming up."""
+    from fastapi.testclient import TestClient
+    from app import main
+    with TestClient(main.app) as client:
+        deadline = time.monotonic() + 60
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline, client.get("/ready").json()
+            time.sleep(0.02)
+        yield client
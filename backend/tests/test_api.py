@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from app.recommender import MEAL_TYPES
+
+BATCH = [
+    {"meals_per_day": 1},
+    {"meals_per_day": 4, "sex": "female", "weight": 62.5, "goal": "light weight loss"},
+    {"meals_per_day": 3, "max_total_minutes": 30, "exclude_categories": ["Dessert"]},
+]
+
+
+def ndjson_lines(response) -> list:
+    """Decode an NDJSON response, checking that every object is one newline-terminated line."""
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text.endswith("\n")
+    return [json.loads(line) for line in response.text.split("\n")[:-1]]
+
+
+@pytest.mark.parametrize("meals_per_day", [1, 3, 4])
+def test_stream_matches_the_json_response(client, preferences, meals_per_day):
+    preferences["meals_per_day"] = meals_per_day
+
+    expected = client.post("/recommend-meals/", json=preferences).json()
+    lines = ndjson_lines(client.post("/recommend-meals/?stream=true", json=preferences))
+
+    assert [line["mealType"] for line in lines] == MEAL_TYPES[:meals_per_day]
+    assert {line["mealType"]: line["meals"] for line in lines} == expected
+
+
+def test_batch_stream_matches_the_json_response(client, preferences):
+    batch = [{**preferences, **overrides} for overrides in BATCH]
+
+    expected = client.post("/recommend-meals/batch", json=batch).json()
+    lines = ndjson_lines(client.post("/recommend-meals/batch?stream=true", json=batch))
+
+    streamed = [{} for _ in batch]
+    for line in lines:
+        streamed[line["index"]][line["mealType"]] = line["meals"]
+    assert streamed == expected
+    # One line per meal slot, and each user's meal types arrive in order
+    assert len(lines) == sum(p["meals_per_day"] for p in batch)
+    for user, plan in enumerate(streamed):
+        assert list(plan) == MEAL_TYPES[:batch[user]["meals_per_day"]]
+
+
+@pytest.mark.parametrize("path, batch", [
+    ("/recommend-meals/", False),
+    ("/recommend-meals/?stream=true", False),
+    ("/recommend-meals/batch", True),
+    ("/recommend-meals/batch?stream=true", True),
+    ("/recommend-meal-plan/", False),
+])
+@pytest.mark.parametrize("invalid", [{"meals_per_day": 0}, {"max_total_minutes": -1}])
+def test_invalid_limits_are_rejected_in_every_mode(client, preferences, path, batch, invalid):
+    preferences.update(invalid)
+
+    response = client.post(path, json=[preferences] if batch else preferences)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid data or input"}
+
+
+@pytest.fixture
+def admin_token(app_env) -> str:
+    """Enable the admin endpoints; requested before client, so the service starts with them."""
+    app_env.setenv("ADMIN_TOKEN", "secret")
+    return "secret"
+
+
+@pytest.fixture(scope="module")
+def raw_record(processor) -> dict:
+    """A complete input record under an id the corpus doesn't have, as /admin/recipes accepts it."""
+    processor.load_data()
+    record = json.loads(processor.df_merged.iloc[[0]].to_json(orient="records"))[0]
+    record["id"] = record["RecipeId"] = 10 ** 7
+    return record
+
+
+def change_recipes(client, admin_token: str, **changes):
+    return client.post("/admin/recipes", json=changes, headers={"X-Admin-Token": admin_token})
+
+
+def served_version(client, admin_token: str) -> str:
+    return client.get("/admin/reload", headers={"X-Admin-Token": admin_token}).json()["dataset_version"]
+
+
+def test_recipe_changes_report_what_was_applied(admin_token, client, raw_record):
+    from app import main
+    existing = int(main.recommender.store.ids()[-1])
+    before = served_version(client, admin_token)
+
+    response = change_recipes(
+        client, admin_token, upsert=[raw_record, {**raw_record, "id": 1, "RecipeId": 1, "Calories": None}],
+        delete=[existing, 10 ** 8],
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["upserted"], body["rejected"], body["deleted"]) == (1, 1, 1)
+    assert body["dataset_version"] == served_version(client, admin_token) != before
+
+
+@pytest.mark.parametrize("changes", [
+    {"upsert": [{"Calories": None}]},
+    {"delete": [10 ** 8]},
+    {"upsert": [{"Calories": None}], "delete": [10 ** 8, 10 ** 8 + 1]},
+], ids=["incomplete-record", "unknown-id", "both"])
+def test_recipe_changes_applying_nothing_are_rejected(admin_token, client, raw_record, changes):
+    changes = {**changes, "upsert": [{**raw_record, **record} for record in changes.get("upsert", [])]}
+    before = served_version(client, admin_token)
+
+    response = change_recipes(client, admin_token, **changes)
+
+    assert response.status_code == 400
+    assert served_version(client, admin_token) == before
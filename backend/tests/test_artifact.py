@@ -0,0 +1,114 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.artifact import DatasetArtifact
+from app.recommender import NUTRITIONAL_COLUMNS, RecipeDataProcessor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def inputs(corpus_dir, tmp_path) -> RecipeDataProcessor:
+    """Processor over a private copy of the corpus, which tests may modify, with an empty cache."""
+    data_dir = tmp_path / "data"
+    shutil.copytree(corpus_dir, data_dir)
+    return RecipeDataProcessor(str(data_dir / "recipes.parquet"), str(data_dir / "recipes_ingredients.csv"),
+                               cache_dir=str(tmp_path / "cache"))
+
+
+def count_builds(monkeypatch) -> list:
+    builds = []
+    build_artifact = RecipeDataProcessor.build_artifact
+
+    def counted_build_artifact(self):
+        builds.append(self.dataset_version)
+        return build_artifact(self)
+
+    monkeypatch.setattr(RecipeDataProcessor, "build_artifact", counted_build_artifact)
+    return builds
+
+
+def test_round_trip_returns_the_same_records_and_payloads(processed, tmp_path):
+    artifact = DatasetArtifact(str(tmp_path), "key")
+    artifact.save(processed, NUTRITIONAL_COLUMNS)
+
+    store = artifact.load()
+
+    rows = np.arange(len(processed))
+    assert len(store) == len(processed)
+    pd.testing.assert_frame_equal(
+        store.records(rows).reset_index(drop=True),
+        processed.drop(columns=['payload', 'ingredientTokens']).reset_index(drop=True),
+    )
+    assert store.payloads(rows) == processed['payload'].tolist()
+    np.testing.assert_array_equal(store.features, processed[NUTRITIONAL_COLUMNS].to_numpy(dtype=np.float64))
+    np.testing.assert_array_equal(store.ids(), processed['id'].to_numpy())
+    for meal_type in processed['mealType'].unique():
+        np.testing.assert_array_equal(store.rows_of_meal_type(meal_type),
+                                      np.flatnonzero(processed['mealType'] == meal_type))
+
+
+def test_inputs_or_processing_version_change_the_key(inputs, monkeypatch):
+    builds = count_builds(monkeypatch)
+    key = inputs.dataset_version
+    inputs.load_or_process()
+    RecipeDataProcessor(inputs.recipe_file, inputs.ingredient_file, cache_dir=inputs.cache_dir).load_or_process()
+    assert builds == [key]
+
+    with open(inputs.ingredient_file, "rb+") as f:
+        content = f.read()
+        f.seek(0)
+        f.write(content.replace(b"salt", b"SALT", 1))
+    edited = RecipeDataProcessor(inputs.recipe_file, inputs.ingredient_file, cache_dir=inputs.cache_dir)
+    assert edited.dataset_version != key
+    edited.load_or_process()
+
+    monkeypatch.setattr(RecipeDataProcessor, "PROCESSING_VERSION", RecipeDataProcessor.PROCESSING_VERSION + "-next")
+    bumped = RecipeDataProcessor(inputs.recipe_file, inputs.ingredient_file, cache_dir=inputs.cache_dir)
+    assert bumped.dataset_version not in (key, edited.dataset_version)
+    bumped.load_or_process()
+
+    assert builds == [key, edited.dataset_version, bumped.dataset_version]
+
+
+def test_partial_and_staging_directories_are_ignored(inputs, monkeypatch):
+    builds = count_builds(monkeypatch)
+    key = inputs.dataset_version
+    # A build that stopped before writing its manifest, and a staging directory of another one
+    partial = os.path.join(inputs.cache_dir, key)
+    os.makedirs(partial)
+    open(os.path.join(partial, DatasetArtifact.DATA_FILE), "w").close()
+    os.makedirs(os.path.join(inputs.cache_dir, f".{key}-crashed"))
+    assert not DatasetArtifact(inputs.cache_dir, key).exists()
+
+    store = inputs.load_or_process()
+
+    assert builds == [key] and len(store) > 0
+    # Artifacts of other inputs are pruned; staging directories are left to their builder
+    os.makedirs(os.path.join(inputs.cache_dir, "0123456789abcdef"))
+    DatasetArtifact(inputs.cache_dir, key).prune()
+    assert sorted(os.listdir(inputs.cache_dir)) == sorted([".lock", f".{key}-crashed", key])
+
+
+def test_racing_builders_write_one_artifact(inputs):
+    script = (
+        "import logging, sys\n"
+        "from app.recommender import RecipeDataProcessor\n"
+        "logging.basicConfig(level=logging.INFO)\n"
+        "print(len(RecipeDataProcessor(*sys.argv[1:4]).load_or_process()))\n"
+    )
+    command = [sys.executable, "-c", script, inputs.recipe_file, inputs.ingredient_file, inputs.cache_dir]
+    builders = [subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                for _ in range(3)]
+    outputs = [builder.communicate() for builder in builders]
+
+    assert all(builder.returncode == 0 for builder in builders), outputs
+    assert len({stdout for stdout, _ in outputs}) == 1
+    assert sum("Wrote dataset artifact" in stderr for _, stderr in outputs) == 1
+    assert [entry for entry in os.listdir(inputs.cache_dir) if not entry.startswith(".")] == [inputs.dataset_version]
@@ -0,0 +1,29 @@
+from app.cache import LRUCache, ResultCache
+
+
+def test_lru_counts_hits_misses_and_evictions():
+    cache = LRUCache(max_entries=None, max_bytes=10, sizeof=len)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.set("c", "123")
+
+    assert cache.get("a") is None
+    assert cache.get("c") == "123"
+    assert cache.stats() == {"entries": 2, "bytes": 8, "hits": 1, "misses": 1, "evictions": 1}
+
+
+def test_result_cache_stats_include_local_counters_and_shared_errors():
+    class BrokenBackend:
+        def get(self, key):
+            raise ConnectionError("down")
+
+        def set(self, key, value):
+            raise ConnectionError("down")
+
+    cache = ResultCache(max_bytes=1024, shared=BrokenBackend())
+    cache.set("key", ['{"id":1}'])
+    assert cache.get("key") == ['{"id":1}']
+    assert cache.get("other") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["shared_errors"]) == (1, 1, 2)
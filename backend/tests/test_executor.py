@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.executor import PoolSaturatedError, RecommendationPool
+
+
+def test_submit_rejects_work_beyond_workers_plus_queue():
+    async def scenario() -> None:
+        pool = RecommendationPool("thread", max_workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = [pool.submit(release.wait), pool.submit(release.wait)]
+            with pytest.raises(PoolSaturatedError):
+                pool.submit(release.wait)
+            assert pool.in_flight == 2
+
+            release.set()
+            await asyncio.gather(*running)
+            assert pool.in_flight == 0
+            assert await pool.run(sum, [1, 2]) == 3
+        finally:
+            release.set()
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_tasks_keep_their_slot_until_they_stop_running():
+    async def scenario() -> None:
+        pool = RecommendationPool("thread", max_workers=1, max_queue=1)
+        started, release = threading.Event(), threading.Event()
+
+        def hold() -> None:
+            started.set()
+            release.wait()
+
+        try:
+            running, queued = pool.submit(hold), pool.submit(release.wait)
+            await asyncio.get_running_loop().run_in_executor(None, started.wait)
+
+            # As when a client disconnects: the queued task is dropped, the running one can't be stopped
+            running.cancel()
+            queued.cancel()
+            await asyncio.sleep(0.05)
+            assert pool.in_flight == 1
+            assert pool.submit(release.wait) is not None
+            with pytest.raises(PoolSaturatedError):
+                pool.submit(release.wait)
+
+            release.set()
+            for _ in range(100):
+                if pool.in_flight == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert pool.in_flight == 0
+        finally:
+            release.set()
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_unknown_pool_kind_is_rejected():
+    with pytest.raises(ValueError):
+        RecommendationPool("fiber")
+
+
+@pytest.mark.parametrize("path, batch", [
+    ("/recommend-meals/", False),
+    ("/recommend-meals/?stream=true", False),
+    ("/recommend-meals/batch", True),
+    ("/recommend-meals/batch?stream=true", True),
+    ("/recommend-meal-plan/", False),
+])
+def test_saturated_pool_answers_503_with_retry_after(client, preferences, monkeypatch, path, batch):
+    from app import main
+    pool = main.recommendation_pool
+    monkeypatch.setattr(pool, "in_flight", pool.capacity)
+
+    response = client.post(path, json=[preferences] if batch else preferences)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.filters import ConstraintIndex, RecipeConstraints
+from app.recommender import MEAL_TYPES, NUTRITIONAL_COLUMNS, MealRecommender
+
+CONSTRAINTS = [
+    RecipeConstraints(max_total_minutes=30),
+    RecipeConstraints(exclude_categories=["Dessert", "Beverages"]),
+    RecipeConstraints(max_nutrients={"sodiumContent": 600}),
+    RecipeConstraints(45, ["Dessert"], {"sodiumContent": 600, "calories": 500}),
+    RecipeConstraints(max_total_minutes=0, max_nutrients={"calories": 1}),
+]
+
+
+@pytest.fixture(scope="module")
+def records(store) -> pd.DataFrame:
+    return store.records(np.arange(len(store)))
+
+
+def satisfies(records: pd.DataFrame, constraints: RecipeConstraints) -> np.ndarray:
+    """Mask of the records meeting the constraints, checked row by row."""
+    mask = ~records["recipeCategory"].isin(constraints.exclude_categories).to_numpy()
+    for column, limit in constraints.ceilings:
+        mask &= records[column].to_numpy() <= limit
+    return mask
+
+
+def test_constraints_are_canonical():
+    a = RecipeConstraints(30, ["Pie", "Dessert", "Pie"], {"sugarContent": 10, "calories": 500})
+    b = RecipeConstraints(30, ["Dessert", "Pie"], {"calories": 500, "sugarContent": 10})
+    assert a.key == b.key
+    assert not RecipeConstraints()
+    assert RecipeConstraints(max_total_minutes=0)
+
+
+@pytest.mark.parametrize("constraints", CONSTRAINTS, ids=lambda c: c.key)
+def test_eligible_positions_match_a_scan(store, recommender, records, constraints):
+    expected_mask = satisfies(records, constraints)
+    for meal_type in MEAL_TYPES:
+        row_ids = recommender.get_index(meal_type).row_ids
+        index = ConstraintIndex(store, row_ids, NUTRITIONAL_COLUMNS)
+
+        eligible = index.eligible(constraints)
+
+        np.testing.assert_array_equal(eligible, np.flatnonzero(expected_mask[row_ids]))
+        # Served from the cache the second time, and never writable by callers
+        assert index.eligible(constraints) is eligible
+        assert not eligible.flags.writeable
+
+
+@pytest.mark.parametrize("constraints", CONSTRAINTS, ids=lambda c: c.key)
+def test_constrained_search_returns_the_nearest_eligible_recipes(recommender, records, profiles, constraints):
+    needs = MealRecommender.estimate_daily_nutritional_needs_batch(profiles)[NUTRITIONAL_COLUMNS].to_numpy() / 3
+    mask = satisfies(records, constraints)
+    for meal_type in MEAL_TYPES:
+        index = recommender.get_index(meal_type)
+        candidates = index.row_ids[mask[index.row_ids]]
+
+        rows = recommender.find_nearest_rows_batch(needs[:10], meal_type, 5, constraints)
+
+        assert rows.shape == (10, min(5, len(candidates)))
+        features = records[NUTRITIONAL_COLUMNS].to_numpy()[candidates]
+        for query, found in zip(index.transform(needs[:10]), rows):
+            distances = np.linalg.norm((features - index.mean) / index.scale - query, axis=1)
+            expected = candidates[np.argsort(distances, kind="stable")[:5]]
+            assert set(found) == set(expected)
+
+
+def test_unknown_filter_column_is_rejected(store, recommender):
+    index = ConstraintIndex(store, recommender.get_index("Lunch").row_ids, NUTRITIONAL_COLUMNS)
+    with pytest.raises(ValueError):
+        index.eligible(RecipeConstraints(max_nutrients={"servings": 2}))
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.filters import RecipeConstraints
+from app.ingredients import IngredientIndex, tokenize, tokenize_column
+from app.recommender import MEAL_TYPES, NUTRITIONAL_COLUMNS, MealRecommender
+
+
+def test_tokenize_normalizes_plurals_and_drops_units():
+    assert tokenize("2 cups Chopped Peanuts, 3 tomatoes") == ["chopped", "peanut", "tomato"]
+    assert tokenize("1 tablespoon of salt") == ["salt"]
+
+
+def test_tokenize_column_matches_tokenize():
+    ingredients = pd.Series(["2 eggs, 1 cup milk", "eggs, eggs, butter", "", "3 tomatoes, 1 lb ground beef"])
+    expected = [" ".join(tokenize(text)) for text in ingredients]
+    assert tokenize_column(ingredients).tolist() == expected
+
+
+def test_posting_lists_decode_for_every_gap_width(tmp_path):
+    # 'rare' has gaps beyond 16 bits, 'sparse' beyond 8 bits and 'dense' fits in one byte per gap
+    n = 200_000
+    tokens = np.full(n, "", dtype=object)
+    rows = {"dense": np.arange(0, n, 3), "sparse": np.arange(5, n, 700), "rare": np.array([1, 70_001, 199_999])}
+    for token, token_rows in rows.items():
+        tokens[token_rows] = [f"{existing} {token}".strip() for existing in tokens[token_rows]]
+    index = IngredientIndex.from_tokens(pd.Series(tokens))
+
+    index.save(str(tmp_path))
+    loaded = IngredientIndex.load(str(tmp_path))
+
+    widths = {token: index.directory[index.vocabulary[token], IngredientIndex.WIDTH] for token in rows}
+    assert widths == {"dense": 1, "sparse": 2, "rare": 4}
+    for token, token_rows in rows.items():
+        np.testing.assert_array_equal(index.rows(token), token_rows)
+        np.testing.assert_array_equal(loaded.rows(token), token_rows)
+    assert len(loaded.rows("missing")) == 0
+
+
+def test_matching_intersects_every_token_of_a_term():
+    index = IngredientIndex.from_tokens(pd.Series(["peanut butter bread", "peanut oil", "butter", None, "peanut butter"]))
+    np.testing.assert_array_equal(index.matching("Peanut Butter"), [0, 4])
+    np.testing.assert_array_equal(index.matching("peanuts"), [0, 1, 4])
+    assert len(index.matching("2 cups")) == 0
+
+
+@pytest.mark.parametrize("constraints", [
+    RecipeConstraints(include_ingredients=["chicken breast"]),
+    RecipeConstraints(exclude_ingredients=["Peanuts", "butter"]),
+    RecipeConstraints(30, include_ingredients=["garlic"], exclude_ingredients=["eggs"]),
+    RecipeConstraints(include_ingredients=["nonexistentium"]),
+], ids=lambda c: c.key)
+def test_ingredient_constraints_match_a_scan(store, recommender, profiles, constraints):
+    records = store.records(np.arange(len(store)))
+    recipe_tokens = [set(tokenize(text)) for text in records["ingredientsRaw"]]
+    included = [set(term.split()) for term in constraints.include_ingredients]
+    excluded = [set(term.split()) for term in constraints.exclude_ingredients]
+    mask = np.array([all(t <= tokens for t in included) and not any(t <= tokens for t in excluded)
+                     for tokens in recipe_tokens])
+    if constraints.max_total_minutes is not None:
+        mask &= records["totalTimeMinutes"].to_numpy() <= constraints.max_total_minutes
+    needs = MealRecommender.estimate_daily_nutritional_needs_batch(profiles)[NUTRITIONAL_COLUMNS].to_numpy() / 3
+
+    for meal_type in MEAL_TYPES:
+        index = recommender.get_index(meal_type)
+        np.testing.assert_array_equal(
+            recommender.eligible_positions(meal_type, constraints), np.flatnonzero(mask[index.row_ids])
+        )
+        rows = recommender.find_nearest_rows_batch(needs[:5], meal_type, 5, constraints)
+        assert mask[rows].all()
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import pytest
+
+from app import cache
+from app.llm import StreamInterruptedError, SummaryCache, SummaryLLM
+
+MESSAGES = [("system", "You are a nutrition assistant."), ("user", "Summarize my needs.")]
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    """Answers /api/chat like Ollama: one JSON object per line, sent with chunked encoding."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        model = request["model"]
+        self.server.requests.append(model)
+        script = self.server.scripts[model]
+        if script["status"] != 200:
+            body = json.dumps({"error": f"model '{model}' is unavailable"}).encode()
+            self.send_response(script["status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for position, token in enumerate(script["tokens"]):
+            self._send_line({"model": model, "message": {"role": "assistant", "content": token}, "done": False})
+            if position == 0 and script.get("hold"):
+                # Only continue once the client has seen the first token, proving it wasn't buffered
+                self.server.released = self.server.release.wait(timeout=5)
+        if script.get("fail_mid_stream"):
+            # Drop the connection without the terminating chunk, as a crashing server would
+            self.close_connection = True
+            return
+        self._send_line({"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                         "done_reason": "stop"})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_line(self, payload: Dict) -> None:
+        line = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class FakeOllama(ThreadingHTTPServer):
+    """Local stand-in for an Ollama server, scripted per model."""
+
+    daemon_threads = True
+
+    def __init__(self, scripts: Dict[str, Dict]) -> None:
+        super().__init__(("127.0.0.1", 0), _ChatHandler)
+        self.scripts = scripts
+        self.requests: List[str] = []
+        self.release = threading.Event()
+        self.released: Optional[bool] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+@pytest.fixture
+def fake_ollama():
+    servers = []
+
+    def start(scripts: Dict[str, Dict]) -> FakeOllama:
+        server = FakeOllama(scripts)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def collect(llm: SummaryLLM, on_first_token=None) -> List[str]:
+    """Run the summary stream to completion, returning its tokens; exceptions propagate."""
+
+    async def consume() -> List[str]:
+        tokens = []
+        async for token in llm.astream(MESSAGES):
+            if not tokens and on_first_token is not None:
+                on_first_token()
+            tokens.append(token)
+        return tokens
+
+    return asyncio.run(consume())
+
+
+def test_tokens_stream_as_they_are_generated(fake_ollama):
+    server = fake_ollama({"primary": {"status": 200, "tokens": ["Based ", "on ", "your ", "input"], "hold": True}})
+    llm = SummaryLLM("primary", base_url=server.url)
+
+    tokens = collect(llm, on_first_token=server.release.set)
+
+    assert tokens == ["Based ", "on ", "your ", "input"]
+    assert server.released is True
+    assert server.requests == ["primary"]
+
+
+def test_fallback_only_when_primary_fails_before_first_token(fake_ollama):
+    primary = fake_ollama({"primary": {"status": 500}})
+    fallback = fake_ollama({"fallback": {"status": 200, "tokens": ["From ", "fallback"]}})
+    llm = SummaryLLM("primary", base_url=primary.url, fallback_model="fallback", fallback_base_url=fallback.url)
+
+    assert collect(llm) == ["From ", "fallback"]
+    assert primary.requests == ["primary"]
+    assert fallback.requests == ["fallback"]
+
+
+def test_healthy_primary_never_uses_fallback(fake_ollama):
+    primary = fake_ollama({"primary": {"status": 200, "tokens": ["All ", "good"]}})
+    fallback = fake_ollama({"fallback": {"status": 200, "tokens": ["unused"]}})
+    llm = SummaryLLM("primary", base_url=primary.url, fallback_model="fallback", fallback_base_url=fallback.url)
+
+    assert collect(llm) == ["All ", "good"]
+    assert fallback.requests == []
+
+
+def test_mid_stream_failure_ends_without_duplicating_output(fake_ollama):
+    primary = fake_ollama({"primary": {"status": 200, "tokens": ["Based ", "on "], "fail_mid_stream": True}})
+    fallback = fake_ollama({"fallback": {"status": 200, "tokens": ["Based ", "on ", "your ", "input"]}})
+    llm = SummaryLLM("primary", base_url=primary.url, fallback_model="fallback", fallback_base_url=fallback.url)
+    tokens: List[str] = []
+
+    async def consume() -> None:
+        async for token in llm.astream(MESSAGES):
+            tokens.append(token)
+
+    with pytest.raises(StreamInterruptedError):
+        asyncio.run(consume())
+    assert tokens == ["Based ", "on "]
+    assert fallback.requests == []
+
+
+class ScriptedGenerations:
+    """Counts generations and streams the same tokens each time, optionally held or failing."""
+
+    def __init__(self, tokens: List[str], error: Optional[BaseException] = None) -> None:
+        self.tokens = tokens
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def generate(self):
+        self.calls += 1
+        for position, token in enumerate(self.tokens):
+            await self.release.wait()
+            if self.error is not None and position == len(self.tokens) // 2:
+                raise self.error
+            yield token
+        if self.error is not None and not self.tokens:
+            raise self.error
+
+
+async def read_summary(summary_cache: SummaryCache, key, generations: ScriptedGenerations) -> List[str]:
+    return [token async for token in summary_cache.stream(key, generations.generate)]
+
+
+def test_identical_requests_share_one_generation():
+    async def scenario() -> None:
+        summary_cache = SummaryCache()
+        generations = ScriptedGenerations(["Based ", "on ", "your ", "input"])
+        generations.release.clear()
+        readers = [asyncio.create_task(read_summary(summary_cache, "key", generations)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        assert summary_cache.stats()["in_flight"] == 1
+        generations.release.set()
+
+        results = await asyncio.wait_for(asyncio.gather(*readers), 5)
+
+        assert results == [generations.tokens] * 5
+        assert generations.calls == 1
+        assert await read_summary(summary_cache, "key", generations) == generations.tokens
+        assert generations.calls == 1
+        assert await read_summary(summary_cache, "other key", generations) == generations.tokens
+        assert generations.calls == 2
+        stats = summary_cache.stats()
+        assert (stats["shared"], stats["hits"], stats["in_flight"], stats["entries"]) == (4, 1, 0, 2)
+
+    asyncio.run(scenario())
+
+
+def test_expired_summary_is_regenerated(monkeypatch):
+    class Clock:
+        now = 1000.0
+
+        @classmethod
+        def monotonic(cls) -> float:
+            return cls.now
+
+    monkeypatch.setattr(cache, "time", Clock)
+
+    async def scenario() -> None:
+        summary_cache = SummaryCache(ttl=60)
+        generations = ScriptedGenerations(["Hello"])
+        await read_summary(summary_cache, "key", generations)
+        Clock.now += 59
+        await read_summary(summary_cache, "key", generations)
+        assert generations.calls == 1
+        Clock.now += 2
+
+        assert await read_summary(summary_cache, "key", generations) == ["Hello"]
+        assert generations.calls == 2
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("tokens", [[], ["Based ", "on ", "your ", "input"]], ids=["before-output", "mid-stream"])
+def test_failed_generation_is_not_cached_and_releases_waiters(tokens):
+    async def scenario() -> None:
+        summary_cache = SummaryCache()
+        generations = ScriptedGenerations(tokens, error=RuntimeError("model unavailable"))
+        generations.release.clear()
+        readers = [asyncio.create_task(read_summary(summary_cache, "key", generations)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        generations.release.set()
+
+        results = await asyncio.wait_for(asyncio.gather(*readers, return_exceptions=True), 5)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert generations.calls == 1
+        assert summary_cache.stats()["in_flight"] == 0 and summary_cache.stats()["entries"] == 0
+        generations.error = None
+        assert await read_summary(summary_cache, "key", generations) == tokens
+        assert generations.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_interrupted_generation_ends_streams_without_caching():
+    async def scenario() -> None:
+        summary_cache = SummaryCache()
+        generations = ScriptedGenerations(["Based ", "on ", "your ", "input"], error=StreamInterruptedError("reset"))
+        generations.release.clear()
+        readers = [asyncio.create_task(read_summary(summary_cache, "key", generations)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        generations.release.set()
+
+        results = await asyncio.wait_for(asyncio.gather(*readers), 5)
+
+        assert results == [["Based ", "on "]] * 3
+        assert summary_cache.stats()["entries"] == 0 and summary_cache.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
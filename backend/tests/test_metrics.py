@@ -0,0 +1,72 @@
+import re
+
+import pytest
+
+from app.metrics import Counter, Gauge, Histogram, Registry, capture, replay
+
+
+def test_registry_renders_the_text_exposition_format():
+    registry = Registry()
+    latency = registry.register(Histogram("demo_seconds", "Demo latency.", ("route",), buckets=(0.1, 1.0)))
+    in_flight = registry.register(Gauge("demo_in_flight", "Demo gauge."))
+    lookups = registry.register(Counter("demo_lookups_total", "Demo counter.", ("result",)))
+    latency.observe(0.05, route='/a"b')
+    latency.observe(0.5, route='/a"b')
+    latency.observe(2.0, route='/a"b')
+    in_flight.inc(3)
+    in_flight.dec()
+    lookups.set_function(lambda: 7, result="hit")
+
+    assert registry.render() == "\n".join([
+        "# HELP demo_seconds Demo latency.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a\\"b",le="1.0"} 2',
+        'demo_seconds_bucket{route="/a\\"b",le="+Inf"} 3',
+        'demo_seconds_sum{route="/a\\"b"} 2.55',
+        'demo_seconds_count{route="/a\\"b"} 3',
+        "# HELP demo_in_flight Demo gauge.",
+        "# TYPE demo_in_flight gauge",
+        "demo_in_flight 2.0",
+        "# HELP demo_lookups_total Demo counter.",
+        "# TYPE demo_lookups_total counter",
+        'demo_lookups_total{result="hit"} 7.0',
+    ]) + "\n"
+
+
+def test_captured_observations_are_only_recorded_on_replay():
+    from app.metrics import RECOMMEND_PHASE_SECONDS
+    result, observations = capture(lambda: RECOMMEND_PHASE_SECONDS.observe(0.002, phase="capture-test") or 42)
+
+    assert result == 42
+    assert observations == [("mealplan_recommend_phase_seconds", {"phase": "capture-test"}, 0.002)]
+    assert "capture-test" not in "\n".join(RECOMMEND_PHASE_SECONDS.collect())
+    replay(observations)
+    assert 'mealplan_recommend_phase_seconds_count{phase="capture-test"} 1' in RECOMMEND_PHASE_SECONDS.collect()
+
+
+def phase_count(metrics_text: str, phase: str) -> int:
+    match = re.search(rf'^mealplan_recommend_phase_seconds_count{{phase="{phase}"}} (\d+)$', metrics_text, re.M)
+    return int(match.group(1)) if match else 0
+
+
+@pytest.fixture
+def process_pool(app_env) -> None:
+    """Run recommendations on one spawned worker; requested before client, so the service starts with it."""
+    app_env.setenv("RECOMMENDER_POOL", "process")
+    app_env.setenv("RECOMMENDER_WORKERS", "1")
+
+
+def test_worker_process_observations_reach_metrics(process_pool, client, preferences):
+    from app import main
+    assert main.recommendation_pool.kind == "process"
+    before = client.get("/metrics").text
+
+    assert client.post("/recommend-meals/", json=preferences).status_code == 200
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    for phase in ("search", "assemble"):
+        assert phase_count(response.text, phase) > phase_count(before, phase)
+    assert 'mealplan_http_request_seconds_count{route="/recommend-meals/"}' in response.text
+    assert "# TYPE mealplan_summary_cache_lookups_total counter" in response.text
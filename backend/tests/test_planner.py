@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from app.filters import RecipeConstraints
+from app.planner import MealPlanner
+from app.recommender import MEAL_TYPES, NUTRITIONAL_COLUMNS, MealRecommender
+
+
+@pytest.fixture(scope="module")
+def daily_needs(profiles) -> np.ndarray:
+    return MealRecommender.estimate_daily_nutritional_needs_batch(profiles)[NUTRITIONAL_COLUMNS].to_numpy()
+
+
+@pytest.mark.parametrize("meals_per_day, days", [(1, 1), (3, 1), (3, 7), (4, 14)])
+def test_plan_has_one_recipe_per_slot_and_day_without_repeats(recommender, daily_needs, meals_per_day, days):
+    planner = MealPlanner(recommender)
+    meal_types = MEAL_TYPES[:meals_per_day]
+    for needs in daily_needs[:5]:
+        plan = planner.plan(needs, meal_types, days)
+
+        assert plan.shape == (days, meals_per_day)
+        assert (plan >= 0).all()
+        assert len(np.unique(plan)) == plan.size
+        for slot, meal_type in enumerate(meal_types):
+            assert set(plan[:, slot]) <= set(recommender.get_index(meal_type).row_ids)
+
+
+def test_plan_beats_picking_the_nearest_recipe_per_meal(recommender, daily_needs):
+    planner = MealPlanner(recommender)
+    meal_types = MEAL_TYPES[:3]
+    planned, naive = [], []
+    for needs in daily_needs:
+        plan = planner.plan(needs, meal_types)[0]
+        nearest = [recommender.find_nearest_rows_batch(needs[None] / 3, meal, 1)[0][0] for meal in meal_types]
+        planned.append(planner.deviation(recommender.store.feature_rows(plan).sum(axis=0), needs))
+        naive.append(planner.deviation(recommender.store.feature_rows(nearest).sum(axis=0), needs))
+    assert np.median(planned) < np.median(naive)
+
+
+def test_slots_stay_empty_when_no_recipe_qualifies(recommender, daily_needs):
+    constraints = RecipeConstraints(max_nutrients={"calories": 1})
+
+    plan = MealPlanner(recommender).plan(daily_needs[0], MEAL_TYPES[:2], 3, constraints)
+
+    assert plan.shape == (3, 2)
+    assert (plan == -1).all()
+
+
+@pytest.mark.parametrize("days", [0, MealPlanner.MAX_DAYS + 1])
+def test_days_out_of_range_are_rejected(recommender, daily_needs, days):
+    with pytest.raises(ValueError):
+        MealPlanner(recommender).plan(daily_needs[0], MEAL_TYPES[:3], days)
+
+
+def test_greedy_plan_after_time_budget_still_avoids_repeats(recommender, daily_needs):
+    plan = MealPlanner(recommender, time_budget=0.0).plan(daily_needs[0], MEAL_TYPES, 7)
+    assert len(np.unique(plan)) == plan.size
@@ -0,0 +1,227 @@
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.filters import RecipeConstraints
+from app.recommender import MEAL_TYPES, NUTRITIONAL_COLUMNS, MealRecommender, MealTypeIndex, RecipeDataProcessor
+
+
+@pytest.fixture(scope="module")
+def raw_recipes(processor) -> pd.DataFrame:
+    """Merged input records, before processing; what /admin/recipes accepts."""
+    processor.load_data()
+    return processor.df_merged.copy()
+
+
+def test_chunked_load_matches_a_full_merge(corpus_dir, monkeypatch):
+    recipe_file = os.path.join(corpus_dir, "recipes.parquet")
+    ingredient_file = os.path.join(corpus_dir, "recipes_ingredients.csv")
+    processor = RecipeDataProcessor(recipe_file, ingredient_file)
+    # Many chunks, the last one partial
+    monkeypatch.setattr(processor, "csv_chunk_rows", lambda: 300)
+
+    processor.load_data()
+
+    expected = pd.read_csv(ingredient_file, usecols=RecipeDataProcessor.INGREDIENT_COLUMNS).merge(
+        pd.read_parquet(recipe_file, columns=RecipeDataProcessor.RECIPE_COLUMNS),
+        how="inner", left_on="id", right_on="RecipeId"
+    )
+    assert len(expected) > 300
+    pd.testing.assert_frame_equal(processor.df_merged, expected)
+
+
+def clean_json_string(json_string: str) -> str:
+    """The per-request cleanup the precomputed payloads replaced."""
+    json_string = json_string.strip()
+    if json_string.startswith("[") and json_string.endswith("]"):
+        return re.sub(r',\s*}', '}', re.sub(r',\s*]', ']', json_string))
+    return '[]'
+
+
+def reject_constant(name: str):
+    # The response encoder rejected the NaN these decoded to; treat them as undecodable instead
+    raise json.JSONDecodeError(f"{name} is not valid JSON", name, 0)
+
+
+def per_request_meal(meal: dict) -> dict:
+    """Serialize a returned meal as /recommend-meals/ did on every request before payloads were precomputed."""
+    try:
+        ingredients_raw = clean_json_string(meal["ingredientsRaw"])
+        steps_raw = clean_json_string(meal["steps"])
+        meal["ingredients"] = json.loads(ingredients_raw, parse_constant=reject_constant) \
+            if ingredients_raw != '[]' else ["Data unavailable due to formatting issues"]
+        meal["steps"] = json.loads(steps_raw, parse_constant=reject_constant) \
+            if steps_raw != '[]' else ["Data unavailable due to formatting issues"]
+    except json.JSONDecodeError:
+        meal["ingredients"], meal["steps"] = ["Data unavailable"], ["Data unavailable"]
+    meal["nutrition"] = {
+        "Protein": f"{meal['proteinContent']}g", "Fat": f"{meal['fatContent']}g",
+        "Saturated Fat": f"{meal['saturatedFatContent']}g", "Carbohydrates": f"{meal['carbohydrateContent']}g",
+        "Fiber": f"{meal['fiberContent']}g", "Sugar": f"{meal['sugarContent']}g",
+        "Cholesterol": f"{meal['cholesterolContent']}mg", "Sodium": f"{meal['sodiumContent']}mg",
+    }
+    meal["serving_size"], meal["prep_time"], meal["cook_time"] = meal["servingSize"], meal["prepTime"], meal["cookTime"]
+    return json.loads(json.dumps(meal, allow_nan=False))
+
+
+def test_payloads_match_the_per_request_serialization(raw_recipes):
+    raw = raw_recipes.iloc[:9].copy()
+    edits = {
+        1: {'ingredients_raw': '[]'},
+        2: {'steps': '  []  '},
+        3: {'steps': '["Mix well.", NaN]'},
+        4: {'ingredients_raw': '[NaN, "2 eggs"]', 'steps': '[]'},
+        5: {'ingredients_raw': '["1 cup flour", "2 eggs", ]', 'steps': '["Whisk.", "Bake.",]'},
+        6: {'steps': 'Mix everything.'},
+        7: {'CookTime': np.nan},
+        8: {'name': 'Crème "brûlée"\\ \ttwice'},
+    }
+    for row, values in edits.items():
+        for col, value in values.items():
+            raw.iloc[row, raw.columns.get_loc(col)] = value
+
+    processed = RecipeDataProcessor.process_records(raw)
+
+    assert len(processed) == len(raw)
+    assert processed['malformedText'].tolist() == [False, True, True, True, True, False, True, False, False]
+    meals = RecipeDataProcessor.add_readable_times(
+        processed.drop(columns=['payload', 'malformedText', 'ingredientTokens'])
+    ).to_dict(orient='records')
+    for payload, meal in zip(processed['payload'], meals):
+        assert json.loads(payload) == per_request_meal(meal)
+    assert json.loads(processed['payload'][7])['cook_time'] == ''
+
+
+def test_iso_durations_parse_to_minutes_and_render_readably():
+    durations = pd.Series(["PT0M", "PT45M", "PT1H", "PT2H5M", "PT90M", "PT24H", "P1D", "45 minutes", "", None, "PT1H"])
+
+    minutes = RecipeDataProcessor.parse_iso_durations(durations)
+
+    assert minutes.tolist() == [0, 45, 60, 125, 90, 1440, 0, 0, 0, 0, 60]
+    assert [RecipeDataProcessor.format_duration(m) for m in minutes] == [
+        "", "45 Minutes", "1 Hour", "2 Hours 5 Minutes", "1 Hour 30 Minutes", "24 Hours", "", "", "", "", "1 Hour",
+    ]
+    assert RecipeDataProcessor.format_duration(1) == "1 Minute"
+    assert RecipeDataProcessor.format_duration(61) == "1 Hour 1 Minute"
+
+
+def test_batch_recommendations_match_one_profile_at_a_time(recommender, profiles):
+    profiles = profiles.iloc[:12].reset_index(drop=True)
+    # Some users share constraints, so groups of users and single users are both searched
+    constraints = [None, RecipeConstraints(max_total_minutes=30), None, RecipeConstraints(exclude_categories=["Dessert"]),
+                   RecipeConstraints(max_total_minutes=30)] + [None] * 7
+
+    plans = recommender.recommend_meals_batch(profiles, constraints=constraints)
+
+    assert len(plans) == len(profiles)
+    for user, profile in profiles.iterrows():
+        meals_per_day = int(profile['meals_per_day'])
+        needs = MealRecommender.estimate_daily_nutritional_needs(
+            profile['age'], profile['sex'], profile['weight'], profile['height'], profile['activity_level'], profile['goal']
+        )
+        user_nutrients = pd.DataFrame([{key: value / meals_per_day for key, value in needs.items()}])
+        assert list(plans[user]) == MEAL_TYPES[:meals_per_day]
+        for meal_type, payloads in plans[user].items():
+            meals = recommender.recommend_meals(user_nutrients, meal_type, constraints=constraints[user])
+            assert [json.loads(payload)['id'] for payload in payloads] == meals['id'].tolist()
+            assert payloads == recommender.recommend_payloads(user_nutrients, meal_type, constraints=constraints[user])
+
+
+def test_updated_index_matches_a_refit():
+    rng = np.random.default_rng(0)
+    features = rng.gamma(2.0, 50.0, (500, len(NUTRITIONAL_COLUMNS)))
+    added = rng.gamma(2.0, 80.0, (40, len(NUTRITIONAL_COLUMNS)))
+    removed = rng.choice(500, 60, replace=False)
+    index = MealTypeIndex(features, np.arange(500))
+
+    updated = index.updated(added, np.arange(500, 540), features[removed], removed)
+
+    kept = np.setdiff1d(np.arange(500), removed)
+    refit = MealTypeIndex(np.vstack([features[kept], added]), np.concatenate([kept, np.arange(500, 540)]))
+    np.testing.assert_allclose(updated.mean, refit.mean, rtol=1e-9)
+    np.testing.assert_allclose(updated.scale, refit.scale, rtol=1e-9)
+    np.testing.assert_array_equal(updated.row_ids, refit.row_ids)
+    np.testing.assert_allclose(updated.matrix, refit.matrix, rtol=1e-5, atol=1e-5)
+
+
+def fresh_fit(features: np.ndarray, queries: np.ndarray, k: int):
+    """Scaler statistics and neighbors of a float64 scikit-learn fit, as the index replaced."""
+    from sklearn.neighbors import NearestNeighbors
+    from sklearn.preprocessing import StandardScaler
+    scaler = StandardScaler().fit(features)
+    neighbors = NearestNeighbors(n_neighbors=k).fit(scaler.transform(features))
+    return scaler, neighbors.kneighbors(scaler.transform(queries))[1]
+
+
+def test_frozen_index_matches_a_fresh_fit_before_and_after_changes():
+    rng = np.random.default_rng(3)
+    features = rng.gamma(2.0, 50.0, (800, len(NUTRITIONAL_COLUMNS)))
+    added = rng.gamma(2.0, 80.0, (60, len(NUTRITIONAL_COLUMNS)))
+    removed = rng.choice(800, 100, replace=False)
+    queries = rng.gamma(2.0, 60.0, (30, len(NUTRITIONAL_COLUMNS)))
+    index = MealTypeIndex(features, np.arange(800))
+    updated = index.updated(added, np.arange(800, 860), features[removed], removed)
+    kept = np.setdiff1d(np.arange(800), removed)
+
+    for fitted, fit_features, fit_ids in [
+        (index, features, np.arange(800)),
+        (updated, np.vstack([features[kept], added]), np.concatenate([kept, np.arange(800, 860)])),
+    ]:
+        scaler, expected = fresh_fit(fit_features, queries, 10)
+        np.testing.assert_allclose(fitted.mean, scaler.mean_, rtol=1e-9)
+        np.testing.assert_allclose(fitted.m2 / len(fitted), scaler.var_, rtol=1e-9)
+        np.testing.assert_array_equal(fitted.search(queries, 10)[1], fit_ids[expected])
+
+
+def test_removing_every_recipe_leaves_no_index():
+    features = np.ones((3, len(NUTRITIONAL_COLUMNS)))
+    index = MealTypeIndex(features, np.arange(3))
+    assert index.updated(np.empty((0, len(NUTRITIONAL_COLUMNS))), [], features, np.arange(3)) is None
+
+
+def test_with_changes_matches_a_full_rebuild(recommender, raw_recipes, profiles):
+    rng = np.random.default_rng(1)
+    processed = RecipeDataProcessor.process_records(raw_recipes)
+    ids = processed['id'].to_numpy()
+    deleted = rng.choice(ids, 40, replace=False).tolist()
+    replaced = raw_recipes[raw_recipes['id'].isin(rng.choice(np.setdiff1d(ids, deleted), 20, replace=False))].copy()
+    replaced['Calories'] *= 1.5
+    added = raw_recipes.sample(15, random_state=2).copy()
+    added['id'] = added['RecipeId'] = np.arange(10 ** 7, 10 ** 7 + 15)
+    added['ProteinContent'] += 30
+    upserts = RecipeDataProcessor.process_records(pd.concat([replaced, added]))
+
+    # Applied in two steps, so the second one updates an overlay store
+    changed = recommender.with_changes(upserts.iloc[:20], deleted[:25]).with_changes(upserts.iloc[20:], deleted[25:])
+
+    rebuilt = MealRecommender(
+        pd.concat([processed[~processed['id'].isin(deleted + upserts['id'].tolist())], upserts], ignore_index=True),
+        NUTRITIONAL_COLUMNS,
+    )
+    assert changed.dataset_version != recommender.dataset_version
+    for meal_type in MEAL_TYPES:
+        # Statistics updated from the changed recipes only equal those of a fresh fit
+        np.testing.assert_allclose(changed.indexes[meal_type].mean, rebuilt.indexes[meal_type].mean, rtol=1e-9)
+        np.testing.assert_allclose(changed.indexes[meal_type].m2, rebuilt.indexes[meal_type].m2, rtol=1e-7)
+    needs = MealRecommender.estimate_daily_nutritional_needs_batch(profiles)[NUTRITIONAL_COLUMNS] / 3
+    for meal_type in MEAL_TYPES:
+        assert len(changed.indexes[meal_type]) == len(rebuilt.indexes[meal_type])
+        for i in range(10):
+            payloads = changed.recommend_payloads(needs.iloc[[i]], meal_type)
+            assert payloads == rebuilt.recommend_payloads(needs.iloc[[i]], meal_type)
+            assert not any(f'"id":{recipe_id},' in payload for payload in payloads for recipe_id in deleted)
+
+
+def test_with_changes_leaves_the_original_untouched(recommender, profiles):
+    needs = MealRecommender.estimate_daily_nutritional_needs_batch(profiles)[NUTRITIONAL_COLUMNS].iloc[[0]] / 3
+    before = recommender.recommend_payloads(needs, "Lunch")
+    first = int(recommender.store.ids()[recommender.find_nearest_rows(needs, "Lunch", 1)[0]])
+
+    changed = recommender.with_changes(delete_ids=[first])
+
+    assert recommender.recommend_payloads(needs, "Lunch") == before
+    assert changed.recommend_payloads(needs, "Lunch")[:4] == before[1:]
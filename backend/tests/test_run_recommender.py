@@ -0,0 +1,145 @@
+import argparse
+import copy
+import os
+
+import pandas as pd
+import pytest
+
+import run_recommender
+
+CHUNK_SIZE = 10
+
+
+@pytest.fixture
+def profiles_file(profiles, tmp_path) -> str:
+    path = str(tmp_path / "profiles.csv")
+    profiles.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def make_args(corpus_dir, processor, profiles_file, tmp_path):
+    """Build run_recommender arguments for the test corpus, with any of them overridden."""
+    def make_args(**overrides) -> argparse.Namespace:
+        args = {
+            "profiles": profiles_file, "output": str(tmp_path / "out"), "data_dir": corpus_dir,
+            "cache_dir": processor.cache_dir, "index_dir": str(tmp_path / "index"), "search_backend": "brute",
+            "workers": 1, "chunk_size": CHUNK_SIZE, "k": 5, "days": None, "restart": False,
+            "report_interval": 0.0,
+        }
+        return argparse.Namespace(**{**args, **overrides})
+    return make_args
+
+
+def read_parts(output_dir: str) -> dict:
+    return {
+        name: pd.read_parquet(os.path.join(output_dir, name))
+        for name in sorted(os.listdir(output_dir)) if name.startswith(run_recommender.PART_PREFIX)
+    }
+
+
+def test_resume_only_computes_the_missing_parts(make_args, profiles):
+    args = make_args()
+    assert run_recommender.run(args)["profiles"] == len(profiles)
+    parts = read_parts(args.output)
+    assert len(parts) == len(profiles) // CHUNK_SIZE
+    assert sorted(pd.concat(parts.values())["profile"].unique()) == list(range(len(profiles)))
+
+    missing = sorted(parts)[2]
+    os.remove(os.path.join(args.output, missing))
+    # Left behind by a run that stopped while writing a part
+    open(os.path.join(args.output, missing + ".tmp"), "w").close()
+
+    assert run_recommender.run(args)["profiles"] == CHUNK_SIZE
+    resumed = read_parts(args.output)
+    assert list(resumed) == list(parts)
+    pd.testing.assert_frame_equal(resumed[missing], parts[missing])
+    assert not any(name.endswith(".tmp") for name in os.listdir(args.output))
+
+
+def test_resume_with_other_settings_needs_restart(make_args, profiles):
+    run_recommender.run(make_args())
+
+    with pytest.raises(SystemExit):
+        run_recommender.run(make_args(k=3))
+
+    args = make_args(k=3, restart=True)
+    assert run_recommender.run(args)["profiles"] == len(profiles)
+    ranks = pd.concat(read_parts(args.output).values())["rank"]
+    assert sorted(ranks.unique()) == [0, 1, 2]
+
+
+INVALID = {
+    1: {"meals_per_day": 0},
+    3: {"goal": "get huge"},
+    4: {"weight": None},
+    6: {"age": "thirty"},
+    7: {"sex": None, "meals_per_day": 2.5},
+}
+
+
+@pytest.mark.parametrize("chunk", [run_recommender.recommend_chunk, run_recommender.plan_chunk])
+def test_invalid_profiles_are_recorded_and_the_others_computed(recommender, profiles, monkeypatch, chunk):
+    monkeypatch.setattr(run_recommender, "_recommender", recommender)
+    chunk_profiles = profiles.head(10).astype(object).assign(profile=range(10))
+    for row, values in INVALID.items():
+        for col, value in values.items():
+            chunk_profiles.at[row, col] = value
+
+    results, errors = chunk(chunk_profiles, 2)
+
+    assert errors["profile"].tolist() == sorted(INVALID) and errors["mealType"].isna().all()
+    assert errors["error"].tolist() == [
+        "meals_per_day must be a whole number of at least 1", "unknown goal", "weight must be a positive number",
+        "age must be a positive number", "sex must be 'male' or 'female'",
+    ]
+    valid = profiles.head(10).assign(profile=range(10)).drop(index=list(INVALID)).reset_index(drop=True)
+    expected, no_errors = chunk(valid, 2)
+    assert no_errors.empty and list(no_errors.columns) == run_recommender.ERROR_COLUMNS
+    pd.testing.assert_frame_equal(results, expected)
+
+
+@pytest.mark.parametrize("chunk", [run_recommender.recommend_chunk, run_recommender.plan_chunk])
+def test_meal_types_without_recipes_are_recorded(recommender, profiles, monkeypatch, chunk):
+    without_snacks = copy.copy(recommender)
+    without_snacks.indexes = {meal: index for meal, index in recommender.indexes.items() if meal != "Snacks"}
+    monkeypatch.setattr(run_recommender, "_recommender", without_snacks)
+    chunk_profiles = profiles.head(12).assign(profile=range(12))
+    four_meals = chunk_profiles.loc[chunk_profiles["meals_per_day"] == 4, "profile"].tolist()
+    assert 0 < len(four_meals) < len(chunk_profiles)
+
+    results, errors = chunk(chunk_profiles, 2)
+
+    assert errors["profile"].tolist() == four_meals
+    assert (errors["error"] == "No recipes available for meal type 'Snacks'").all()
+    if chunk is run_recommender.recommend_chunk:
+        # Only the missing meal type is lost
+        assert (errors["mealType"] == "Snacks").all()
+        assert set(results.loc[results["profile"].isin(four_meals), "mealType"]) == {"Breakfast", "Lunch", "Dinner"}
+    else:
+        assert errors["mealType"].isna().all()
+        assert not results["profile"].isin(four_meals).any()
+    assert set(results["profile"]) == set(range(12)) - (set() if chunk is run_recommender.recommend_chunk else set(four_meals))
+
+
+def test_run_counts_errors_and_writes_them_next_to_the_part(make_args, profiles, tmp_path):
+    broken = profiles.astype(object)
+    broken.at[13, "activity_level"] = "couch"
+    broken.at[27, "meals_per_day"] = -1
+    profiles_file = str(tmp_path / "broken.csv")
+    broken.to_csv(profiles_file, index=False)
+    args = make_args(profiles=profiles_file)
+
+    stats = run_recommender.run(args)
+
+    assert (stats["profiles"], stats["errors"]) == (len(profiles), 2)
+    assert len(read_parts(args.output)) == len(profiles) // CHUNK_SIZE
+    errors = {name: pd.read_parquet(os.path.join(args.output, name))
+              for name in sorted(os.listdir(args.output)) if name.startswith(run_recommender.ERRORS_PREFIX)}
+    assert list(errors) == ["errors-000001.parquet", "errors-000002.parquet"]
+    assert pd.concat(errors.values())["profile"].tolist() == [13, 27]
+
+    # Errors of a shard whose part is missing are dropped on resume and written again with the part
+    os.remove(os.path.join(args.output, "part-000002.parquet"))
+    assert run_recommender.run(args)["errors"] == 1
+    assert pd.read_parquet(os.path.join(args.output, "errors-000002.parquet"))["profile"].tolist() == [27]
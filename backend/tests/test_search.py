@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from app.search import search_backend
+
+K = 10
+
+
+@pytest.fixture(scope="module")
+def matrix() -> np.ndarray:
+    # Clustered like scaled nutrient vectors, and continuous so there are no distance ties
+    rng = np.random.default_rng(0)
+    centers = rng.normal(0.0, 3.0, (12, 9))
+    return (centers[rng.integers(0, 12, 3000)] + rng.normal(0.0, 1.0, (3000, 9))).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def queries(matrix) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    return (matrix[rng.integers(0, len(matrix), 50)] + rng.normal(0.0, 0.5, (50, 9))).astype(np.float32)
+
+
+def build(name: str, matrix: np.ndarray, **options):
+    return search_backend(name, **options)(matrix, np.einsum('ij,ij->i', matrix, matrix))
+
+
+def brute_subset(matrix: np.ndarray, queries: np.ndarray, eligible: np.ndarray):
+    return build("brute", matrix).exhaustive_subset(queries, K, eligible)
+
+
+@pytest.mark.parametrize("name, options", [
+    ("kdtree", {}), ("balltree", {}), ("ivf", {"n_lists": 20, "n_probes": 20}),
+], ids=["kdtree", "balltree", "ivf-all-probes"])
+def test_exact_searches_match_brute_force(matrix, queries, name, options):
+    expected_distances, expected = build("brute", matrix).search(queries, K)
+
+    distances, nearest = build(name, matrix, **options).search(queries, K)
+
+    np.testing.assert_array_equal(nearest, expected)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-4)
+
+
+def test_ivf_probing_every_list_is_exact_but_keyed_apart(matrix):
+    ivf = build("ivf", matrix, n_lists=20, n_probes=50)
+    assert ivf.n_probes == ivf.n_lists == 20
+    assert ivf.key == "ivf-20-20" != build("kdtree", matrix).key
+    # Every row sits in exactly one inverted list
+    np.testing.assert_array_equal(np.sort(ivf.order), np.arange(len(matrix)))
+
+
+def eligible_sets(matrix: np.ndarray) -> dict:
+    rng = np.random.default_rng(2)
+    return {
+        # Scattered: over-fetching finds them around every query
+        "scattered-90%": np.sort(rng.choice(len(matrix), int(0.9 * len(matrix)), replace=False)),
+        "scattered-30%": np.sort(rng.choice(len(matrix), int(0.3 * len(matrix)), replace=False)),
+        # Half the space ruled out, so queries there need repeated over-fetching
+        "half-space": np.flatnonzero(matrix[:, 0] > np.median(matrix[:, 0])),
+        # Too few eligible rows to over-fetch
+        "sparse": np.sort(rng.choice(len(matrix), 40, replace=False)),
+    }
+
+
+@pytest.mark.parametrize("name, options", [
+    ("brute", {}), ("kdtree", {}), ("balltree", {}), ("ivf", {"n_lists": 20, "n_probes": 20}),
+])
+@pytest.mark.parametrize("subset", ["scattered-90%", "scattered-30%", "half-space", "sparse"])
+def test_exact_subset_search_matches_brute_force(matrix, queries, name, options, subset):
+    eligible = eligible_sets(matrix)[subset]
+    expected_distances, expected = brute_subset(matrix, queries, eligible)
+
+    distances, nearest = build(name, matrix, **options).search_subset(queries, K, eligible)
+
+    np.testing.assert_array_equal(nearest, expected)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("n_probes", [1, 3])
+@pytest.mark.parametrize("subset", ["scattered-90%", "scattered-30%", "half-space", "sparse"])
+def test_approximate_subset_search_always_fills_k(matrix, queries, n_probes, subset):
+    eligible = eligible_sets(matrix)[subset]
+    ivf = build("ivf", matrix, n_lists=20, n_probes=n_probes)
+
+    distances, nearest = ivf.search_subset(queries, K, eligible)
+
+    assert nearest.shape == (len(queries), K)
+    assert np.isin(nearest, eligible).all()
+    assert all(len(set(row)) == K for row in nearest)
+    assert (np.diff(distances, axis=1) >= 0).all()
+    # Whatever it returns is at least as far as the true eligible neighbors
+    expected_distances, _ = brute_subset(matrix, queries, eligible)
+    assert (distances >= expected_distances - 1e-4).all()
+
+
+def test_subset_search_with_exactly_k_eligible_rows(matrix, queries):
+    eligible = np.flatnonzero(matrix[:, 0] > np.sort(matrix[:, 0])[-K - 1])
+    assert len(eligible) == K
+    for name in ("brute", "kdtree", "ivf"):
+        nearest = build(name, matrix).search_subset(queries, K, eligible)[1]
+        assert (np.sort(nearest, axis=1) == eligible).all()
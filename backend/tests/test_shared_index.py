@@ -0,0 +1,154 @@
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from app.recommender import NUTRITIONAL_COLUMNS, MealRecommender
+from app.shared_index import SharedIndex
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARRAYS = ["matrix", "row_ids"]
+
+
+def index_arrays(seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    return {meal: {"matrix": rng.random((20, 3), dtype=np.float32), "row_ids": np.arange(20) + 100 * seed}
+            for meal in ("Breakfast", "Lunch")}
+
+
+def not_rebuilt():
+    raise AssertionError("a matching generation must be attached, not rebuilt")
+
+
+def test_second_process_attaches_without_rebuilding(tmp_path):
+    published = index_arrays(1)
+    generation, arrays = SharedIndex(str(tmp_path)).attach_or_build("v1", lambda: published, ARRAYS)
+    assert generation == 1
+
+    script = (
+        "import sys\n"
+        "from app.shared_index import SharedIndex\n"
+        "def build(): raise SystemExit('rebuilt')\n"
+        "generation, arrays = SharedIndex(sys.argv[1]).attach_or_build('v1', build, ['matrix', 'row_ids'])\n"
+        "print(generation, type(arrays['Lunch']['matrix']).__name__, float(arrays['Lunch']['matrix'].sum()))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script, str(tmp_path)], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+
+    generation, kind, total = result.stdout.split()
+    assert (generation, kind) == ("1", "memmap")
+    assert float(total) == pytest.approx(float(published["Lunch"]["matrix"].sum()))
+    assert sorted(os.listdir(tmp_path)) == [SharedIndex.LOCK_FILE, "gen-000001", SharedIndex.MANIFEST_FILE]
+
+
+def test_publish_creates_a_generation_and_retires_the_previous_one(tmp_path):
+    shared = SharedIndex(str(tmp_path))
+    assert shared.generation() == 0
+    shared.publish("v1", index_arrays(1))
+
+    manifest = shared.publish("v2", index_arrays(2))
+
+    assert manifest["generation"] == shared.generation() == 2
+    assert manifest["path"] == "gen-000002" and manifest["dataset_version"] == "v2"
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("gen-")) == ["gen-000002"]
+    np.testing.assert_array_equal(shared.attach(manifest)["Lunch"]["row_ids"], index_arrays(2)["Lunch"]["row_ids"])
+    # A different dataset version or index layout is rebuilt, a matching one attached
+    assert shared.attach_or_build("v3", lambda: index_arrays(3), ARRAYS)[0] == 3
+    assert shared.attach_or_build("v3", not_rebuilt, ARRAYS)[0] == 3
+    assert shared.attach_or_build("v3", lambda: index_arrays(3), ["matrix"])[0] == 4
+
+
+def test_crash_during_publish_is_never_seen(tmp_path, monkeypatch):
+    shared = SharedIndex(str(tmp_path))
+    shared.publish("v1", index_arrays(1))
+    saved = []
+
+    def crashing_save(path, array):
+        if saved:
+            raise OSError("disk full")
+        saved.append(path)
+        with open(path, "wb") as f:
+            np.lib.format.write_array(f, array)
+
+    monkeypatch.setattr(np, "save", crashing_save)
+    with pytest.raises(OSError):
+        shared.publish("v2", index_arrays(2))
+    monkeypatch.undo()
+
+    manifest = shared.current()
+    assert manifest["generation"] == 1 and manifest["dataset_version"] == "v1"
+    np.testing.assert_array_equal(shared.attach(manifest)["Lunch"]["row_ids"], index_arrays(1)["Lunch"]["row_ids"])
+    assert not os.path.exists(tmp_path / "gen-000002")
+
+    # A directory left by a crash between the rename and the manifest swap is replaced, not reused
+    os.makedirs(tmp_path / "gen-000002")
+    open(tmp_path / "gen-000002" / "0-matrix.npy", "w").close()
+    assert shared.attach_or_build("v2", lambda: index_arrays(2), ARRAYS)[0] == 2
+    np.testing.assert_array_equal(
+        shared.attach(shared.current())["Breakfast"]["matrix"], index_arrays(2)["Breakfast"]["matrix"]
+    )
+
+
+def test_shared_recommender_matches_a_private_one(store, processor, profiles, tmp_path):
+    private = MealRecommender(store, NUTRITIONAL_COLUMNS, dataset_version=processor.dataset_version)
+    shared = MealRecommender(store, NUTRITIONAL_COLUMNS, dataset_version=processor.dataset_version,
+                             shared_index=SharedIndex(str(tmp_path)))
+
+    assert isinstance(shared.indexes["Lunch"].matrix, np.memmap)
+    assert shared.index_generation == 1 and shared.index_is_current()
+    needs = MealRecommender.estimate_daily_nutritional_needs_batch(profiles)[NUTRITIONAL_COLUMNS].to_numpy() / 3
+    for meal_type in private.indexes:
+        np.testing.assert_array_equal(
+            shared.find_nearest_rows_batch(needs, meal_type, 5), private.find_nearest_rows_batch(needs, meal_type, 5)
+        )
+
+
+@pytest.fixture
+def shared_index_dir(app_env, tmp_path) -> str:
+    """Serve from a shared index; requested before client, so the service starts with it."""
+    directory = str(tmp_path / "shared-index")
+    app_env.setenv("SHARED_INDEX_DIR", directory)
+    return directory
+
+
+def test_requests_reattach_once_to_a_new_generation(shared_index_dir, client, preferences, monkeypatch):
+    from app import main
+    attached = main.recommender
+    assert attached.index_generation == 1
+    expected = client.post("/recommend-meals/", json=preferences).json()
+
+    # Another worker publishes the same dataset again, as after a reload
+    SharedIndex(shared_index_dir).publish(
+        attached.dataset_version, {meal: index.arrays() for meal, index in attached.indexes.items()}
+    )
+    assert not attached.index_is_current()
+    loads = []
+    load_recommender = main.load_recommender
+
+    def counted_load_recommender(*args):
+        loads.append(threading.get_ident())
+        return load_recommender(*args)
+
+    monkeypatch.setattr(main, "load_recommender", counted_load_recommender)
+    monkeypatch.setattr(main, "last_generation_check", 0.0)
+    start = threading.Barrier(8)
+
+    def check():
+        start.wait()
+        main.ensure_current_data()
+
+    threads = [threading.Thread(target=check) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert main.recommender is not attached
+    assert main.recommender.index_generation == 2 and main.recommender.index_is_current()
+    assert main.recommender.indexes["Lunch"].matrix.filename.startswith(os.path.join(shared_index_dir, "gen-000002"))
+    assert not os.path.exists(os.path.join(shared_index_dir, "gen-000001"))
+    assert client.post("/recommend-meals/", json=preferences).json() == expected
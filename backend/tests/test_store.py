@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.recommender import NUTRITIONAL_COLUMNS
+from app.store import MappedRecipeStore, OverlayRecipeStore, RecipeStore
+
+TERMS = ["garlic", "chicken breast", "nonexistentium"]
+
+
+@pytest.fixture(scope="module")
+def frame_store(processed) -> RecipeStore:
+    return RecipeStore(processed, NUTRITIONAL_COLUMNS)
+
+
+def assert_stores_match(store: RecipeStore, expected: RecipeStore, rows: np.ndarray) -> None:
+    """Check that two stores answer every read the same way for the given rows."""
+    pd.testing.assert_frame_equal(store.records(rows), expected.records(rows), check_index_type=False)
+    assert [p.encode() for p in store.payloads(rows)] == [p.encode() for p in expected.payloads(rows)]
+    np.testing.assert_array_equal(store.feature_rows(rows), expected.feature_rows(rows))
+    np.testing.assert_array_equal(store.ids(), expected.ids())
+    np.testing.assert_array_equal(store.total_minutes, expected.total_minutes)
+    np.testing.assert_array_equal(np.asarray(store.category_names)[store.category_codes],
+                                  np.asarray(expected.category_names)[expected.category_codes])
+    for meal_type in set(store.meal_type_names) | set(expected.meal_type_names):
+        np.testing.assert_array_equal(store.rows_of_meal_type(meal_type), expected.rows_of_meal_type(meal_type))
+    for term in TERMS:
+        np.testing.assert_array_equal(store.rows_with_ingredient(term), expected.rows_with_ingredient(term))
+
+
+def test_mapped_store_matches_the_dataframe_store(store, frame_store):
+    assert isinstance(store, MappedRecipeStore)
+    assert len(store) == len(frame_store)
+    # Unordered, repeated and spanning several parquet row groups
+    rows = np.random.default_rng(0).integers(0, len(store), 300)
+    assert_stores_match(store, frame_store, rows)
+    assert store.payloads([]) == [] and store.records([]).empty
+
+
+def test_overlay_applies_upserts_and_deletes_over_the_mapped_base(store, processed):
+    rng = np.random.default_rng(1)
+    added = processed.sample(30, random_state=2).copy()
+    added['id'] = np.arange(10 ** 7, 10 ** 7 + 30)
+    added['calories'] += 100.0
+    added['payload'] = [payload.replace('"id":', '"id": ', 1) for payload in added['payload']]
+    removed = rng.choice(len(store), 50, replace=False)
+
+    # Applied in two steps, removing one of the first step's recipes in the second
+    overlay = OverlayRecipeStore(store, added.iloc[:20], removed[:25], NUTRITIONAL_COLUMNS)
+    overlay = overlay.with_changes(added.iloc[20:], np.append(removed[25:], len(store) + 3))
+
+    expected = OverlayRecipeStore(
+        RecipeStore(pd.concat([processed, added], ignore_index=True), NUTRITIONAL_COLUMNS),
+        added.iloc[:0], np.append(removed, len(store) + 3), NUTRITIONAL_COLUMNS
+    )
+    assert len(overlay) == len(store) + 30
+    rows = np.concatenate([rng.integers(0, len(overlay), 200), np.arange(len(store), len(overlay))])
+    assert_stores_match(overlay, expected, rows)
+    for meal_type in overlay.meal_type_names:
+        live = overlay.rows_of_meal_type(meal_type)
+        assert not np.isin(live, np.append(removed, len(store) + 3)).any()
+    # The base store is never modified
+    assert len(store) == len(processed)
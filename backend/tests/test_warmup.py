@@ -0,0 +1,88 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.recommender import MEAL_TYPES
+
+
+def wait_for_phase(client: TestClient, *phases: str) -> dict:
+    """Poll /ready until the warmup reaches one of the phases, returning its body."""
+    deadline = time.monotonic() + 60
+    while True:
+        body = client.get("/ready").json()
+        if body["phase"] in phases:
+            return body
+        assert time.monotonic() < deadline, body
+        time.sleep(0.02)
+
+
+def test_ready_once_data_indexes_and_llm_clients_are_loaded(app_env, preferences):
+    release = threading.Event()
+    initialize_data = main.initialize_data
+
+    def held_initialize_data(on_phase=None):
+        on_phase("importing")
+        release.wait(60)
+        initialize_data(on_phase)
+
+    app_env.setattr(main, "initialize_data", held_initialize_data)
+    app_env.setattr(main, "recommender", None)
+    with TestClient(main.app) as client:
+        try:
+            body = wait_for_phase(client, "importing")
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["status"] == "unavailable"
+            assert body["indexes"] == {} and body["dataset_version"] is None
+            for path in ("/recommend-meals/", "/recommend-meal-plan/"):
+                response = client.post(path, json=preferences)
+                assert response.status_code == 503
+                assert response.headers["Retry-After"] == "5"
+        finally:
+            release.set()
+
+        body = wait_for_phase(client, "ready", "failed")
+        assert client.get("/ready").status_code == 200
+        assert set(body["indexes"]) == set(MEAL_TYPES)
+        assert body["dataset_version"] == main.recommender.dataset_version
+        assert body["warmup_seconds"] > 0
+        assert main.summary_llm._clients is not None
+        assert client.post("/recommend-meals/", json=preferences).status_code == 200
+
+
+def test_failed_warmup_stays_unavailable(app_env, preferences):
+    def failing_initialize_data(on_phase=None):
+        raise FileNotFoundError("recipes.parquet")
+
+    app_env.setattr(main, "initialize_data", failing_initialize_data)
+    app_env.setattr(main, "recommender", None)
+    with TestClient(main.app) as client:
+        body = wait_for_phase(client, "ready", "failed")
+
+        assert body["phase"] == "failed"
+        assert body["error"] == "recipes.parquet"
+        assert client.get("/ready").status_code == 503
+        assert client.post("/recommend-meals/", json=preferences).status_code == 503
+
+
+def test_process_workers_are_warm_before_ready_and_after_reload(app_env):
+    workers = 2
+    app_env.setenv("RECOMMENDER_POOL", "process")
+    app_env.setenv("RECOMMENDER_WORKERS", str(workers))
+    app_env.setenv("ADMIN_TOKEN", "secret")
+    with TestClient(main.app) as client:
+        assert wait_for_phase(client, "ready", "failed")["phase"] == "ready"
+        assert len(main.recommendation_pool.executor._processes) == workers
+        started = main.recommendation_pool
+
+        assert client.post("/admin/reload", headers={"X-Admin-Token": "secret"}).status_code == 202
+        deadline = time.monotonic() + 60
+        while (status := client.get("/admin/reload", headers={"X-Admin-Token": "secret"}).json())["state"] == "running":
+            assert time.monotonic() < deadline, status
+            time.sleep(0.05)
+
+        assert status["state"] == "succeeded"
+        assert main.recommendation_pool is not started
+        assert len(main.recommendation_pool.executor._processes) == workers
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def status_code(url: str) -> Optional[int]:
+    """HTTP status of a GET request, or None while nothing is listening."""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def measure_boot(port: int, env: Dict[str, str], timeout: float, poll_interval: float) -> Dict[str, Any]:
+    """
+    Start the API in a fresh uvicorn process and poll it until it is ready.
+
+    :param port: Port to serve on.
+    :param env: Environment of the server process.
+    :param timeout: Seconds to wait for readiness.
+    :param poll_interval: Seconds between polls.
+    :return: Seconds from launch to the first successful /health and /ready, and the final /ready body.
+    """
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    health_seconds = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            if health_seconds is None and status_code(f"{base_url}/health") == 200:
+                health_seconds = time.perf_counter() - start
+            if health_seconds is not None and status_code(f"{base_url}/ready") == 200:
+                ready_seconds = time.perf_counter() - start
+                with urllib.request.urlopen(f"{base_url}/ready", timeout=1) as response:
+                    ready = json.load(response)
+                return {"health_seconds": health_seconds, "ready_seconds": ready_seconds,
+                        "warmup_seconds": ready["warmup_seconds"], "dataset_version": ready["dataset_version"]}
+            time.sleep(poll_interval)
+        raise TimeoutError(f"Server not ready after {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(data_dir: str, cache_dir: Optional[str], runs: int, port: int, timeout: float) -> Dict[str, Any]:
+    """
+    Measure several cold starts against an already built dataset artifact (the first run builds it).
+
+    :return: Every run's timings, plus the median of the runs after the first.
+    """
+    env = {**os.environ, "DATA_DIR": data_dir, "PYTHONDONTWRITEBYTECODE": "1"}
+    if cache_dir:
+        env["DATASET_CACHE_DIR"] = cache_dir
+    samples: List[Dict[str, Any]] = []
+    for i in range(runs):
+        samples.append(measure_boot(port, env, timeout, poll_interval=0.005))
+        print(f"  run {i + 1}: /health after {samples[-1]['health_seconds']:.2f}s, "
+              f"/ready after {samples[-1]['ready_seconds']:.2f}s")
+    warm = samples[1:] or samples
+    median = {key: sorted(s[key] for s in warm)[len(warm) // 2] for key in ("health_seconds", "ready_seconds")}
+    return {"runs": samples, "median": median}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure time to first /health and to /ready of a fresh server.")
+    parser.add_argument("--data-dir", required=True, help="Directory with recipes.parquet and recipes_ingredients.csv.")
+    parser.add_argument("--cache-dir", help="Dataset artifact directory, defaults to DATA_DIR/cache.")
+    parser.add_argument("--runs", type=int, default=5, help="Server starts; the first may build the artifact.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(args.data_dir, args.cache_dir, args.runs, args.port, args.timeout)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+        print(f"Results written to {args.output}")
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Metrics where a larger value is an improvement; every other timing is lower-is-better
+HIGHER_IS_BETTER = ("users_per_second", "requests_per_second")
+COMPARED_SUFFIXES = ("_ms", "seconds", "processing_total") + HIGHER_IS_BETTER
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Yield (dotted path, value) for every numeric timing or throughput metric."""
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and key.endswith(COMPARED_SUFFIXES):
+            yield path, float(value)
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> List[Tuple[str, float, float, float]]:
+    """
+    Compare two benchmark runs metric by metric.
+
+    :param baseline: Results of the reference run.
+    :param candidate: Results of the run under test.
+    :param threshold: Relative slowdown, e.g. 0.1 for 10%, above which a metric counts as a regression.
+    :return: List of (metric, baseline, candidate, relative slowdown) for the regressed metrics.
+    """
+    base_metrics = dict(flatten({k: v for k, v in baseline.items() if k != "metadata"}))
+    regressions = []
+    for name, value in flatten({k: v for k, v in candidate.items() if k != "metadata"}):
+        reference = base_metrics.get(name)
+        if not reference or not value:
+            continue
+        slowdown = reference / value - 1 if name.endswith(HIGHER_IS_BETTER) else value / reference - 1
+        if slowdown > threshold:
+            regressions.append((name, reference, value, slowdown))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Flag regressions between two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative slowdown (default 10%%).")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    for key in ("recipes", "seed"):
+        if baseline["metadata"].get(key) != candidate["metadata"].get(key):
+            print(f"Warning: runs differ in {key} ({baseline['metadata'].get(key)} vs {candidate['metadata'].get(key)})")
+
+    regressions = compare(baseline, candidate, args.threshold)
+    for name, reference, value, slowdown in regressions:
+        print(f"REGRESSION {name}: {reference:.4g} -> {value:.4g} ({slowdown:+.1%})")
+    if not regressions:
+        print(f"No regressions above {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
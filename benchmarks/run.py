@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List
+from backend.app.recommender import RecipeDataProcessor, MealRecommender, NUTRITIONAL_COLUMNS, MEAL_TYPES
+from backend.app.artifact import DatasetArtifact
+from .synthetic import generate_corpus
+
+SEXES = ["male", "female"]
+
+
+def random_profiles(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    """
+    Draw user profiles in the ranges the frontend allows.
+
+    :param rng: Random generator.
+    :param n: Number of profiles.
+    :return: DataFrame with the UserPreferences fields.
+    """
+    return pd.DataFrame({
+        "age": rng.integers(18, 80, n),
+        "sex": rng.choice(SEXES, n),
+        "weight": rng.uniform(45.0, 130.0, n).round(1),
+        "height": rng.integers(150, 200, n),
+        "activity_level": rng.choice(list(MealRecommender.ACTIVITY_FACTORS), n),
+        "goal": rng.choice(list(MealRecommender.GOAL_ADJUSTMENTS), n),
+        "meals_per_day": rng.integers(1, len(MEAL_TYPES) + 1, n),
+    })
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Percentiles of latency samples, in milliseconds."""
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "count": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def timed(fn: Callable[[], Any]) -> float:
+    """Wall-clock seconds of a single call."""
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_ingestion(recipe_file: str, ingredient_file: str, cache_dir: str) -> Dict[str, Any]:
+    """
+    Time every processing stage, then the artifact round trip and the index build.
+
+    :return: Seconds per stage and the processed row count.
+    """
+    processor = RecipeDataProcessor(recipe_file, ingredient_file, cache_dir=cache_dir)
+    stages = {name: timed(stage) for name, stage in processor.stages()}
+    processing_total = sum(stages.values())
+    data = processor.df_merged
+
+    artifact = DatasetArtifact(cache_dir, processor.dataset_version)
+    stages["artifact_save"] = timed(lambda: artifact.save(data, NUTRITIONAL_COLUMNS))
+    start = time.perf_counter()
+    store = artifact.load()
+    stages["artifact_load"] = time.perf_counter() - start
+    stages["build_indexes"] = timed(lambda: MealRecommender(store, NUTRITIONAL_COLUMNS))
+    return {"rows": len(data), "seconds": stages, "processing_total": processing_total}
+
+
+def bench_queries(recommender: MealRecommender, rng: np.random.Generator, queries: int) -> Dict[str, Any]:
+    """
+    Measure single-user latency per meal type, for the DataFrame and the payload paths.
+
+    :return: Latency percentiles keyed by method and meal type.
+    """
+    needs = recommender.estimate_daily_nutritional_needs_batch(random_profiles(rng, queries))
+    per_meal = needs[NUTRITIONAL_COLUMNS] / 3
+    results: Dict[str, Any] = {}
+    for method in ("recommend_meals", "recommend_payloads"):
+        fn = getattr(recommender, method)
+        results[method] = {}
+        for meal_type in MEAL_TYPES:
+            samples = [timed(lambda: fn(per_meal.iloc[[i]], meal_type)) for i in range(queries)]
+            results[method][meal_type] = latency_summary(samples)
+    return results
+
+
+def bench_batch(recommender: MealRecommender, rng: np.random.Generator,
+                batch_sizes: List[int]) -> Dict[str, Any]:
+    """
+    Measure recommend_meals_batch throughput for several batch sizes.
+
+    :return: Seconds and users per second keyed by batch size.
+    """
+    results = {}
+    for size in batch_sizes:
+        profiles = random_profiles(rng, size)
+        seconds = timed(lambda: recommender.recommend_meals_batch(profiles))
+        results[str(size)] = {"seconds": seconds, "users_per_second": size / seconds}
+    return results
+
+
+def bench_api(data_dir: str, cache_dir: str, rng: np.random.Generator, requests: int) -> Dict[str, Any]:
+    """
+    Measure end-to-end /recommend-meals/ latency through the FastAPI app, in process.
+
+    The result cache is disabled so every request runs a search.
+
+    :return: Time until /ready, latency percentiles and requests per second.
+    """
+    from fastapi.testclient import TestClient
+
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["DATASET_CACHE_DIR"] = cache_dir
+    os.environ["RESULT_CACHE_MAX_BYTES"] = "0"
+    from backend.app import main
+
+    profiles = random_profiles(rng, requests).to_dict(orient="records")
+    start = time.perf_counter()
+    with TestClient(main.app) as client:
+        # The data loads in the background after startup
+        while client.get("/ready").status_code != 200:
+            if main.warmup_status["phase"] == "failed":
+                raise RuntimeError(f"Warmup failed: {main.warmup_status['error']}")
+            time.sleep(0.01)
+        startup = time.perf_counter() - start
+        samples = []
+        for profile in profiles:
+            request_start = time.perf_counter()
+            response = client.post("/recommend-meals/", json={k: v.item() if hasattr(v, "item") else v
+                                                              for k, v in profile.items()})
+            samples.append(time.perf_counter() - request_start)
+            response.raise_for_status()
+    return {"startup_seconds": startup, **latency_summary(samples), "requests_per_second": len(samples) / sum(samples)}
+
+
+def git_commit() -> str:
+    """Commit of the working tree, or 'unknown' outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(n_recipes: int, seed: int, corpus_dir: str, queries: int, batch_sizes: List[int],
+        api_requests: int) -> Dict[str, Any]:
+    """
+    Run the whole suite against a synthetic corpus, generating it first if needed.
+
+    :return: Benchmark results with the metadata needed to compare runs.
+    """
+    data_dir = os.path.join(corpus_dir, f"recipes-{n_recipes}-seed{seed}")
+    recipe_file = os.path.join(data_dir, "recipes.parquet")
+    ingredient_file = os.path.join(data_dir, "recipes_ingredients.csv")
+    if not (os.path.exists(recipe_file) and os.path.exists(ingredient_file)):
+        print(f"Generating {n_recipes} synthetic recipes in {data_dir}")
+        generate_corpus(n_recipes, data_dir, seed=seed)
+
+    rng = np.random.default_rng(seed)
+    results: Dict[str, Any] = {
+        "metadata": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "recipes": n_recipes,
+            "seed": seed,
+        }
+    }
+
+    with tempfile.TemporaryDirectory(prefix="mealplan-bench-") as cache_dir:
+        print("Benchmarking ingestion")
+        results["ingestion"] = bench_ingestion(recipe_file, ingredient_file, cache_dir)
+
+        processor = RecipeDataProcessor(recipe_file, ingredient_file, cache_dir=cache_dir)
+        store = processor.load_or_process()
+        recommender = MealRecommender(store, NUTRITIONAL_COLUMNS, dataset_version=processor.dataset_version)
+        print("Benchmarking single-user queries")
+        results["queries"] = bench_queries(recommender, rng, queries)
+        print("Benchmarking batch recommendations")
+        results["batch"] = bench_batch(recommender, rng, batch_sizes)
+        if api_requests:
+            print("Benchmarking the API")
+            results["api"] = bench_api(data_dir, cache_dir, rng, api_requests)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, search and the API on a synthetic corpus.")
+    parser.add_argument("--recipes", type=int, default=100_000, help="Corpus size (10k to 5M).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "mealplan-corpus"),
+                        help="Where generated corpora are kept between runs.")
+    parser.add_argument("--queries", type=int, default=200, help="Single-user queries per meal type.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--api-requests", type=int, default=200, help="API requests; 0 skips the API benchmark.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(args.recipes, args.seed, args.corpus_dir, args.queries, args.batch_sizes, args.api_requests)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+        print(f"Results written to {args.output}")
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
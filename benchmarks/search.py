@@ -0,0 +1,117 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from typing import Any, Dict, List
+from backend.app.recommender import MealRecommender, MealTypeIndex, NUTRITIONAL_COLUMNS
+from backend.app.search import SEARCH_BACKENDS, BruteForceSearch, search_backend
+from .run import latency_summary, random_profiles
+from .synthetic import generate_chunk
+
+# Source column of every nutritional feature in the recipes file
+FEATURE_SOURCES = {
+    'calories': 'Calories', 'proteinContent': 'ProteinContent', 'fatContent': 'FatContent',
+    'saturatedFatContent': 'SaturatedFatContent', 'carbohydrateContent': 'CarbohydrateContent',
+    'fiberContent': 'FiberContent', 'sugarContent': 'SugarContent',
+    'cholesterolContent': 'CholesterolContent', 'sodiumContent': 'SodiumContent',
+}
+
+
+def synthetic_index(n_recipes: int, seed: int) -> MealTypeIndex:
+    """
+    Build an exact index over the nutritional features of a synthetic corpus.
+
+    :param n_recipes: Number of recipes.
+    :param seed: Random seed.
+    :return: Index with the brute force backend, used as ground truth.
+    """
+    recipes = generate_chunk(np.random.default_rng(seed), 1, n_recipes)[0]
+    features = recipes[[FEATURE_SOURCES[c] for c in NUTRITIONAL_COLUMNS]].fillna(0.0).to_numpy(dtype=np.float64)
+    return MealTypeIndex(features, np.arange(n_recipes))
+
+
+def recall_at_k(found: np.ndarray, exact: np.ndarray) -> float:
+    """Mean fraction of the exact k nearest neighbors that were found, over all queries."""
+    return float(np.mean([len(np.intersect1d(f, e)) / len(e) for f, e in zip(found, exact)]))
+
+
+def bench_backend(index: MealTypeIndex, name: str, options: Dict[str, Any], queries: np.ndarray,
+                  exact: np.ndarray, k: int) -> Dict[str, Any]:
+    """
+    Build one backend over the index and measure it against the exact neighbors.
+
+    :return: Build time, recall@k, single-query latency percentiles and batch throughput.
+    """
+    start = time.perf_counter()
+    backend = search_backend(name, **options)(index.matrix, index.sq_norms)
+    build_seconds = time.perf_counter() - start
+
+    samples = []
+    found = np.empty_like(exact)
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        found[i] = backend.search(queries[i:i + 1], k)[1][0]
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    backend.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "build_seconds": build_seconds,
+        "recall_at_k": recall_at_k(found, exact),
+        **latency_summary(samples),
+        "batch_queries_per_second": len(queries) / batch_seconds,
+    }
+
+
+def run(sizes: List[int], backends: List[str], n_probes: List[int], queries: int, k: int,
+        seed: int) -> Dict[str, Any]:
+    """
+    Measure every backend at every corpus size.
+
+    :return: Results keyed by corpus size, then by backend ('ivf-<probes>' for each probe count).
+    """
+    rng = np.random.default_rng(seed)
+    needs = MealRecommender.estimate_daily_nutritional_needs_batch(random_profiles(rng, queries))
+    results: Dict[str, Any] = {"metadata": {"k": k, "queries": queries, "seed": seed}}
+    for size in sizes:
+        print(f"Building a {size}-recipe index")
+        index = synthetic_index(size, seed)
+        user_features = needs[NUTRITIONAL_COLUMNS].to_numpy(dtype=np.float64) / rng.integers(1, 5, queries)[:, None]
+        scaled = index.transform(user_features)
+        exact = BruteForceSearch(index.matrix, index.sq_norms).search(scaled, min(k, size))[1]
+
+        results[str(size)] = {}
+        for name in backends:
+            for options in ([{"n_probes": p} for p in n_probes] if name == "ivf" else [{}]):
+                label = f"{name}-{options['n_probes']}" if options else name
+                print(f"  {label}")
+                results[str(size)][label] = bench_backend(index, name, options, scaled, exact, min(k, size))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare nearest-neighbor search backends: recall@k and latency.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", default=list(SEARCH_BACKENDS), choices=list(SEARCH_BACKENDS))
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16],
+                        help="Probed clusters of the partitioned index; one run per value.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.backends, args.probes, args.queries, args.k, args.seed)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+        print(f"Results written to {args.output}")
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Category mix loosely follows Food.com, so all four meal types get a realistic share of recipes
+CATEGORIES = [
+    ("Breakfast", 0.08), ("Lunch/Snacks", 0.07), ("One Dish Meal", 0.08), ("Vegetable", 0.07),
+    ("Dessert", 0.12), ("Chicken", 0.08), ("Meat", 0.07), ("Beverages", 0.06), ("Quick Breads", 0.05),
+    ("Sauces", 0.05), ("Pork", 0.05), ("Breads", 0.05), ("Cheese", 0.04), ("Potato", 0.04),
+    ("Salad Dressings", 0.03), ("Pie", 0.03), ("Soy/Tofu", 0.03),
+]
+
+INGREDIENTS = [
+    "chicken breast", "ground beef", "pork chops", "salmon fillets", "shrimp", "tofu", "eggs", "milk",
+    "butter", "heavy cream", "cheddar cheese", "parmesan cheese", "mozzarella cheese", "cream cheese",
+    "all-purpose flour", "sugar", "brown sugar", "honey", "maple syrup", "baking powder", "baking soda",
+    "salt", "black pepper", "olive oil", "vegetable oil", "garlic", "onion", "red onion", "shallots",
+    "carrots", "celery", "potatoes", "sweet potatoes", "tomatoes", "tomato paste", "spinach", "kale",
+    "broccoli", "zucchini", "bell pepper", "jalapeno", "mushrooms", "green beans", "corn", "peas",
+    "black beans", "chickpeas", "lentils", "rice", "quinoa", "pasta", "bread crumbs", "oats", "peanuts",
+    "peanut butter", "almonds", "walnuts", "pecans", "raisins", "bananas", "apples", "blueberries",
+    "strawberries", "lemon juice", "lime juice", "orange zest", "soy sauce", "worcestershire sauce",
+    "dijon mustard", "mayonnaise", "sour cream", "yogurt", "vanilla extract", "cinnamon", "nutmeg",
+    "cumin", "paprika", "chili powder", "oregano", "basil", "thyme", "rosemary", "parsley", "cilantro",
+    "ginger", "chicken broth", "beef broth", "white wine", "vinegar", "cocoa powder", "chocolate chips",
+]
+QUANTITIES = ["1 cup", "1/2 cup", "2 tablespoons", "1 teaspoon", "1/4 teaspoon", "3", "2", "1 lb", "8 ounces", "1 pinch"]
+STEP_PHRASES = [
+    "Preheat oven to 350 degrees.", "Combine all ingredients in a large bowl.", "Stir until well blended.",
+    "Heat oil in a skillet over medium heat.", "Add the onion and cook until soft.", "Season to taste.",
+    "Bake for 25 minutes or until golden.", "Let cool before serving.", "Simmer, covered, for 20 minutes.",
+    "Whisk the eggs and milk together.", "Fold in the remaining ingredients.", "Serve immediately.",
+]
+
+
+def _iso_durations(minutes: np.ndarray) -> np.ndarray:
+    """Format minute counts as ISO 8601 durations the way Food.com does (PT#H#M)."""
+    hours, mins = np.divmod(minutes, 60)
+    hours_part = np.where(hours > 0, np.char.add(hours.astype(str), "H"), "")
+    mins_part = np.where(mins > 0, np.char.add(mins.astype(str), "M"), "")
+    durations = np.char.add(np.char.add("PT", hours_part), mins_part)
+    return np.where(minutes > 0, durations, "PT0M").astype(object)
+
+
+def _json_lists(rng: np.random.Generator, vocabulary: np.ndarray, n: int, min_items: int, max_items: int) -> list:
+    """Build JSON list strings drawn from a vocabulary, in the loosely formatted style of the source data."""
+    counts = rng.integers(min_items, max_items + 1, n)
+    items = rng.choice(vocabulary, counts.sum())
+    boundaries = np.concatenate([[0], np.cumsum(counts)])
+    return ['["' + '", "'.join(items[boundaries[i]:boundaries[i + 1]]) + '"]' for i in range(n)]
+
+
+def generate_chunk(rng: np.random.Generator, first_id: int, n: int) -> tuple:
+    """
+    Generate one chunk of recipes.
+
+    :param rng: Random generator.
+    :param first_id: RecipeId of the first recipe in the chunk.
+    :param n: Number of recipes.
+    :return: Tuple of (recipes DataFrame, ingredients DataFrame).
+    """
+    ids = np.arange(first_id, first_id + n)
+    names, weights = zip(*CATEGORIES)
+    weights = np.asarray(weights) / np.sum(weights)
+
+    prep = rng.choice([5, 10, 15, 20, 30, 45, 60], n, p=[0.15, 0.25, 0.2, 0.15, 0.12, 0.08, 0.05])
+    cook = np.where(rng.random(n) < 0.2, 0, rng.gamma(2.0, 20.0, n).astype(int))
+    cook_times = _iso_durations(cook)
+    cook_times[rng.random(n) < 0.1] = None
+
+    calories = rng.gamma(2.2, 180.0, n)
+    recipes = pd.DataFrame({
+        "RecipeId": ids,
+        "Name": [f"Synthetic Recipe {i}" for i in ids],
+        "AuthorId": rng.integers(1, 500_000, n),
+        "CookTime": cook_times,
+        "PrepTime": _iso_durations(prep),
+        "TotalTime": _iso_durations(prep + cook),
+        "DatePublished": "2005-01-01T00:00:00Z",
+        "Description": rng.choice(STEP_PHRASES, n),
+        "RecipeCategory": rng.choice(names, n, p=weights),
+        "Calories": calories.round(1),
+        "FatContent": (calories * rng.uniform(0.01, 0.08, n)).round(1),
+        "SaturatedFatContent": (calories * rng.uniform(0.002, 0.03, n)).round(1),
+        "CholesterolContent": rng.gamma(1.5, 40.0, n).round(1),
+        "SodiumContent": rng.gamma(2.0, 250.0, n).round(1),
+        "CarbohydrateContent": (calories * rng.uniform(0.02, 0.18, n)).round(1),
+        "FiberContent": rng.gamma(1.5, 1.5, n).round(1),
+        "SugarContent": rng.gamma(1.2, 8.0, n).round(1),
+        "ProteinContent": (calories * rng.uniform(0.005, 0.09, n)).round(1),
+        "RecipeServings": rng.integers(1, 12, n).astype(float),
+    })
+    # A few recipes lack nutrition data and are dropped during processing
+    recipes.loc[rng.random(n) < 0.005, "Calories"] = np.nan
+
+    ingredient_phrases = np.char.add(np.char.add(rng.choice(QUANTITIES, len(INGREDIENTS)), " "), INGREDIENTS)
+    ingredients_raw = _json_lists(rng, ingredient_phrases, n, 3, 14)
+    steps = _json_lists(rng, np.asarray(STEP_PHRASES), n, 2, 9)
+    # Mimic the formatting problems of the source data: trailing commas and truncated lists
+    for rows, fix in ((rng.random(n) < 0.02, lambda s: s[:-1] + ",]"), (rng.random(n) < 0.005, lambda s: s[:-2])):
+        for i in np.flatnonzero(rows):
+            steps[i] = fix(steps[i])
+
+    ingredients = pd.DataFrame({
+        "id": ids,
+        "name": [f"synthetic recipe {i}" for i in ids],
+        "description": rng.choice(STEP_PHRASES, n),
+        "ingredients": ingredients_raw,
+        "ingredients_raw": ingredients_raw,
+        "serving_size": [f"1 ({g} g)" for g in rng.integers(50, 600, n)],
+        "servings": rng.integers(1, 12, n),
+        "steps": steps,
+        "tags": '["60-minutes-or-less", "time-to-make", "course"]',
+    })
+    return recipes, ingredients
+
+
+def generate_corpus(n_recipes: int, out_dir: str, seed: int = 0, chunk_size: int = 250_000) -> None:
+    """
+    Write a synthetic recipes.parquet / recipes_ingredients.csv pair with the Food.com schema
+    that RecipeDataProcessor expects. Data is generated and written in chunks so corpora of
+    millions of recipes fit in memory.
+
+    :param n_recipes: Number of recipes.
+    :param out_dir: Output directory.
+    :param seed: Random seed; the same seed and size always produce the same files.
+    :param chunk_size: Recipes generated per chunk.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    recipe_path = os.path.join(out_dir, "recipes.parquet")
+    ingredient_path = os.path.join(out_dir, "recipes_ingredients.csv")
+
+    writer = None
+    try:
+        for first in range(0, n_recipes, chunk_size):
+            recipes, ingredients = generate_chunk(rng, first + 1, min(chunk_size, n_recipes - first))
+            schema = writer.schema if writer is not None else None
+            table = pa.Table.from_pandas(recipes, schema=schema, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(recipe_path, table.schema)
+            writer.write_table(table)
+            ingredients.to_csv(ingredient_path, mode="w" if first == 0 else "a", header=first == 0, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic recipe corpus.")
+    parser.add_argument("--recipes", type=int, default=10_000, help="Number of recipes (10k to 5M).")
+    parser.add_argument("--out", required=True, help="Output directory.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_corpus(args.recipes, args.out, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
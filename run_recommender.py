@@ -1,38 +1,340 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
 import pandas as pd
-from backend.app.recommender import RecipeDataProcessor, MealRecommender
+import pyarrow.parquet as pq
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from backend.app.recommender import RecipeDataProcessor, MealRecommender, NUTRITIONAL_COLUMNS, MEAL_TYPES
+from backend.app.planner import MealPlanner
+from backend.app.search import SEARCH_BACKENDS, search_backend
+from backend.app.shared_index import SharedIndex
 
-def main():
-    #Main Entry Point for Meal Recommendation Engine
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Columns every profile needs, as in the API's UserPreferences
+PROFILE_COLUMNS = ['age', 'sex', 'weight', 'height', 'activity_level', 'goal', 'meals_per_day']
+# Settings of a run; resuming with different ones would mix incompatible parts
+RUN_FILE = "_run.json"
+PART_PREFIX = "part-"
+# Side file of a part, listing the profiles or meals that could not be computed
+ERRORS_PREFIX = "errors-"
+ERROR_COLUMNS = ['profile', 'mealType', 'error']
+
+# Recommender of each worker process, loaded once by init_worker
+_recommender: Optional[MealRecommender] = None
+
+
+def default_index_dir() -> str:
+    """Shared index directory on a tmpfs when the host has one, so workers share it as plain memory."""
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(root, "mealplan-batch-index")
+
+
+def load_recommender(data_dir: str, cache_dir: str, index_dir: str, backend: str) -> MealRecommender:
+    """
+    Open the dataset artifact and attach to the shared index, building either on first use.
+
+    :param data_dir: Directory holding recipes.parquet and recipes_ingredients.csv.
+    :param cache_dir: Dataset artifact directory.
+    :param index_dir: Shared index directory.
+    :param backend: Name of the search backend, see SEARCH_BACKENDS.
+    :return: Recommender over memory-mapped recipes and index arrays.
+    """
+    processor = RecipeDataProcessor(os.path.join(data_dir, "recipes.parquet"),
+                                    os.path.join(data_dir, "recipes_ingredients.csv"), cache_dir=cache_dir)
+    return MealRecommender(processor.load_or_process(), NUTRITIONAL_COLUMNS, dataset_version=processor.dataset_version,
+                           shared_index=SharedIndex(index_dir), search_backend=search_backend(backend))
+
+
+def init_worker(settings: Dict[str, str]) -> None:
+    """Load the worker's recommender; the parent has already built the artifact and the index."""
+    global _recommender
+    _recommender = load_recommender(**settings)
+
+
+def read_profiles(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Stream user profiles from a CSV or parquet file.
+
+    :param path: Profiles file, with at least PROFILE_COLUMNS.
+    :param chunk_size: Profiles per chunk.
+    :return: Chunks of profiles, each with a 'profile' column holding the row number in the file.
+    """
+    if path.endswith(".parquet"):
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size))
+    else:
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+    start = 0
+    for chunk in chunks:
+        missing = set(PROFILE_COLUMNS) - set(chunk.columns)
+        if missing:
+            raise ValueError(f"Profiles are missing columns: {sorted(missing)}")
+        chunk = chunk.reset_index(drop=True)
+        chunk.insert(0, 'profile', np.arange(start, start + len(chunk), dtype=np.int64))
+        start += len(chunk)
+        yield chunk
+
+
+def split_invalid_profiles(profiles: pd.DataFrame) -> Tuple[pd.DataFrame, List[Tuple[Any, Optional[str], str]]]:
+    """
+    Check every profile as the API's UserPreferences would, so one bad row doesn't fail its chunk.
+
+    :param profiles: Chunk from read_profiles.
+    :return: Tuple of (valid profiles with numeric columns, error records of the invalid ones).
+    """
+    errors = pd.Series(None, index=profiles.index, dtype=object)
+    checks = [
+        (profiles['sex'].astype(str).str.lower().isin(['male', 'female']), "sex must be 'male' or 'female'"),
+        (profiles['activity_level'].astype(str).str.lower().isin(list(MealRecommender.ACTIVITY_FACTORS)),
+         "unknown activity_level"),
+        (profiles['goal'].astype(str).str.lower().isin(list(MealRecommender.GOAL_ADJUSTMENTS)), "unknown goal"),
+    ]
+    numeric = {col: pd.to_numeric(profiles[col], errors='coerce') for col in ['age', 'weight', 'height', 'meals_per_day']}
+    for col in ['age', 'weight', 'height']:
+        checks.append((numeric[col] > 0, f"{col} must be a positive number"))
+    meals_per_day = numeric['meals_per_day']
+    checks.append(((meals_per_day >= 1) & (meals_per_day % 1 == 0), "meals_per_day must be a whole number of at least 1"))
+    # Each invalid profile is reported with the first check it fails
+    for valid, message in reversed(checks):
+        errors = errors.mask(~valid, message)
+
+    invalid = errors.notna()
+    records = [(profile, None, error) for profile, error in zip(profiles['profile'][invalid], errors[invalid])]
+    # Typed like valid input even when a column only held missing or malformed values
+    valid = profiles[~invalid].assign(
+        **{col: values[~invalid] for col, values in numeric.items()},
+        **{col: profiles.loc[~invalid, col].astype(str) for col in ['sex', 'activity_level', 'goal']},
+    )
+    return valid.astype({'meals_per_day': np.int64}).reset_index(drop=True), records
+
+
+def error_frame(records: List[Tuple[Any, Optional[str], str]]) -> pd.DataFrame:
+    """Error records as written to a part's errors file."""
+    return pd.DataFrame.from_records(records, columns=ERROR_COLUMNS).astype({'profile': np.int64})
+
+
+def recommend_chunk(profiles: pd.DataFrame, k: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Recommend k recipes per meal type to every profile, as the /recommend-meals/ endpoint does.
 
-    recipe_file = "./data/recipes.parquet"
-    ingredient_file = "./data/recipes_ingredients.csv"
+    :param profiles: Chunk from read_profiles.
+    :param k: Recipes per meal type.
+    :return: Tuple of (one row per recommended recipe: profile, mealType, rank and recipeId,
+        one row per invalid profile or meal type without recipes: profile, mealType and error).
+    """
+    profiles, errors = split_invalid_profiles(profiles)
+    per_meal_needs = _recommender.per_meal_needs_batch(profiles)
+    meals_per_day = profiles['meals_per_day'].to_numpy()
+    ids = _recommender.store.ids()
+    parts = []
+    for position, meal_type in enumerate(MEAL_TYPES):
+        users = np.flatnonzero(meals_per_day > position)
+        if len(users) == 0:
+            break
+        # Cohorts often share exact needs; search each distinct vector once
+        unique_needs, inverse = np.unique(per_meal_needs[users], axis=0, return_inverse=True)
+        try:
+            rows = _recommender.find_nearest_rows_batch(unique_needs, meal_type, k)[inverse.reshape(-1)]
+        except ValueError as error:
+            # No recipes of this meal type; the users still get their other meal types
+            errors.extend((profile, meal_type, str(error)) for profile in profiles['profile'].to_numpy()[users])
+            continue
+        parts.append(pd.DataFrame({
+            'profile': np.repeat(profiles['profile'].to_numpy()[users], rows.shape[1]),
+            'mealType': meal_type,
+            'rank': np.tile(np.arange(rows.shape[1], dtype=np.int16), len(users)),
+            'recipeId': ids[rows.ravel()],
+        }))
+    results = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['profile', 'mealType', 'rank', 'recipeId'])
+    return results, error_frame(errors)
 
-    processor = RecipeDataProcessor(recipe_file, ingredient_file)
-    processed_data = processor.process_data()
-    nutritional_columns = ['calories', 'proteinContent', 'fatContent', 'saturatedFatContent', 'carbohydrateContent', 
-                           'fiberContent', 'sugarContent', 'cholesterolContent', 'sodiumContent']
 
-    recommender = MealRecommender(processed_data, nutritional_columns)
+def plan_chunk(profiles: pd.DataFrame, days: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Plan one recipe per meal for each day of every profile, as the /recommend-meal-plan/ endpoint does.
 
-    nutrients = recommender.estimate_daily_nutritional_needs(age=57, sex='male', weight=86, height=173,
-                                                             activity_level='moderately active', goal='moderate weight loss')
+    :param profiles: Chunk from read_profiles.
+    :param days: Days to plan per profile.
+    :return: Tuple of (one row per planned meal: profile, day, mealType and recipeId,
+        one row per profile that couldn't be planned: profile, mealType and error).
+    """
+    profiles, errors = split_invalid_profiles(profiles)
+    needs = MealRecommender.estimate_daily_nutritional_needs_batch(profiles)[NUTRITIONAL_COLUMNS].to_numpy()
+    planner = MealPlanner.from_env(_recommender)
+    ids = _recommender.store.ids()
+    records = []
+    for profile, daily_needs, meals_per_day in zip(profiles['profile'], needs, profiles['meals_per_day']):
+        meal_types = MEAL_TYPES[:meals_per_day]
+        try:
+            plan = planner.plan(daily_needs, meal_types, days)
+        except ValueError as error:
+            # e.g. no recipes of one of the meal types
+            errors.append((profile, None, str(error)))
+            continue
+        records.extend(
+            (profile, day, meal_type, ids[row])
+            for day, day_rows in enumerate(plan) for meal_type, row in zip(meal_types, day_rows) if row >= 0
+        )
+    return pd.DataFrame.from_records(records, columns=['profile', 'day', 'mealType', 'recipeId']), error_frame(errors)
 
-    meals_per_day = 3
-    user_per_meal_needs = [value / meals_per_day for key, value in nutrients.items()]
-    user_per_meal_needs_df = pd.DataFrame([user_per_meal_needs], columns=nutritional_columns)
 
-    meal_types = ['Breakfast', 'Lunch', 'Dinner'] if meals_per_day == 3 else \
-                 ['Breakfast', 'Snack', 'Lunch', 'Dinner'] if meals_per_day == 4 else \
-                 ['Breakfast', 'Snack', 'Lunch', 'Snack', 'Dinner']
+def write_parquet(frame: pd.DataFrame, path: str) -> None:
+    """Write a parquet file under a temporary name and rename it into place once complete."""
+    frame.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
 
-    meal_recommendations = {}
-    for meal in meal_types:
-        meal_recommendations[meal] = recommender.recommend_meals(user_per_meal_needs_df, meal)
 
-    for meal, recommendations in meal_recommendations.items():
-        print(f"Recommendations for {meal}:")
-        print(recommendations[['name', 'mealType']])
-        print()
+def process_shard(shard: int, profiles: pd.DataFrame, output_dir: str, days: Optional[int],
+                  k: int) -> Tuple[int, int]:
+    """
+    Compute one chunk of profiles and write it as its own parquet part; runs in a worker.
+
+    The part is renamed into place once complete, so an interrupted run never leaves a partial
+    part behind and resuming only has to look at which parts exist. Profiles or meals that fail
+    are listed in an errors file next to the part, written before it.
+
+    :return: Tuple of (profiles processed, errors recorded).
+    """
+    results, errors = plan_chunk(profiles, days) if days else recommend_chunk(profiles, k)
+    if len(errors):
+        path = os.path.join(output_dir, f"{ERRORS_PREFIX}{shard:06d}.parquet")
+        write_parquet(errors, path)
+        logging.warning(f"Shard {shard}: {len(errors)} errors written to {path}")
+    write_parquet(results, os.path.join(output_dir, f"{PART_PREFIX}{shard:06d}.parquet"))
+    return len(profiles), len(errors)
+
+
+def completed_shards(output_dir: str) -> Set[int]:
+    """Shards whose part was fully written by a previous run."""
+    return {
+        int(name[len(PART_PREFIX):-len(".parquet")]) for name in os.listdir(output_dir)
+        if name.startswith(PART_PREFIX) and name.endswith(".parquet")
+    }
+
+
+def prepare_output(output_dir: str, run_settings: Dict[str, Any], restart: bool) -> Set[int]:
+    """
+    Create the output directory, or check that a previous run there can be resumed.
+
+    :return: Shards already completed.
+    """
+    run_file = os.path.join(output_dir, RUN_FILE)
+    if restart:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+    if os.path.exists(run_file):
+        with open(run_file) as f:
+            previous = json.load(f)
+        if previous != run_settings:
+            raise SystemExit(f"{output_dir} holds a run with other settings ({previous}); pass --restart to replace it")
+    else:
+        with open(run_file, "w") as f:
+            json.dump(run_settings, f, indent=2)
+    # Parts still being written when a previous run stopped, and errors of shards whose part wasn't
+    done = completed_shards(output_dir)
+    for name in os.listdir(output_dir):
+        unfinished_errors = name.startswith(ERRORS_PREFIX) and int(name[len(ERRORS_PREFIX):-len(".parquet")]) not in done
+        if name.endswith(".tmp") or unfinished_errors:
+            os.remove(os.path.join(output_dir, name))
+    return done
+
+
+def report_progress(processed: int, start: float, last_report: float, interval: float) -> float:
+    """
+    Log the profiles processed so far once the report interval has passed.
+
+    :return: Time of the last progress line.
+    """
+    now = time.perf_counter()
+    if now - last_report < interval:
+        return last_report
+    logging.info(f"{processed} profiles, {processed / (now - start):.0f} profiles/s")
+    return now
+
+
+def add_results(totals: Dict[str, int], finished: Set[Future]) -> None:
+    """Add the profile and error counts of finished shards to the run's totals."""
+    for future in finished:
+        profiles, errors = future.result()
+        totals["profiles"] += profiles
+        totals["errors"] += errors
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Compute the recommendations of every profile in parallel, resuming any previous run.
+
+    :return: Profiles processed and errors recorded by this run, elapsed seconds and profiles per second.
+    """
+    settings = {"data_dir": args.data_dir, "cache_dir": args.cache_dir or os.path.join(args.data_dir, "cache"),
+                "index_dir": args.index_dir, "backend": args.search_backend}
+    # Build the artifact and publish the shared index once, before the workers attach to them
+    recommender = load_recommender(**settings)
+    run_settings = {
+        "profiles": os.path.abspath(args.profiles), "chunk_size": args.chunk_size, "k": args.k, "days": args.days,
+        "search_backend": args.search_backend, "dataset_version": recommender.dataset_version,
+    }
+    done = prepare_output(args.output, run_settings, args.restart)
+    if done:
+        logging.info(f"Resuming: {len(done)} shards already written to {args.output}")
+    del recommender
+
+    start = time.perf_counter()
+    totals = {"profiles": 0, "errors": 0}
+    last_report = start
+    pending: Set[Future] = set()
+    # Spawn rather than fork, like the API's process pool
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker, initargs=(settings,)) as pool:
+        for shard, profiles in enumerate(read_profiles(args.profiles, args.chunk_size)):
+            if shard in done:
+                continue
+            pending.add(pool.submit(process_shard, shard, profiles, args.output, args.days, args.k))
+            # Keep only a few chunks per worker in memory; the input is read as fast as they finish
+            while len(pending) >= 2 * args.workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                add_results(totals, finished)
+            last_report = report_progress(totals["profiles"], start, last_report, args.report_interval)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            add_results(totals, finished)
+            last_report = report_progress(totals["profiles"], start, last_report, args.report_interval)
+
+    seconds = time.perf_counter() - start
+    processed = totals["profiles"]
+    stats = {**totals, "seconds": seconds, "profiles_per_second": processed / seconds if seconds else 0.0}
+    logging.info(f"Done: {processed} profiles in {seconds:.1f}s ({stats['profiles_per_second']:.0f} profiles/s), "
+                 f"{totals['errors']} errors, results in {args.output}")
+    return stats
+
+
+def main():
+    """Generate meal recommendations or plans offline for a whole cohort of user profiles."""
+    base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+    parser = argparse.ArgumentParser(description="Recommend meals for many user profiles without the HTTP API.")
+    parser.add_argument("profiles", help=f"CSV or parquet file of user profiles with columns {', '.join(PROFILE_COLUMNS)}.")
+    parser.add_argument("--output", required=True, help="Directory receiving one parquet part per chunk.")
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", os.path.join(base_dir, "data")))
+    parser.add_argument("--cache-dir", default=os.getenv("DATASET_CACHE_DIR"), help="Defaults to DATA_DIR/cache.")
+    parser.add_argument("--index-dir", default=os.getenv("SHARED_INDEX_DIR", default_index_dir()),
+                        help="Shared index memory-mapped by every worker.")
+    parser.add_argument("--search-backend", default=os.getenv("RECOMMENDER_SEARCH_BACKEND", "brute"),
+                        choices=list(SEARCH_BACKENDS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes.")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Profiles per shard and parquet part.")
+    parser.add_argument("--k", type=int, default=5, help="Recipes recommended per meal type.")
+    parser.add_argument("--days", type=int, help="Plan one recipe per meal for this many days instead.")
+    parser.add_argument("--restart", action="store_true", help="Discard a previous run in the output directory.")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress lines.")
+    run(parser.parse_args())
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()